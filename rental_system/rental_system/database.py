@@ -0,0 +1,109 @@
+"""
+Konfiguracja bazy danych (settings.DATABASES['default']) ze zmiennych środowiskowych.
+
+RENTALS_DB_ENGINE wybiera profil:
+
+- sqlite (domyślnie) – plik RENTALS_DB_NAME (domyślnie BASE_DIR/db.sqlite3). Przy otwarciu
+  połączenia ustawiane są pragmy: journal_mode=WAL (czytający nie blokują zapisu),
+  synchronous=NORMAL (w trybie WAL bezpieczne, bez fsync przy każdym COMMIT) i cache_size.
+  Transakcje zaczynają się od BEGIN IMMEDIATE, więc blokadę zapisu bierze się od razu
+  i czeka na nią do RENTALS_SQLITE_TIMEOUT sekund – bez "database is locked" przy
+  podnoszeniu blokady w środku równoległych wydań sprzętu.
+- postgresql – RENTALS_DB_NAME / USER / PASSWORD / HOST / PORT (wymaga pakietu psycopg).
+  Iteratory (eksporty, przebudowa indeksu) korzystają z kursorów po stronie serwera;
+  za PgBouncerem w trybie transakcyjnym trzeba je wyłączyć: RENTALS_DB_PGBOUNCER=1.
+
+W obu profilach połączenia są utrzymywane między żądaniami (RENTALS_DB_CONN_MAX_AGE
+sekund, domyślnie 60; "none" – bez limitu, 0 – nowe połączenie na każde żądanie)
+i sprawdzane przed ponownym użyciem (RENTALS_DB_CONN_HEALTH_CHECKS, domyślnie włączone).
+
+Repliki do odczytu (rentals/routing.py): RENTALS_DB_REPLICAS – lista po przecinku plików
+SQLite albo hostów PostgreSQL; każda dostaje alias replica1, replica2, ... i ustawienia
+bazy głównej. W testach repliki wskazują na testową bazę główną (TEST MIRROR).
+"""
+import copy
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+# (pragma, zmienna środowiskowa, wartość domyślna)
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'RENTALS_SQLITE_JOURNAL_MODE', 'WAL'),
+    ('synchronous', 'RENTALS_SQLITE_SYNCHRONOUS', 'NORMAL'),
+    ('cache_size', 'RENTALS_SQLITE_CACHE_SIZE', '-65536'),  # ujemna wartość = KiB, tu 64 MiB
+)
+
+
+def _bool(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _int(env, name, default):
+    value = env.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ImproperlyConfigured(f"{name} musi być liczbą całkowitą, a nie {value!r}.")
+
+
+def sqlite_config(base_dir, env):
+    pragmas = '; '.join(f"PRAGMA {pragma}={env.get(name) or default}" for pragma, name, default in SQLITE_PRAGMAS)
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env.get('RENTALS_DB_NAME') or base_dir / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': pragmas,
+            'timeout': _int(env, 'RENTALS_SQLITE_TIMEOUT', 20),  # busy timeout w sekundach
+            'transaction_mode': env.get('RENTALS_SQLITE_TRANSACTION_MODE') or 'IMMEDIATE',
+        },
+    }
+
+
+def postgresql_config(env):
+    options = {
+        'connect_timeout': _int(env, 'RENTALS_DB_CONNECT_TIMEOUT', 5),
+        'application_name': env.get('RENTALS_DB_APPLICATION_NAME') or 'rental_system',
+        # zawieszone zapytanie lub porzucona transakcja nie blokują wierszy bez końca
+        'options': (f"-c statement_timeout={_int(env, 'RENTALS_DB_STATEMENT_TIMEOUT', 30000)} "
+                    f"-c idle_in_transaction_session_timeout={_int(env, 'RENTALS_DB_IDLE_TIMEOUT', 60000)}"),
+    }
+    if env.get('RENTALS_DB_SSLMODE'):
+        options['sslmode'] = env['RENTALS_DB_SSLMODE']
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env.get('RENTALS_DB_NAME') or 'rental_system',
+        'USER': env.get('RENTALS_DB_USER', ''),
+        'PASSWORD': env.get('RENTALS_DB_PASSWORD', ''),
+        'HOST': env.get('RENTALS_DB_HOST', ''),
+        'PORT': env.get('RENTALS_DB_PORT', ''),
+        'OPTIONS': options,
+        'DISABLE_SERVER_SIDE_CURSORS': _bool(env.get('RENTALS_DB_PGBOUNCER', '')),
+    }
+
+
+def database_config(base_dir, env=os.environ):
+    engine = (env.get('RENTALS_DB_ENGINE') or 'sqlite').lower()
+    if engine in ('sqlite', 'sqlite3'):
+        config = sqlite_config(base_dir, env)
+    elif engine in ('postgres', 'postgresql'):
+        config = postgresql_config(env)
+    else:
+        raise ImproperlyConfigured(f"Nieznany RENTALS_DB_ENGINE: {engine} (sqlite albo postgresql).")
+    max_age = env.get('RENTALS_DB_CONN_MAX_AGE', '')
+    config['CONN_MAX_AGE'] = None if max_age.lower() == 'none' else _int(env, 'RENTALS_DB_CONN_MAX_AGE', 60)
+    config['CONN_HEALTH_CHECKS'] = _bool(env.get('RENTALS_DB_CONN_HEALTH_CHECKS', '1'))
+    return config
+
+
+def replica_databases(primary, env=os.environ):
+    """{alias: ustawienia} replik z RENTALS_DB_REPLICAS (pliki SQLite lub hosty PostgreSQL)."""
+    databases = {}
+    targets = [value.strip() for value in env.get('RENTALS_DB_REPLICAS', '').split(',') if value.strip()]
+    for number, target in enumerate(targets, start=1):
+        config = copy.deepcopy(primary)
+        config['NAME' if primary['ENGINE'].endswith('sqlite3') else 'HOST'] = target
+        config['TEST'] = {'MIRROR': 'default'}
+        databases[f'replica{number}'] = config
+    return databases
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 
+from .database import database_config, replica_databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rentals',              # nasza aplikacja wypożyczeń
+    'rest_framework',
     'import_export',
     'widget_tweaks',
 ]
@@ -46,15 +49,33 @@ LOGIN_REDIRECT_URL = 'rentals:dashboard'  # Po zalogowaniu przekierowanie na kok
 LOGOUT_REDIRECT_URL = 'login'  # Po wylogowaniu przekierowanie na stronę logowania
 
 MIDDLEWARE = [
+    'rentals.profiling.ProfilingMiddleware',  # pomiar zapytań SQL i czasu (próbkowanie poniżej)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'rentals.routing.ReplicaStickinessMiddleware',  # read-your-writes przy replikach bazy
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Odsetek profilowanych żądań (0.0 = wyłączone) i liczba pamiętanych pomiarów na endpoint
+RENTALS_PROFILING_SAMPLE_RATE = 0.0
+RENTALS_PROFILING_BUFFER_SIZE = 500
+
+# Cache – fragmenty stron katalogu (rentals/fragments.py) unieważniane wersją danych, bez TTL.
+# Przy kilku procesach na jednym serwerze można użyć FileBasedCache (wspólne trafienia i statystyki).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rentals',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+RENTALS_FRAGMENT_CACHE = 'default'
+
 ROOT_URLCONF = 'rental_system.urls'
 
 TEMPLATES = [
@@ -79,12 +100,16 @@ WSGI_APPLICATION = 'rental_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Profil bazy (SQLite z WAL albo PostgreSQL) i trwałe połączenia ustawiane zmiennymi
+# środowiskowymi RENTALS_DB_* – opis w rental_system/database.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
+# Repliki do odczytu katalogu i raportów (RENTALS_DB_REPLICAS) – kierowanie w rentals/routing.py
+DATABASES.update(replica_databases(DATABASES['default']))
+DATABASE_ROUTERS = ['rentals.routing.ReplicaRouter']
+RENTALS_DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+RENTALS_DB_STICKY_SECONDS = 10  # jak długo po własnym zapisie użytkownik czyta z bazy głównej
 
 
 # Password validation
@@ -120,6 +145,13 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'  # katalog do uploadu zdjęć
 
+# Django REST Framework: paginacja kursorowa i filtrowanie po stronie serwera dla /api/
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'rentals.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+    'DEFAULT_FILTER_BACKENDS': ['rentals.filters.QueryParamFilterBackend'],
+}
+
 # Konfiguracja poczty (SMTP) dla powiadomień e-mail
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.twojadomena.pl'
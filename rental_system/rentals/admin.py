@@ -1,14 +1,38 @@
 # rentals/admin.py
-from django.contrib import admin
-from .models import Category, Product, Komplet, Order, BorrowHistory, Serwis, Service, UserProfile
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from .models import Category, Product, Komplet, Order, OrderLine, BorrowHistory, Serwis, Service, UserProfile, OutgoingEmail
 from import_export.admin import ImportExportModelAdmin
 from import_export import resources
+from .importing import ProductImporter, RowError, iter_rows
 
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name']
+    list_display = ['name', 'count_magazyn', 'count_wyjazd', 'count_serwis']
+
+    def get_queryset(self, request):
+        # liczniki z CategoryStatusCount zamiast COUNT po tabeli produktów
+        return super().get_queryset(request).prefetch_related('status_counts')
+
+    def _count(self, obj, status):
+        return next((c.count for c in obj.status_counts.all() if c.status == status), 0)
+
+    @admin.display(description='Magazyn')
+    def count_magazyn(self, obj):
+        return self._count(obj, 'magazyn')
+
+    @admin.display(description='Wyjazd')
+    def count_wyjazd(self, obj):
+        return self._count(obj, 'wyjazd')
+
+    @admin.display(description='Serwis')
+    def count_serwis(self, obj):
+        return self._count(obj, 'serwis')
 
 
 # Definiujemy klasę zasobu dla importu/eksportu
@@ -19,11 +43,43 @@ class ProductResource(resources.ModelResource):
         skip_unchanged = True  # Pomija duplikaty ID
         use_bulk = True  # Przyspiesza import
 
+class StreamImportForm(forms.Form):
+    file = forms.FileField(label="Plik CSV lub XLSX")
+    batch_size = forms.IntegerField(label="Wielkość paczki", initial=500, min_value=1, max_value=10000)
+
+
 # Rejestrujemy model w Django Admin z obsługą importu/eksportu
 @admin.register(Product)
 class ProductAdmin(ImportExportModelAdmin):  # Dziedziczenie TYLKO z ImportExportModelAdmin
     resource_class = ProductResource
-    list_display = ("brand", "model", "code")
+    list_display = ("brand", "model", "code", "quantity", "in_stock")
+    import_export_change_list_template = 'admin/rentals/product/change_list.html'
+
+    def get_urls(self):
+        urls = [path('stream-import/', self.admin_site.admin_view(self.stream_import_view),
+                     name='rentals_product_stream_import')]
+        return urls + super().get_urls()
+
+    def stream_import_view(self, request):
+        """Import dużych katalogów: plik czytany strumieniowo i zapisywany paczkami (rentals/importing.py)."""
+        if not self.has_add_permission(request):
+            return redirect('admin:rentals_product_changelist')
+        form = StreamImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                report = ProductImporter(form.cleaned_data['batch_size']).run(iter_rows(upload.file, upload.name))
+            except (RowError, UnicodeDecodeError) as exc:
+                messages.error(request, str(exc))
+            else:
+                for row_number, message in report.errors[:50]:
+                    messages.warning(request, f"Wiersz {row_number}: {message}")
+                messages.success(request, f"Wierszy: {report.rows}, dodano: {report.created}, "
+                                          f"duplikaty: {report.duplicates}, błędy: {report.error_count}.")
+                return redirect('admin:rentals_product_changelist')
+        context = {**self.admin_site.each_context(request), 'opts': self.model._meta,
+                   'form': form, 'title': "Import strumieniowy produktów"}
+        return TemplateResponse(request, 'admin/rentals/product/stream_import.html', context)
 
 @admin.register(Komplet)
 class KompletAdmin(admin.ModelAdmin):
@@ -31,12 +87,23 @@ class KompletAdmin(admin.ModelAdmin):
     filter_horizontal = ['products']  # użycie widgetu do wyboru wielu produktów
     list_filter = ['status']
 
+class OrderLineInline(admin.TabularInline):
+    """Liczba sztuk w pozycjach (podgląd) – pozycje tworzy checkout i relacja products."""
+    model = OrderLine
+    fields = readonly_fields = ['product', 'quantity']
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'conference_code', 'status', 'reserved_at', 'pickup_date', 'return_date']
     list_filter = ['status', 'pickup_date', 'return_date']
     date_hierarchy = 'reserved_at'
     filter_horizontal = ['products', 'komplets']
+    inlines = [OrderLineInline]
 
 @admin.register(BorrowHistory)
 class BorrowHistoryAdmin(admin.ModelAdmin):
@@ -59,3 +126,8 @@ class ServiceAdmin(admin.ModelAdmin):
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'nickname']
 
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['to', 'subject']
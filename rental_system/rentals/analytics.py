@@ -0,0 +1,208 @@
+# rentals/analytics.py
+"""
+Analityka wykorzystania sprzętu: czas poza magazynem i w serwisie, średnia długość
+wypożyczenia, najczęściej wypożyczane komplety.
+
+Surowe dane (BorrowHistory.borrow_date/return_date, Service.reported_at/resolved_at)
+składane są do dziennych podsumowań DailyUsage w jednym przebiegu na paczkę dni
+(CHUNK_DAYS): każdy przedział nachodzący na paczkę pobierany jest raz i dzielony na dni,
+więc przeliczenie historii kosztuje tyle, ile wierszy, a nie dni × wiersze. Raporty
+czytają już tylko DailyUsage (indeks po dniu), a rankingi liczą funkcje okna w bazie.
+Podsumowania odświeża przyrostowo komenda refresh_usage.
+"""
+import bisect
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Window
+from django.db.models.functions import Rank
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import BorrowHistory, DailyUsage, Product, Service
+
+DAY_SECONDS = 24 * 3600
+CHUNK_DAYS = 31      # dni przeliczane jednym przebiegiem po historii
+CHUNK_SIZE = 2000
+ITEMS = ('product', 'komplet')
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
+
+
+def _seconds(value):
+    return int(value.total_seconds()) if value else 0
+
+
+def _intervals(queryset, start_field, end_field, start, end):
+    """(pozycja, początek, koniec) przedziałów nachodzących na [start, end) lub zakończonych
+    dokładnie w `start` (zwrot liczony tego dnia) – jedno zapytanie; warunek na obie daty
+    korzysta z indeksów po dacie rozpoczęcia i zakończenia."""
+    return (queryset
+            .filter(Q(**{f'{end_field}__gte': start}) | Q(**{f'{end_field}__isnull': True}),
+                    **{f'{start_field}__lt': end})
+            .values_list(*queryset.query.values_select, start_field, end_field)
+            .iterator(chunk_size=CHUNK_SIZE))
+
+
+def _split_by_day(begin, finish, days, starts):
+    """Dzieli [begin, finish) na części w kolejnych dniach `days` (początki dni w `starts`,
+    ostatni element to koniec zakresu): (dzień, czas trwania)."""
+    if finish <= begin:
+        return
+    index = bisect.bisect_right(starts, begin) - 1
+    while index < len(days) and starts[index] < finish:
+        yield days[index], min(finish, starts[index + 1]) - max(begin, starts[index])
+        index += 1
+
+
+def compute_range(first_day, last_day, now=None):
+    """Wiersze DailyUsage (niezapisane) dla dni [first_day, last_day] – każdy przedział
+    z BorrowHistory / Service czytany raz i rozkładany na dni w Pythonie."""
+    now = now or timezone.now()
+    days = [first_day + datetime.timedelta(days=n) for n in range((last_day - first_day).days + 1)]
+    starts = [day_bounds(day)[0] for day in days] + [day_bounds(last_day)[1]]
+    start, end = starts[0], starts[-1]
+    stop = min(end, now)
+
+    def day_of(moment):
+        return days[bisect.bisect_right(starts, moment) - 1]
+
+    rows = defaultdict(lambda: defaultdict(int))
+    durations = defaultdict(lambda: defaultdict(datetime.timedelta))
+    for item in ITEMS:
+        key = f'{item}_id'
+        borrows = BorrowHistory.objects.filter(**{f'{item}__isnull': False}).values(key)
+        services = Service.objects.filter(**{f'{item}__isnull': False}).values(key)
+        for pk, borrowed, returned in _intervals(borrows, 'borrow_date', 'return_date', start, end):
+            if start <= borrowed < end:
+                rows[day_of(borrowed), item, pk]['rentals'] += 1
+            if returned is not None and start <= returned < end:
+                day = day_of(returned)
+                rows[day, item, pk]['returns'] += 1
+                durations[day, item, pk]['rental_seconds'] += returned - borrowed
+            for day, seconds in _split_by_day(max(borrowed, start), min(returned or stop, stop), days, starts):
+                durations[day, item, pk]['out_seconds'] += seconds
+        for pk, reported, resolved in _intervals(services, 'reported_at', 'resolved_at', start, stop):
+            for day, seconds in _split_by_day(max(reported, start), min(resolved or stop, stop), days, starts):
+                durations[day, item, pk]['service_seconds'] += seconds
+    for row_key, values in durations.items():
+        rows[row_key].update({field: _seconds(value) for field, value in values.items()})
+    product_ids = {pk for _, item, pk in rows if item == 'product'}
+    categories = {}
+    if product_ids:
+        categories = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'category_id'))
+    return [DailyUsage(day=day, **{f'{item}_id': pk}, category_id=categories.get(pk) if item == 'product' else None,
+                       **values)
+            for (day, item, pk), values in sorted(rows.items(), key=lambda row: row[0])]
+
+
+def compute_day(day, now=None):
+    """Wiersze DailyUsage (niezapisane) dla jednego dnia."""
+    return compute_range(day, day, now)
+
+
+def refresh(since=None, until=None, now=None):
+    """Przelicza podsumowania dni od `since` do `until` (domyślnie: od ostatniego
+    podsumowanego dnia – mógł być niepełny – do dziś), paczkami po CHUNK_DAYS dni.
+    Zwraca liczbę przeliczonych dni."""
+    now = now or timezone.now()
+    until = until or timezone.localdate(now)
+    if since is None:
+        since = DailyUsage.objects.aggregate(last=Max('day'))['last'] or first_activity_day()
+    if since is None or since > until:
+        return 0
+    first = since
+    while first <= until:
+        last = min(first + datetime.timedelta(days=CHUNK_DAYS - 1), until)
+        with transaction.atomic():
+            DailyUsage.objects.filter(day__gte=first, day__lte=last).delete()
+            DailyUsage.objects.bulk_create(compute_range(first, last, now), batch_size=CHUNK_SIZE)
+        first = last + datetime.timedelta(days=1)
+    return (until - since).days + 1
+
+
+def first_activity_day():
+    first = [value for value in (BorrowHistory.objects.aggregate(first=Min('borrow_date'))['first'],
+                                 Service.objects.aggregate(first=Min('reported_at'))['first']) if value]
+    return timezone.localdate(min(first)) if first else None
+
+
+def period_from_params(params, default_days=30):
+    """(date_from, date_to, category_id) z parametrów zapytania; ValueError przy błędnych wartościach."""
+    date_to = parse_date(params['date_to']) if params.get('date_to') else timezone.localdate()
+    date_from = (parse_date(params['date_from']) if params.get('date_from')
+                 else date_to - datetime.timedelta(days=default_days - 1))
+    if date_from is None or date_to is None:
+        raise ValueError("Nieprawidłowa data.")
+    if date_from > date_to:
+        raise ValueError("date_from nie może być późniejsza niż date_to.")
+    category = int(params['category']) if params.get('category') else None
+    return date_from, date_to, category
+
+
+def _totals(queryset):
+    return queryset.annotate(
+        out_seconds_sum=Sum('out_seconds'), service_seconds_sum=Sum('service_seconds'),
+        rentals_sum=Sum('rentals'), returns_sum=Sum('returns'), rental_seconds_sum=Sum('rental_seconds'))
+
+
+def _average_days(row):
+    return round(row['rental_seconds_sum'] / row['returns_sum'] / DAY_SECONDS, 2) if row['returns_sum'] else None
+
+
+def report(date_from, date_to, category=None, limit=20):
+    """Wykorzystanie w przedziale [date_from, date_to] (włącznie) na podstawie DailyUsage."""
+    days = (date_to - date_from).days + 1
+    period = DAY_SECONDS * days
+    usage = DailyUsage.objects.filter(day__gte=date_from, day__lte=date_to)
+    product_usage = usage.filter(product__isnull=False)
+    if category is not None:
+        product_usage = product_usage.filter(category=category)
+
+    products = (_totals(product_usage
+                        .values('product_id', 'product__brand', 'product__model', 'product__code', 'category_id'))
+                .annotate(category_rank=Window(Rank(), partition_by=F('category_id'),
+                                               order_by=F('out_seconds_sum').desc()))
+                .order_by('-out_seconds_sum', 'product_id')[:limit])
+
+    product_counts = dict(Product.objects.values('category_id').annotate(n=Count('pk')).values_list('category_id', 'n'))
+    categories = (_totals(product_usage.values('category_id', 'category__name'))
+                  .order_by('category__name'))
+
+    komplets = (_totals(usage.filter(komplet__isnull=False).values('komplet_id', 'komplet__name'))
+                .annotate(rank=Window(Rank(), order_by=F('rentals_sum').desc()))
+                .order_by('-rentals_sum', 'komplet_id')[:limit])
+
+    def item_row(row, **extra):
+        out, service = row['out_seconds_sum'] or 0, row['service_seconds_sum'] or 0
+        return {
+            **extra,
+            'rentals': row['rentals_sum'] or 0,
+            'days_out': round(out / DAY_SECONDS, 2),
+            'days_in_service': round(service / DAY_SECONDS, 2),
+            'average_rental_days': _average_days(row),
+        }
+
+    return {
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'days': days,
+        'products': [item_row(row, id=row['product_id'], name=f"{row['product__brand']} {row['product__model']}",
+                              code=row['product__code'], category_id=row['category_id'],
+                              category_rank=row['category_rank'],
+                              days_in_warehouse=round(days - (row['out_seconds_sum'] + row['service_seconds_sum'])
+                                                      / DAY_SECONDS, 2),
+                              utilization=round(row['out_seconds_sum'] / period, 4))
+                     for row in products],
+        'categories': [item_row(row, id=row['category_id'], name=row['category__name'],
+                                products=product_counts.get(row['category_id'], 0),
+                                utilization=round(row['out_seconds_sum'] / (period * product_counts[row['category_id']]), 4)
+                                if product_counts.get(row['category_id']) else None)
+                       for row in categories],
+        'komplets': [item_row(row, id=row['komplet_id'], name=row['komplet__name'], rank=row['rank'])
+                     for row in komplets],
+    }
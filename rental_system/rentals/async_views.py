@@ -0,0 +1,199 @@
+# rentals/async_views.py
+"""
+Asynchroniczne (ASGI) endpointy tylko do odczytu dla przeglądania katalogu:
+produkty, komplety, kategorie i dostępność w przedziale dat.
+
+Korzystają z asynchronicznego ORM (aiterator / afirst / acount), więc pod serwerem
+ASGI (np. `uvicorn rental_system.asgi:application`) oczekiwanie na wolnego klienta
+nie blokuje wątku. Zwracają zwykły JSON bez warstwy DRF; stronicowanie jest kursorowe
+jak w KeysetPagination (?cursor=<ostatnie id>, kolejność malejąco po id).
+Pod WSGI działają tak samo, tylko Django uruchamia je w pętli zdarzeń na wątek żądania.
+
+Endpointy picker_* zasilają podpowiedzi w formularzu zamówienia (PickerWidget
+w rentals/forms.py) – formularz nie renderuje już całego magazynu.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db.models import F, Q
+from django.http import JsonResponse
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_safe
+
+from . import availability, filters, routing, search
+from .models import Category, CategoryStatusCount, Komplet, Product
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+PICKER_PAGE_SIZE = 20
+PICKER_MATCHES = 200  # ile najlepszych trafień wyszukiwarki przeglądają podpowiedzi
+
+PRODUCT_FIELDS = ('id', 'brand', 'model', 'code', 'serial_number', 'ean_code', 'status', 'quantity')
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def async_api_view(view):
+    """Wymaga zalogowanego użytkownika (sesja), czyta z repliki bazy i zamienia BadRequest
+    na odpowiedź 400."""
+    @require_safe
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({'detail': "Wymagane zalogowanie."}, status=403)
+        try:
+            # endpointy tylko do odczytu – z repliki bazy, jeśli jest (rentals/routing.py)
+            with routing.reading_from(routing.read_alias(request)):
+                return await view(request, *args, **kwargs)
+        except BadRequest as exc:
+            return JsonResponse({'detail': str(exc)}, status=400)
+    return wrapper
+
+
+def filter_by(queryset, request, params):
+    """Filtry z parametrów GET – ta sama logika co QueryParamFilterBackend (rentals/filters.py)."""
+    try:
+        return filters.filter_by_params(queryset, request.GET, params)
+    except filters.InvalidFilter as exc:
+        raise BadRequest(f"Nieprawidłowa wartość parametru {exc.param}.")
+
+
+def int_param(request, name, default=None):
+    value = request.GET.get(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f"Parametr {name} musi być liczbą.")
+
+
+def page_size(request, default=PAGE_SIZE):
+    return min(max(int_param(request, 'page_size', default), 1), MAX_PAGE_SIZE)
+
+
+async def keyset_page(request, queryset, default_size=PAGE_SIZE):
+    """Jedna strona wyników (malejąco po id) i kursor następnej strony."""
+    size = page_size(request, default_size)
+    cursor = int_param(request, 'cursor')
+    if cursor is not None:
+        queryset = queryset.filter(pk__lt=cursor)
+    # o jeden wiersz więcej – wiadomo, czy istnieje kolejna strona, bez COUNT(*)
+    rows = [row async for row in queryset.order_by('-id')[:size + 1].aiterator()]
+    next_cursor = rows[size - 1]['id'] if len(rows) > size else None
+    return rows[:size], next_cursor
+
+
+async def ranked_page(request, queryset, default_size=PAGE_SIZE):
+    """Strona wyników uporządkowanych wg trafności – kursorem jest pozycja w rankingu."""
+    size = page_size(request, default_size)
+    offset = max(int_param(request, 'cursor', 0), 0)
+    rows = [row async for row in queryset[offset:offset + size + 1].aiterator()]
+    next_cursor = offset + size if len(rows) > size else None
+    return rows[:size], next_cursor
+
+
+def date_range(request):
+    start = parse_date(request.GET.get('date_from') or '')
+    end = parse_date(request.GET.get('date_to') or '')
+    return availability.default_range(start, end)
+
+
+@async_api_view
+async def product_list(request):
+    products = filter_by(Product.objects.all(), request,
+                         {'status': 'status', 'category': 'category', 'category_name': 'category__name'})
+    products = products.values(*PRODUCT_FIELDS, category_name=F('category__name'))
+    results, cursor = await keyset_page(request, products)
+    return JsonResponse({'results': results, 'next_cursor': cursor})
+
+
+@async_api_view
+async def product_detail(request, pk):
+    product = await (Product.objects.filter(pk=pk)
+                     .values(*PRODUCT_FIELDS, 'description', category_name=F('category__name')).afirst())
+    if product is None:
+        return JsonResponse({'detail': "Nie znaleziono."}, status=404)
+    return JsonResponse(product)
+
+
+@async_api_view
+async def komplet_list(request):
+    komplets = availability.with_komplet_availability(filter_by(Komplet.objects.all(), request, {'status': 'status'}))
+    results, cursor = await keyset_page(request, komplets.values('id', 'name', 'status', 'effective_status',
+                                                                 'available'))
+    # produkty kompletów ze strony – jedno zapytanie do tabeli pośredniej
+    members = {row['id']: [] for row in results}
+    links = Komplet.products.through.objects.filter(komplet_id__in=members).order_by('product_id')
+    async for link in links.values('komplet_id', 'product_id').aiterator():
+        members[link['komplet_id']].append(link['product_id'])
+    for row in results:
+        row['products'] = members[row['id']]
+    return JsonResponse({'results': results, 'next_cursor': cursor})
+
+
+@async_api_view
+async def category_list(request):
+    # liczniki z CategoryStatusCount zamiast COUNT po tabeli produktów
+    counts = {}
+    async for counter in CategoryStatusCount.objects.filter(count__gt=0).aiterator():
+        counts.setdefault(counter.category_id, {})[counter.status] = counter.count
+    results = [{**category, 'counts': counts.get(category['id'], {})}
+               async for category in Category.objects.order_by('name').values('id', 'name').aiterator()]
+    return JsonResponse({'results': results})
+
+
+@async_api_view
+async def availability_view(request):
+    """Liczba wolnych produktów i kompletów w przedziale ?date_from=&date_to= (opcjonalnie ?category=).
+
+    Z ?ids=1 zwraca też listy ich ID.
+    """
+    start, end = date_range(request)
+    category = int_param(request, 'category')
+    products = availability.available_between(start, end, category=category)
+    komplets = availability.available_komplets_between(start, end, category=category)
+    data = {
+        'date_from': start.isoformat(),
+        'date_to': end.isoformat(),
+        'product_count': await products.acount(),
+        'komplet_count': await komplets.acount(),
+    }
+    if request.GET.get('ids'):
+        data['products'] = [pk async for pk in products.order_by('id').values_list('id', flat=True).aiterator()]
+        data['komplets'] = [pk async for pk in komplets.order_by('id').values_list('id', flat=True).aiterator()]
+    return JsonResponse(data)
+
+
+@async_api_view
+async def picker_products(request):
+    """Podpowiedzi produktów do formularza zamówienia: wolne w przedziale ?date_from=&date_to=
+    (z liczbą wolnych sztuk), opcjonalnie ?category= i ?q= (prefiksy wyrazów – wyszukiwarka
+    z rentals/search.py, wyniki wg trafności)."""
+    start, end = date_range(request)
+    products = availability.with_available_quantity(
+        availability.available_between(start, end, category=int_param(request, 'category')), start, end)
+    products = products.values('id', 'brand', 'model', 'code', 'quantity', 'available_quantity')
+    query = request.GET.get('q', '').strip()
+    if query:
+        products = await sync_to_async(search.search_products)(query, products, PICKER_MATCHES)
+        results, cursor = await ranked_page(request, products, PICKER_PAGE_SIZE)
+    else:
+        results, cursor = await keyset_page(request, products, PICKER_PAGE_SIZE)
+    return JsonResponse({'results': results, 'next_cursor': cursor})
+
+
+@async_api_view
+async def picker_komplets(request):
+    """Podpowiedzi kompletów: wolne w przedziale dat, ?category= (kategoria któregoś z produktów),
+    ?q= – prefiks nazwy lub jednego z jej wyrazów."""
+    start, end = date_range(request)
+    komplets = availability.available_komplets_between(start, end, category=int_param(request, 'category'))
+    query = request.GET.get('q', '').strip()
+    if query:
+        komplets = komplets.filter(Q(name__istartswith=query) | Q(name__icontains=f' {query}'))
+    results, cursor = await keyset_page(request, komplets.values('id', 'name'), PICKER_PAGE_SIZE)
+    return JsonResponse({'results': results, 'next_cursor': cursor})
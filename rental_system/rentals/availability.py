@@ -0,0 +1,169 @@
+# rentals/availability.py
+"""
+Dostępność sprzętu w przedziale dat [od, do) liczona na podstawie zamówień
+(Order.pickup_date / Order.return_date), a nie pojedynczej flagi statusu.
+
+Każda funkcja zwraca QuerySet (lub wykonuje jedno zapytanie), więc koszt
+sprawdzenia nie rośnie wraz z liczbą wybranych produktów/kompletów.
+
+Produkt ma quantity sztuk, a zamówienie rezerwuje ich część pozycją OrderLine – produkt
+jest zajęty dopiero, gdy suma pozycji nachodzących zamówień osiągnie quantity. Komplet
+rezerwuje swoje produkty w całości.
+"""
+import datetime
+
+from django.db.models import (BooleanField, Case, Exists, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value,
+                              When)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Product, Komplet, Order, OrderLine
+
+# Zamówienia, które blokują sprzęt w swoim przedziale dat
+ACTIVE_ORDER_STATUSES = ('reserved', 'ongoing')
+# Statusy wyłączające sprzęt niezależnie od dat (naprawa / wycofanie)
+BLOCKED_STATUSES = ('serwis', 'odrzucone')
+# Pozostałe statusy – filtr dodatni (status IN ...) korzysta z indeksów po statusie, NOT IN nie
+AVAILABLE_STATUSES = ('magazyn', 'wyjazd')
+
+
+def default_range(start=None, end=None):
+    """Uzupełnia brakujące daty: domyślnie dzisiaj, przedział jednodniowy."""
+    if start is None:
+        start = timezone.localdate()
+    if end is None or end <= start:
+        end = start + datetime.timedelta(days=1)
+    return start, end
+
+
+def overlapping_orders(start, end, exclude_order=None):
+    """Aktywne zamówienia nachodzące na przedział [start, end).
+
+    Zamówienie bez daty odbioru/zwrotu traktujemy jako otwarte z tej strony, a zapisany zwrot
+    nie późniejszy niż odbiór – jak w default_range – jako jeden dzień [odbiór, odbiór + 1).
+    """
+    orders = Order.objects.filter(
+        Q(pickup_date__lt=end) | Q(pickup_date__isnull=True),
+        Q(return_date__gt=start) | Q(return_date__isnull=True)
+        | Q(return_date__lte=F('pickup_date'), pickup_date__gte=start),
+        status__in=ACTIVE_ORDER_STATUSES,
+    )
+    if exclude_order is not None:
+        orders = orders.exclude(pk=exclude_order.pk)
+    return orders
+
+
+def _via_komplet_q(orders):
+    booked_komplets = Order.komplets.through.objects.filter(order_id__in=orders).values('komplet_id')
+    return Q(pk__in=Komplet.products.through.objects.filter(komplet_id__in=booked_komplets).values('product_id'))
+
+
+def booked_products_q(start, end, exclude_order=None):
+    """Warunek na produkty zarezerwowane w całości: wszystkie sztuki w pozycjach zamówień
+    lub w ramach kompletu."""
+    orders = overlapping_orders(start, end, exclude_order).values('pk')
+    fully_booked = (OrderLine.objects.filter(order_id__in=orders)
+                    .values('product_id').annotate(reserved=Sum('quantity'))
+                    .filter(reserved__gte=F('product__quantity')).values('product_id'))
+    return Q(pk__in=fully_booked) | _via_komplet_q(orders)
+
+
+def with_available_quantity(products, start, end, exclude_order=None):
+    """Dokleja `available_quantity` – liczbę sztuk wolnych w całym przedziale [start, end):
+    quantity minus suma pozycji nachodzących zamówień (podzapytanie z agregatem, jedno
+    zapytanie dla dowolnej liczby produktów). Produkt zablokowany statusem lub
+    zarezerwowany w komplecie ma 0 wolnych sztuk."""
+    orders = overlapping_orders(start, end, exclude_order).values('pk')
+    reserved = (OrderLine.objects.filter(order_id__in=orders, product_id=OuterRef('pk'))
+                .values('product_id').annotate(total=Sum('quantity')).values('total'))
+    return products.annotate(available_quantity=Case(
+        When(Q(status__in=BLOCKED_STATUSES) | _via_komplet_q(orders), then=Value(0)),
+        default=Greatest(F('quantity') - Coalesce(Subquery(reserved), 0), Value(0)),
+    ))
+
+
+def available_between(start, end, category=None, exclude_order=None):
+    """Produkty, których co najmniej jedna sztuka jest wolna w całym przedziale [start, end) – jedno zapytanie."""
+    products = (Product.objects
+                .filter(status__in=AVAILABLE_STATUSES)
+                .exclude(quantity=0)
+                .exclude(booked_products_q(start, end, exclude_order)))
+    if category is not None:
+        products = products.filter(category=category)
+    return products
+
+
+def unavailable_product_ids(start, end, exclude_order=None):
+    """Podzapytanie z ID produktów, które nie mogą być wydane w przedziale."""
+    return (Product.objects
+            .filter(Q(status__in=BLOCKED_STATUSES) | booked_products_q(start, end, exclude_order))
+            .values('pk'))
+
+
+def available_komplets_between(start, end, category=None, exclude_order=None):
+    """Komplety, które same oraz wszystkie ich produkty są wolne w przedziale [start, end)."""
+    orders = overlapping_orders(start, end, exclude_order).values('pk')
+    booked_komplets = Order.komplets.through.objects.filter(order_id__in=orders).values('komplet_id')
+    busy_members = Komplet.products.through.objects.filter(
+        product_id__in=unavailable_product_ids(start, end, exclude_order)).values('komplet_id')
+    komplets = (Komplet.objects
+                .filter(status__in=AVAILABLE_STATUSES)
+                .exclude(pk__in=booked_komplets)
+                .exclude(pk__in=busy_members))
+    if category is not None:
+        komplets = komplets.filter(pk__in=Komplet.products.through.objects.filter(
+            product__category=category).values('komplet_id'))
+    return komplets
+
+
+def with_komplet_availability(komplets, start=None, end=None, exclude_order=None):
+    """Dokleja do kompletów pola wyliczone ze stanu ich produktów – w tym samym zapytaniu
+    (podzapytania EXISTS), bez iterowania po produktach:
+
+    - `available`: komplet i wszystkie jego produkty są wolne w przedziale [start, end)
+      (domyślnie dzisiaj),
+    - `effective_status`: status kompletu, a jeśli ten jest 'magazyn' lub 'wyjazd' –
+      najpoważniejszy status produktów (serwis > odrzucone > wyjazd).
+    """
+    start, end = default_range(start, end)
+    members = Komplet.products.through.objects.filter(komplet_id=OuterRef('pk'))
+    free = available_komplets_between(start, end, exclude_order=exclude_order).values('pk')
+    return komplets.annotate(
+        available=ExpressionWrapper(Q(pk__in=free), output_field=BooleanField()),
+        effective_status=Case(
+            When(status__in=BLOCKED_STATUSES, then=F('status')),
+            *[When(Exists(members.filter(product__status=status)), then=Value(status))
+              for status in (*BLOCKED_STATUSES, 'wyjazd')],
+            default=F('status'),
+        ),
+    )
+
+
+def is_product_available(product, start, end):
+    """Czy produkt jest wolny w przedziale [start, end)?"""
+    return available_between(start, end).filter(pk=product.pk).exists()
+
+
+def is_komplet_available(komplet, start, end):
+    """Czy komplet (i każdy produkt w nim) jest wolny w przedziale [start, end)?"""
+    return available_komplets_between(start, end).filter(pk=komplet.pk).exists()
+
+
+def unavailable_items(products, komplets, start, end, exclude_order=None, quantities=None):
+    """Zwraca (produkty, komplety) z wybranych, które nie są wolne w przedziale
+    (produkty: mniej wolnych sztuk niż `quantities[pk]`, domyślnie 1).
+
+    Niezależnie od liczby wybranych pozycji wykonuje co najwyżej dwa zapytania.
+    """
+    product_ids = [p.pk for p in products]
+    komplet_ids = [k.pk for k in komplets]
+    quantities = quantities or {}
+    busy_products, busy_komplets = [], []
+    if product_ids:
+        rows = with_available_quantity(Product.objects.filter(pk__in=product_ids), start, end, exclude_order)
+        busy_products = [product for product in rows.order_by('pk')
+                         if product.available_quantity < quantities.get(product.pk, 1)]
+    if komplet_ids:
+        free = available_komplets_between(start, end, exclude_order=exclude_order).values('pk')
+        busy_komplets = list(Komplet.objects.filter(pk__in=komplet_ids).exclude(pk__in=free))
+    return busy_products, busy_komplets
@@ -0,0 +1,208 @@
+# rentals/benchmark.py
+"""
+Pomiar wydajności wszystkich endpointów aplikacji (komenda run_benchmark).
+
+Lista endpointów budowana jest z rentals/urls.py – widoki HTML, API asynchroniczne
+i wszystkie ścieżki routera DRF (listy, szczegóły, akcje). Parametry ścieżek (pk)
+uzupełniane są pierwszym obiektem modelu widoku, pozostałe – wartościami z SAMPLE_KWARGS.
+Każdy endpoint odpytywany jest `repeat` razy w procesie (django.test.Client): mierzone są
+czasy odpowiedzi, liczba zapytań SQL i – w osobnym przebiegu pod tracemalloc – szczytowe
+zużycie pamięci. Wynik to JSON z metadanymi (commit, baza, liczności tabel), który można
+porównać z wynikiem z innego commita funkcją compare().
+"""
+import datetime
+import logging
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+
+from . import images, urls as rentals_urls
+from .models import BorrowHistory, Category, Komplet, Order, OrderLine, Product, Service
+
+# parametry ścieżek, których nie da się wywieść z modelu widoku
+SAMPLE_KWARGS = {
+    'export_data': {'name': 'orders', 'fmt': 'csv'},
+}
+# parametry zapytania dla endpointów, które bez nich nic nie robią
+SAMPLE_QUERY = {
+    'product-search': 'q=shure',
+    'picker_products': 'q=sh',
+    'export_data': 'date_from={month_ago}',
+}
+# modele widoków funkcyjnych z parametrem pk
+PK_MODELS = {
+    'async_product_detail': Product,
+}
+COUNTED_MODELS = (Product, Komplet, Category, Order, OrderLine, BorrowHistory, Service)
+
+
+def _walk(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern
+
+
+def _model_of(callback):
+    view = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+    queryset = getattr(view, 'queryset', None)
+    if queryset is not None:
+        return queryset.model
+    return getattr(view, 'model', None)
+
+
+def _sample_kwargs(pattern):
+    names = set(pattern.pattern.regex.groupindex)
+    kwargs = dict(SAMPLE_KWARGS.get(pattern.name, {}))
+    if 'pk' in names:
+        model = PK_MODELS.get(pattern.name) or _model_of(pattern.callback)
+        pk = model.objects.order_by('pk').values_list('pk', flat=True).first() if model else None
+        if pk is None:
+            return None
+        kwargs['pk'] = pk
+    if 'name' in names and 'kind' in names:
+        image = Product.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True).first()
+        if not image:
+            return None
+        try:
+            kwargs.update(kind='thumb', version=images.version(image), name=image)
+        except OSError:  # brak pliku oryginału
+            return None
+    return kwargs if set(kwargs) == names else None
+
+
+def endpoints(namespace='rentals'):
+    """[(nazwa, ścieżka)] dla wszystkich nazwanych URL-i aplikacji. Endpointy, dla których nie
+    udało się dobrać parametrów (np. brak zdjęć), zwracane są ze ścieżką None."""
+    month_ago = (datetime.date.today() - datetime.timedelta(days=30)).isoformat()
+    result, seen = [], set()
+    for pattern in _walk(rentals_urls.urlpatterns):
+        # warianty z sufiksem formatu (.json) routera DRF to te same widoki
+        if pattern.name in seen or 'format' in pattern.pattern.regex.groupindex:
+            continue
+        seen.add(pattern.name)
+        kwargs = _sample_kwargs(pattern)
+        path = reverse(f'{namespace}:{pattern.name}', kwargs=kwargs) if kwargs is not None else None
+        query = SAMPLE_QUERY.get(pattern.name)
+        if path and query:
+            path += '?' + query.format(month_ago=month_ago)
+        result.append((pattern.name, path))
+    return result
+
+
+def _consume(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def measure(client, path, repeat=5):
+    """Czasy (ms), liczba zapytań i szczytowa pamięć (KiB) dla `repeat` żądań GET."""
+    timings = []
+    for i in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(path)
+            size = _consume(response)
+            timings.append((time.perf_counter() - start) * 1000)
+        if i == 0:
+            status, query_count = response.status_code, len(queries)
+    # osobny przebieg – tracemalloc spowalnia wykonanie, więc nie wlicza się do czasów
+    tracemalloc.start()
+    try:
+        _consume(client.get(path))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'status': status,
+        'queries': query_count,
+        'bytes': size,
+        'mean_ms': round(statistics.mean(timings), 2),
+        'p50_ms': round(statistics.median(timings), 2),
+        'min_ms': round(min(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def default_host():
+    """Pierwsza konkretna nazwa z ALLOWED_HOSTS (przy DEBUG i pustej liście – localhost)."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*' and not host.startswith('.'):
+            return host
+    return 'localhost'
+
+
+def run(user, repeat=5, only=None, exclude=(), host=None, progress=None):
+    """Pomiar wszystkich endpointów jako `user` (sesja). Zwraca słownik gotowy do zapisu jako JSON."""
+    host = host or default_host()
+    # wyjątek w widoku to wynik pomiaru (status 500), a nie przerwanie całego przebiegu
+    client = Client(SERVER_NAME=host, raise_request_exception=False)
+    client.force_login(user)
+    results = []
+    # statusy 4xx/5xx trafiają do wyników – bez powtarzania ich w logu przy każdym pomiarze
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+    try:
+        for name, path in endpoints():
+            if (only and name not in only) or name in exclude:
+                continue
+            row = {'name': name, 'path': path}
+            if path is None:
+                row['skipped'] = "brak danych do zbudowania ścieżki"
+            else:
+                row.update(measure(client, path, repeat))
+            results.append(row)
+            if progress:
+                progress(row)
+    finally:
+        request_logger.setLevel(level)
+    return {
+        'meta': {
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'database': connection.vendor,
+            'repeat': repeat,
+            'rows': {model._meta.model_name: model.objects.count() for model in COUNTED_MODELS},
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=1.2):
+    """Regresje względem wcześniejszego wyniku: wolniejsza mediana (powyżej `threshold` razy
+    i o co najmniej 1 ms), więcej zapytań lub większy szczyt pamięci."""
+    before = {row['name']: row for row in baseline['results'] if 'skipped' not in row}
+    regressions = []
+    for row in current['results']:
+        old = before.get(row['name'])
+        if old is None or 'skipped' in row:
+            continue
+        problems = []
+        if row['p50_ms'] > old['p50_ms'] * threshold and row['p50_ms'] - old['p50_ms'] >= 1:
+            problems.append(f"p50 {old['p50_ms']} -> {row['p50_ms']} ms")
+        if row['queries'] > old['queries']:
+            problems.append(f"zapytania {old['queries']} -> {row['queries']}")
+        if row['peak_kib'] > old['peak_kib'] * threshold and row['peak_kib'] - old['peak_kib'] >= 64:
+            problems.append(f"pamięć {old['peak_kib']} -> {row['peak_kib']} KiB")
+        if problems:
+            regressions.append({'name': row['name'], 'problems': problems})
+    return regressions
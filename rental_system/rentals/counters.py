@@ -0,0 +1,97 @@
+# rentals/counters.py
+"""
+Liczniki produktów w kategoriach wg statusu (CategoryStatusCount).
+
+Zamiast COUNT ... GROUP BY po całej tabeli Product przy każdym wyświetleniu,
+liczniki są aktualizowane przyrostowo przy każdej zmianie statusu/kategorii:
+- zapis/usunięcie pojedynczego produktu (admin, ServiceCreateView) – sygnały w rentals/signals.py,
+- operacje masowe (QuerySet.update, bulk_create) – jawne wywołanie shift()/move_status().
+
+Każda kategoria ma wiersz licznika dla każdego statusu (tworzone razem z kategorią,
+w migracji i przez rebuild()), więc shift() to zawsze jeden UPDATE na parę
+(kategoria, status) – bez dodatkowych zapytań przy pierwszej zmianie do nowego statusu.
+"""
+from collections import Counter
+
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import versioning
+from .models import STATUS_CHOICES, Category, CategoryStatusCount, Product
+
+
+def create_rows(category_ids):
+    """Zerowe liczniki wszystkich statusów dla kategorii (istniejące wiersze są pomijane)."""
+    CategoryStatusCount.objects.bulk_create(
+        [CategoryStatusCount(category_id=category_id, status=status, count=0)
+         for category_id in category_ids for status, _ in STATUS_CHOICES],
+        ignore_conflicts=True)
+
+
+def shift(deltas):
+    """Stosuje zmiany liczników: {(category_id, status): +/-n}."""
+    for (category_id, status), delta in deltas.items():
+        if not delta or category_id is None or status is None:
+            continue
+        updated = (CategoryStatusCount.objects
+                   .filter(category_id=category_id, status=status)
+                   .update(count=F('count') + delta))
+        if not updated:  # kategoria spoza create_rows() (np. dane sprzed migracji)
+            counter, created = CategoryStatusCount.objects.get_or_create(
+                category_id=category_id, status=status, defaults={'count': delta})
+            if not created:  # wiersz utworzył w międzyczasie inny proces
+                CategoryStatusCount.objects.filter(pk=counter.pk).update(count=F('count') + delta)
+
+
+def move_status(queryset, new_status):
+    """Zmienia status produktów z querysetu jednym UPDATE i aktualizuje liczniki
+    (oraz updated_at i wersję kolekcji – UPDATE pomija auto_now i sygnały).
+
+    Liczba zapytań zależy od liczby (kategoria, status) objętych zmianą, a nie od liczby produktów.
+    """
+    deltas = Counter()
+    rows = (queryset.exclude(status=new_status)
+            .values('category_id', 'status').annotate(n=Count('pk')).order_by())
+    for row in rows:
+        deltas[row['category_id'], row['status']] -= row['n']
+        deltas[row['category_id'], new_status] += row['n']
+    if deltas:
+        queryset.update(status=new_status, updated_at=timezone.now())
+        shift(deltas)
+        versioning.bump('product')
+
+
+def live_counts():
+    """Aktualny stan policzony bezpośrednio z tabeli Product (pełny skan)."""
+    rows = Product.objects.values('category_id', 'status').annotate(n=Count('pk')).order_by()
+    return {(row['category_id'], row['status']): row['n'] for row in rows}
+
+
+def stored_counts():
+    return {(c.category_id, c.status): c.count
+            for c in CategoryStatusCount.objects.all() if c.count}
+
+
+def compare():
+    """Rozbieżności liczników ze stanem: {(category_id, status): (licznik, stan)}."""
+    live, stored = live_counts(), stored_counts()
+    return {key: (stored.get(key, 0), live.get(key, 0))
+            for key in set(live) | set(stored) if stored.get(key, 0) != live.get(key, 0)}
+
+
+def rebuild():
+    """Przelicza liczniki od zera. Zwraca rozbieżności sprzed przeliczenia (jak compare())."""
+    diff = compare()
+    live = live_counts()
+    CategoryStatusCount.objects.all().delete()
+    CategoryStatusCount.objects.bulk_create([
+        CategoryStatusCount(category_id=category_id, status=status, count=live.get((category_id, status), 0))
+        for category_id in Category.objects.values_list('pk', flat=True) for status, _ in STATUS_CHOICES
+    ])
+    return diff
+
+
+def summary():
+    """{kategoria: {status: liczba}} – odczyt O(liczba kategorii) wierszy, bez skanowania produktów."""
+    return {category: {c.status: c.count for c in category.status_counts.all() if c.count}
+            for category in Category.objects.prefetch_related('status_counts').order_by('name')}
@@ -0,0 +1,284 @@
+# rentals/datagen.py
+"""
+Generator syntetycznych danych do testów wydajności (komenda generate_data).
+
+Tworzy kategorie, użytkowników, produkty (w tym policzalne, w serwisie i wycofane),
+komplety z produktami, zamówienia z pozycjami z `years` lat wstecz (zwrócone, trwające
+i przyszłe rezerwacje), historię wypożyczeń oraz zgłoszenia serwisowe. Wszystko zapisywane
+jest paczkami przez bulk_create, więc 1M produktów to kilka minut, a nie godziny.
+
+Dane są powtarzalne dla danego `seed`. Trwające i przyszłe zamówienia nie nakładają się
+na siebie (stan magazynu i statusy są spójne z pozycjami), zamówienia historyczne mogą.
+bulk_create pomija sygnały – liczniki kategorii, indeks wyszukiwania, wersje kolekcji
+i podsumowania analityczne przeliczane są na końcu jawnie.
+"""
+import contextlib
+import datetime
+import random
+from dataclasses import dataclass, field
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import analytics, counters, search, stock, versioning
+from .models import (BorrowHistory, Category, IdSequence, Komplet, Order, OrderLine, Product, Serwis, Service,
+                     UserProfile)
+
+SCALES = {
+    'small': dict(products=10_000, komplets=100, users=100, orders=5_000, services=500),
+    'medium': dict(products=100_000, komplets=1_000, users=1_000, orders=50_000, services=5_000),
+    'large': dict(products=1_000_000, komplets=10_000, users=10_000, orders=500_000, services=50_000),
+}
+
+CATEGORIES = ('Audio', 'Mikrofony', 'Okablowanie', 'Oświetlenie', 'Wideo', 'Kamery', 'Statywy',
+              'Projektory', 'Ekrany', 'Zasilanie', 'Sieć', 'Komputery', 'Konferencyjne', 'Scena')
+BRANDS = ('Shure', 'Sennheiser', 'Sony', 'Canon', 'Panasonic', 'Klotz', 'Neutrik', 'Yamaha',
+          'Behringer', 'Manfrotto', 'Epson', 'Robe', 'Bosch', 'Cisco', 'Dell')
+FUNGIBLE_SHARE = 0.1      # produkty policzalne (quantity > 1)
+BLOCKED_SHARE = 0.03      # produkty w serwisie / wycofane
+CURRENT_SHARE = 0.02      # zamówienia trwające lub zaplanowane (reszta to historia)
+
+
+@dataclass
+class GenerateReport:
+    counts: dict = field(default_factory=dict)
+
+    def add(self, name, count):
+        self.counts[name] = self.counts.get(name, 0) + count
+
+
+@contextlib.contextmanager
+def explicit_dates(*fields):
+    """Wyłącza auto_now_add wskazanych pól (model, nazwa) – bulk_create zapisze daty z historii."""
+    fields = [model._meta.get_field(name) for model, name in fields]
+    saved = [f.auto_now_add for f in fields]
+    for f in fields:
+        f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, value in zip(fields, saved):
+            f.auto_now_add = value
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class DataGenerator:
+    def __init__(self, products=1000, komplets=10, users=10, orders=500, services=50, years=3,
+                 seed=0, batch_size=5000, today=None, progress=None):
+        self.sizes = dict(products=products, komplets=komplets, users=users, orders=orders, services=services)
+        self.years = years
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.today = today or timezone.localdate()
+        self.progress = progress  # progress(nazwa, liczba) po każdej paczce
+        self.report = GenerateReport()
+        self.seed = seed
+        self.product_ids = []
+        self.fungible = {}      # {product_id: quantity}
+        self.blocked = set()
+
+    def run(self, refresh_usage=True):
+        # numer uruchomienia w nazwach – kolejne generowanie do tej samej bazy nie koliduje
+        self.tag = f"{self.seed}-{IdSequence.allocate('datagen')}"
+        with explicit_dates((Order, 'reserved_at'), (BorrowHistory, 'borrow_date'), (Service, 'reported_at')):
+            self.categories = self.create_categories()
+            self.users = self.create_users()
+            self.serwisy = self.create_serwisy()
+            self.create_products()
+            self.komplets = self.create_komplets()
+            self.komplet_ids = list(self.komplets)
+            self.create_orders()
+            self.create_services()
+        # bulk_create pomija sygnały – stan pochodny odtwarzamy raz, po całości
+        counters.rebuild()
+        search.get_backend().rebuild()
+        versioning.bump('product', 'komplet', 'order', 'category')
+        if refresh_usage:
+            self.report.add('usage_days', analytics.refresh(since=analytics.first_activity_day(), until=self.today))
+        return self.report
+
+    def _saved(self, name, count):
+        self.report.add(name, count)
+        if self.progress:
+            self.progress(name, self.report.counts[name])
+
+    def create_categories(self):
+        for name in CATEGORIES:
+            Category.objects.get_or_create(name=name)
+        return list(Category.objects.filter(name__in=CATEGORIES).values_list('pk', flat=True))
+
+    def create_users(self):
+        password = make_password(None)  # konto bez możliwości logowania
+        users = [User(username=f'bench-{self.tag}-{i}', email=f'bench{i}@example.com', password=password)
+                 for i in range(self.sizes['users'])]
+        for batch in _batches(users, self.batch_size):
+            with transaction.atomic():
+                created = User.objects.bulk_create(batch)
+                UserProfile.objects.bulk_create([UserProfile(user=user) for user in created])
+            self._saved('users', len(batch))
+        return [user.pk for user in users]
+
+    def create_serwisy(self):
+        serwisy = Serwis.objects.bulk_create([Serwis(name=f'Serwis {self.tag}-{i}', city='Warszawa')
+                                              for i in range(5)])
+        return [s.pk for s in serwisy]
+
+    def build_product(self, number):
+        rnd = self.random
+        brand = rnd.choice(BRANDS)
+        roll = rnd.random()
+        status = ('odrzucone' if roll < BLOCKED_SHARE / 4 else 'serwis' if roll < BLOCKED_SHARE else 'magazyn')
+        quantity = rnd.randint(2, 50) if rnd.random() < FUNGIBLE_SHARE else 1
+        return Product(brand=brand, model=f'{brand[:2].upper()}-{rnd.randint(1, 9999)}',
+                       category_id=rnd.choice(self.categories), status=status, quantity=quantity,
+                       serial_number=None if quantity > 1 else f'SN-{self.tag}-{number}',
+                       ean_code=f'{rnd.randrange(10 ** 12, 10 ** 13)}',
+                       description=f'Sprzęt testowy {number}')
+
+    def create_products(self):
+        products = (self.build_product(i) for i in range(self.sizes['products']))
+        for batch in _batches(products, self.batch_size):
+            with transaction.atomic():
+                Product.objects.bulk_create(batch)
+            for product in batch:
+                self.product_ids.append(product.pk)
+                if product.quantity > 1:
+                    self.fungible[product.pk] = product.quantity
+                if product.status != 'magazyn':
+                    self.blocked.add(product.pk)
+            self._saved('products', len(batch))
+
+    def create_komplets(self):
+        singles = [pk for pk in self.product_ids if pk not in self.fungible]
+        komplets = [Komplet(name=f'Komplet {self.tag}-{i}') for i in range(self.sizes['komplets'])]
+        members = {}
+        for batch in _batches(komplets, self.batch_size):
+            with transaction.atomic():
+                Komplet.objects.bulk_create(batch)
+                links = []
+                for komplet in batch:
+                    members[komplet.pk] = self.random.sample(singles, min(len(singles), self.random.randint(3, 8)))
+                    links += [Komplet.products.through(komplet_id=komplet.pk, product_id=pk)
+                              for pk in members[komplet.pk]]
+                Komplet.products.through.objects.bulk_create(links)
+            self._saved('komplets', len(batch))
+        return members
+
+    def order_period(self, current):
+        """(odbiór, zwrot) – historyczne z `years` lat wstecz, bieżące od tygodnia wstecz do 60 dni naprzód."""
+        if current:
+            pickup = self.today + datetime.timedelta(days=self.random.randint(-7, 60))
+        else:
+            pickup = self.today - datetime.timedelta(days=self.random.randint(8, max(9, 365 * self.years)))
+        return pickup, pickup + datetime.timedelta(days=self.random.randint(1, 7))
+
+    def create_orders(self):
+        busy_products, busy_komplets = set(self.blocked), set()
+        taken = {}  # {product_id: liczba sztuk} wydane w trwających zamówieniach
+        out_komplets = []
+        for batch in _batches(range(self.sizes['orders']), self.batch_size):
+            orders, items = [], []
+            for _ in batch:
+                current = self.random.random() < CURRENT_SHARE
+                pickup, return_date = self.order_period(current)
+                status = ('returned' if return_date < self.today
+                          else 'ongoing' if pickup <= self.today else 'reserved')
+                products, komplets = self.pick_items(busy_products if current else None,
+                                                     busy_komplets if current else None)
+                reserved_at = timezone.make_aware(datetime.datetime.combine(
+                    pickup - datetime.timedelta(days=self.random.randint(1, 30)), datetime.time(10)))
+                orders.append(Order(user_id=self.random.choice(self.users), conference_code=f'KONF-{pickup:%Y%m}',
+                                    status=status, pickup_date=pickup, return_date=return_date,
+                                    reserved_at=reserved_at))
+                items.append((products, komplets))
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                lines, product_links, komplet_links, borrows = [], [], [], []
+                for order, (products, komplets) in zip(orders, items):
+                    for pk, quantity in products.items():
+                        lines.append(OrderLine(order_id=order.pk, product_id=pk, quantity=quantity,
+                                               returned=quantity if order.status == 'returned' else 0))
+                        product_links.append(Order.products.through(order_id=order.pk, product_id=pk))
+                    komplet_links += [Order.komplets.through(order_id=order.pk, komplet_id=pk) for pk in komplets]
+                    if order.status == 'reserved':
+                        continue
+                    borrowed = timezone.make_aware(datetime.datetime.combine(order.pickup_date, datetime.time(9)))
+                    returned = (timezone.make_aware(datetime.datetime.combine(order.return_date, datetime.time(17)))
+                                if order.status == 'returned' else None)
+                    borrows += [BorrowHistory(user_id=order.user_id, order_id=order.pk, product_id=pk,
+                                              quantity=quantity, borrow_date=borrowed, return_date=returned)
+                                for pk, quantity in products.items()]
+                    borrows += [BorrowHistory(user_id=order.user_id, order_id=order.pk, komplet_id=pk,
+                                              borrow_date=borrowed, return_date=returned) for pk in komplets]
+                    if order.status == 'ongoing':
+                        for pk, quantity in products.items():
+                            taken[pk] = taken.get(pk, 0) + quantity
+                        out_komplets += komplets
+                OrderLine.objects.bulk_create(lines)
+                Order.products.through.objects.bulk_create(product_links)
+                Order.komplets.through.objects.bulk_create(komplet_links)
+                BorrowHistory.objects.bulk_create(borrows)
+            self.report.add('order_lines', len(lines))
+            self.report.add('borrow_history', len(borrows))
+            self._saved('orders', len(orders))
+        # wydany sprzęt: stan magazynu i statusy jak po services.checkout
+        for batch in _batches(taken.items(), 500):
+            stock.take(dict(batch))
+        for batch in _batches(list(taken), self.batch_size):
+            Product.objects.filter(pk__in=batch, in_stock=0).update(status='wyjazd')
+        for batch in _batches(out_komplets, self.batch_size):
+            Komplet.objects.filter(pk__in=batch).update(status='wyjazd')
+
+    def pick_items(self, busy_products=None, busy_komplets=None):
+        """Pozycje zamówienia: 1–4 produkty i czasem komplet. Przy bieżących zamówieniach
+        (`busy_*` podane) pomija sprzęt już zajęty i oznacza wybrany jako zajęty."""
+        products = {}
+        for _ in range(self.random.randint(1, 4)):
+            pk = self.random.choice(self.product_ids)
+            if busy_products is not None:
+                if pk in busy_products:
+                    continue
+                busy_products.add(pk)
+            quantity = self.fungible.get(pk, 1)
+            products[pk] = self.random.randint(1, quantity) if quantity > 1 else 1
+        komplets = []
+        if self.komplets and self.random.random() < 0.2:
+            pk = self.random.choice(self.komplet_ids)
+            members = self.komplets[pk]
+            if busy_komplets is None or (pk not in busy_komplets and not busy_products.intersection(members)):
+                komplets.append(pk)
+                if busy_komplets is not None:
+                    busy_komplets.add(pk)
+                    busy_products.update(members)
+        return products, komplets
+
+    def create_services(self):
+        blocked = sorted(self.blocked)
+        count = self.sizes['services']
+        services = []
+        for i in range(count):
+            open_ = i < len(blocked)
+            product = blocked[i] if open_ else self.random.choice(self.product_ids)
+            reported = timezone.make_aware(datetime.datetime.combine(
+                self.today - datetime.timedelta(days=self.random.randint(1, max(2, 365 * self.years))),
+                datetime.time(12)))
+            services.append(Service(
+                product_id=product, description="Usterka (dane testowe)",
+                serwis_id=self.random.choice(self.serwisy), reported_at=reported, resolved=not open_,
+                resolved_at=None if open_ else min(reported + datetime.timedelta(days=self.random.randint(1, 30)),
+                                                   timezone.now())))
+        for batch in _batches(services, self.batch_size):
+            Service.objects.bulk_create(batch)
+            self._saved('services', len(batch))
@@ -0,0 +1,150 @@
+# rentals/exports.py
+"""
+Strumieniowy eksport historii wypożyczeń i zamówień do CSV / JSON Lines.
+
+Wiersze pobierane są przez values() + iterator(chunk_size) – bez tworzenia instancji
+modeli i bez wczytywania całego zbioru do pamięci; nazwy użytkowników, produktów
+i kompletów dołączane są JOIN-em. Wynik to generator kolejnych linii, który widok
+przekazuje do StreamingHttpResponse, a komenda export_data zapisuje do pliku, więc
+zużycie pamięci nie zależy od liczby wierszy.
+"""
+import csv
+import datetime
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.utils.dateparse import parse_date
+
+from .models import BorrowHistory, Order, OrderLine
+
+CHUNK_SIZE = 2000
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson'}
+
+
+class ExportError(ValueError):
+    pass
+
+
+class Echo:
+    """Bufor dla csv.writer, który zamiast zapisywać zwraca sformatowaną linię."""
+
+    def write(self, value):
+        return value
+
+
+def _value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+class BorrowHistoryExport:
+    columns = {
+        'id': 'id',
+        'user': 'user__username',
+        'product_code': 'product__code',
+        'product': 'product__model',
+        'brand': 'product__brand',
+        'quantity': 'quantity',
+        'komplet': 'komplet__name',
+        'order': 'order_id',
+        'borrow_date': 'borrow_date',
+        'return_date': 'return_date',
+    }
+    date_field = 'borrow_date__date'
+
+    def queryset(self):
+        return BorrowHistory.objects.order_by('pk')
+
+    def rows(self, queryset, chunk_size):
+        for row in queryset.values_list(*self.columns.values()).iterator(chunk_size=chunk_size):
+            yield dict(zip(self.columns, row))
+
+
+class OrderExport:
+    """Jeden wiersz na zamówienie; pozycje (kody produktów z liczbą sztuk i nazwy kompletów)
+    doczytywane z OrderLine i tabeli pośredniej osobno dla każdej paczki zamówień."""
+    columns = {
+        'id': 'id',
+        'user': 'user__username',
+        'conference_code': 'conference_code',
+        'status': 'status',
+        'reserved_at': 'reserved_at',
+        'pickup_date': 'pickup_date',
+        'return_date': 'return_date',
+    }
+    item_columns = ('products', 'quantities', 'komplets')
+    date_field = 'pickup_date'
+
+    def queryset(self):
+        return Order.objects.order_by('pk')
+
+    def rows(self, queryset, chunk_size):
+        rows = queryset.values_list(*self.columns.values()).iterator(chunk_size=chunk_size)
+        while batch := list(itertools.islice(rows, chunk_size)):
+            ids = [row[0] for row in batch]
+            items = {pk: {'products': [], 'quantities': [], 'komplets': []} for pk in ids}
+            for order_id, code, quantity in (OrderLine.objects.filter(order_id__in=ids).order_by('order_id', 'product_id')
+                                             .values_list('order_id', 'product__code', 'quantity')):
+                items[order_id]['products'].append(code or '')
+                items[order_id]['quantities'].append(quantity)
+            for order_id, name in (Order.komplets.through.objects.filter(order_id__in=ids)
+                                   .order_by('order_id', 'komplet_id').values_list('order_id', 'komplet__name')):
+                items[order_id]['komplets'].append(name)
+            for row in batch:
+                yield {**dict(zip(self.columns, row)), **items[row[0]]}
+
+
+EXPORTS = {
+    'borrow-history': BorrowHistoryExport,
+    'orders': OrderExport,
+}
+
+
+def filtered(export, date_from=None, date_to=None):
+    queryset = export.queryset()
+    for value, lookup in ((date_from, 'gte'), (date_to, 'lte')):
+        if not value:
+            continue
+        day = parse_date(value) if isinstance(value, str) else value
+        if day is None:
+            raise ExportError(f"Nieprawidłowa data: {value}.")
+        queryset = queryset.filter(**{f'{export.date_field}__{lookup}': day})
+    return queryset
+
+
+def stream(name, fmt='csv', date_from=None, date_to=None, chunk_size=CHUNK_SIZE):
+    """Generator linii eksportu `name` w formacie `fmt`. Błędy parametrów zgłasza od razu."""
+    if name not in EXPORTS:
+        raise ExportError(f"Nieznany eksport: {name}.")
+    if fmt not in FORMATS:
+        raise ExportError(f"Nieznany format: {fmt}.")
+    export = EXPORTS[name]()
+    queryset = filtered(export, date_from, date_to)
+    return _lines(export, queryset, fmt, chunk_size)
+
+
+def _lines(export, queryset, fmt, chunk_size):
+    header = [*export.columns, *getattr(export, 'item_columns', ())]
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(header)
+        for row in export.rows(queryset, chunk_size):
+            yield writer.writerow([' '.join(map(str, v)) if isinstance(v, list) else _value(v) for v in row.values()])
+    else:
+        for row in export.rows(queryset, chunk_size):
+            yield json.dumps({key: _value(value) for key, value in row.items()}, ensure_ascii=False) + '\n'
+
+
+async def aiterate(lines, batch_size=500):
+    """Wersja asynchroniczna dla ASGI – StreamingHttpResponse buforowałby cały
+    synchroniczny generator. Paczki linii pobierane są w jednym wątku (kursor bazy)."""
+    lines = iter(lines)
+
+    def next_batch():
+        return list(itertools.islice(lines, batch_size))
+
+    while batch := await sync_to_async(next_batch)():
+        for line in batch:
+            yield line
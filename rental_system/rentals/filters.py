@@ -0,0 +1,54 @@
+from django.core.exceptions import FieldError, ValidationError as DjangoValidationError
+from django.db.models import Field
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class InvalidFilter(ValueError):
+    """Wartość parametru filtra nie pasuje do pola (lub lookup nie istnieje)."""
+
+    def __init__(self, param, values):
+        self.param = param
+        self.values = values
+        super().__init__(f"Nieprawidłowa wartość: {', '.join(values)}")
+
+
+def _is_exact(lookup):
+    # ostatni człon to nazwa pola/transformu albo 'exact' – porównania (gte, lt, ...) nie łączą się z __in
+    last = lookup.rsplit('__', 1)[-1]
+    return last == 'exact' or last not in Field.get_lookups()
+
+
+def filter_by_params(queryset, params, fields):
+    """Filtruje `queryset` parametrami GET (`params` – QueryDict) wg mapy parametr -> lookup ORM.
+
+    Parametr podany wielokrotnie daje filtr ``__in`` dla porównań dokładnych; dla lookupów
+    zakresowych (``pickup_date__gte``) liczy się ostatnia wartość. Błędna wartość rzuca InvalidFilter.
+    """
+    for param, lookup in fields.items():
+        values = [v for v in params.getlist(param) if v != '']
+        if not values:
+            continue
+        try:
+            if len(values) > 1 and _is_exact(lookup):
+                queryset = queryset.filter(**{f'{lookup}__in': values})
+            else:
+                queryset = queryset.filter(**{lookup: values[-1]})
+        except (ValueError, DjangoValidationError, FieldError):
+            raise InvalidFilter(param, values)
+    return queryset
+
+
+class QueryParamFilterBackend(BaseFilterBackend):
+    """Filtrowanie po stronie serwera na podstawie `filter_fields` viewsetu.
+
+    `filter_fields` mapuje parametr GET na lookup ORM, np.
+    ``{'status': 'status', 'date_from': 'pickup_date__gte'}``.
+    Parametr podany wielokrotnie (``?status=magazyn&status=serwis``) daje filtr ``__in``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        try:
+            return filter_by_params(queryset, request.query_params, getattr(view, 'filter_fields', {}))
+        except InvalidFilter as exc:
+            raise ValidationError({exc.param: str(exc)})
@@ -1,5 +1,9 @@
 from django import forms
 from django.contrib.auth.models import User
+from django.urls import reverse_lazy
+
+from . import availability
+from .models import Komplet, Order, Product
 
 
 class ProfileForm(forms.ModelForm):
@@ -20,3 +24,79 @@ class ProfileForm(forms.ModelForm):
         if commit:
             profile.save()
         return user
+
+
+class PickerWidget(forms.Widget):
+    """Wybór wielu pozycji przez podpowiedzi z endpointu `url` (rentals/async_views.py).
+
+    W przeciwieństwie do SelectMultiple nie przechodzi po całej liście wyboru – renderuje
+    tylko pozycje już wybrane (przy ponownym wyświetleniu formularza), jednym zapytaniem
+    id__in do queryset pola. Z with_quantity każda wybrana pozycja policzalna ma pole
+    quantity_<id> z liczbą sztuk.
+    """
+    template_name = 'rentals/widgets/picker.html'
+    allow_multiple_selected = True
+
+    def __init__(self, url, with_quantity=False, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+        self.with_quantity = with_quantity
+        self.quantities = {}  # wartości pól quantity_<id> z przesłanego formularza
+
+    def value_from_datadict(self, data, files, name):
+        getter = getattr(data, 'getlist', data.get)
+        return getter(name)
+
+    def value_omitted_from_data(self, data, files, name):
+        return False  # jak SelectMultiple – brak wartości oznacza pusty wybór
+
+    def format_value(self, value):
+        if value is None:
+            return []
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        return [str(v) for v in value if v is not None and str(v).isdigit()]
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        ids = context['widget']['value']
+        selected = list(self.choices.queryset.filter(pk__in=ids).order_by('pk')) if ids else []
+        context['widget'].update({
+            'url': str(self.url),
+            'with_quantity': self.with_quantity,
+            'selected': [{
+                'id': item.pk,
+                'label': str(item),
+                'quantity': getattr(item, 'quantity', 1) if self.with_quantity else 1,
+                'value': self.quantities.get(str(item.pk), 1),
+            } for item in selected],
+        })
+        return context
+
+
+class OrderForm(forms.ModelForm):
+    """Formularz zamówienia. Produkty i komplety wybierane są przez PickerWidget, a pola
+    sprawdzają tylko przesłane ID – ModelMultipleChoiceField robi to jednym zapytaniem
+    id__in, więc czas wyświetlenia i walidacji nie zależy od wielkości magazynu.
+    Dostępność w wybranych datach sprawdza dopiero services.checkout."""
+    products = forms.ModelMultipleChoiceField(
+        Product.objects.none(), required=False, label="Produkty",
+        widget=PickerWidget(reverse_lazy('rentals:picker_products'), with_quantity=True))
+    komplets = forms.ModelMultipleChoiceField(
+        Komplet.objects.none(), required=False, label="Komplety",
+        widget=PickerWidget(reverse_lazy('rentals:picker_komplets')))
+
+    class Meta:
+        model = Order
+        fields = ['conference_code', 'products', 'komplets', 'pickup_date', 'return_date']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # dopuszczamy każdy sprzęt poza serwisem/wycofanym (stan kompletu wg jego produktów)
+        self.fields['products'].queryset = Product.objects.exclude(status__in=availability.BLOCKED_STATUSES)
+        self.fields['komplets'].queryset = (availability.with_komplet_availability(Komplet.objects.all())
+                                            .exclude(effective_status__in=availability.BLOCKED_STATUSES))
+        if self.is_bound:
+            self.fields['products'].widget.quantities = {
+                key.removeprefix('quantity_'): value for key, value in self.data.items()
+                if key.startswith('quantity_')}
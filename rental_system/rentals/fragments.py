@@ -0,0 +1,67 @@
+# rentals/fragments.py
+"""
+Cache wyrenderowanych fragmentów stron katalogu (tabela wyników + paginacja).
+
+Klucz fragmentu zawiera wersje kolekcji (CollectionVersion), od których zależy jego
+treść, więc fragment nie wygasa po czasie, tylko przestaje być używany w chwili, gdy
+sygnał (rentals/signals.py) lub operacja masowa podbije wersję – nieaktualna dostępność
+nie może zostać pokazana. Stare wpisy usuwa backend cache (MAX_ENTRIES).
+
+Backend: alias RENTALS_FRAGMENT_CACHE (domyślnie 'default' – locmem, patrz CACHES).
+Liczniki trafień/chybień trzymane są w tym samym cache (przy locmem – per proces).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.safestring import mark_safe
+
+KEY_PREFIX = 'rentals:fragment'
+NAMES = set()  # zarejestrowane fragmenty (nazwy widoków) – do raportu statystyk
+
+
+def get_cache():
+    return caches[getattr(settings, 'RENTALS_FRAGMENT_CACHE', 'default')]
+
+
+def make_key(name, *parts):
+    return f"{KEY_PREFIX}:{name}:{hashlib.sha1(repr(parts).encode()).hexdigest()}"
+
+
+def _count(name, outcome):
+    cache = get_cache()
+    key = f"{KEY_PREFIX}:stats:{name}:{outcome}"
+    try:
+        cache.incr(key)
+    except ValueError:  # brak klucza – pierwszy pomiar
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def load(key, name):
+    html = get_cache().get(key)
+    _count(name, 'miss' if html is None else 'hit')
+    return None if html is None else mark_safe(html)
+
+
+def store(key, html):
+    # bez TTL – unieważnienie następuje przez zmianę wersji w kluczu
+    get_cache().set(key, str(html), timeout=None)
+
+
+def stats():
+    """[{name, hits, misses, ratio}] dla zarejestrowanych fragmentów."""
+    cache = get_cache()
+    rows = []
+    for name in sorted(NAMES):
+        values = cache.get_many([f"{KEY_PREFIX}:stats:{name}:hit", f"{KEY_PREFIX}:stats:{name}:miss"])
+        hits = values.get(f"{KEY_PREFIX}:stats:{name}:hit", 0)
+        misses = values.get(f"{KEY_PREFIX}:stats:{name}:miss", 0)
+        rows.append({'name': name, 'hits': hits, 'misses': misses,
+                     'ratio': hits / (hits + misses) if hits + misses else None})
+    return rows
+
+
+def reset_stats():
+    get_cache().delete_many([f"{KEY_PREFIX}:stats:{name}:{outcome}"
+                             for name in NAMES for outcome in ('hit', 'miss')])
@@ -0,0 +1,105 @@
+# rentals/images.py
+"""
+Pomniejszone wersje (rendycje) zdjęć produktów i awatarów.
+
+Oryginał `products/sm58.jpg` dostaje obok siebie pliki `products/sm58.thumb.<wersja>.jpg`,
+`products/sm58.detail.<wersja>.jpg` itd. – przeskalowane, z poprawioną orientacją (EXIF)
+i ponownie skompresowane do JPEG. Rendycje powstają przy zapisie modelu
+(rentals/signals.py), a brakujące – przy pierwszym żądaniu (widok image_rendition)
+lub komendą build_renditions. Wersja to skrót czasu modyfikacji i rozmiaru oryginału,
+więc nadpisanie pliku pod tą samą nazwą daje nową rendycję i nowy adres – adresy
+można cache'ować bezterminowo.
+"""
+import hashlib
+import io
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# nazwa: (szerokość, wysokość, przycięcie do dokładnego wymiaru)
+RENDITIONS = {
+    'thumb': (160, 160, True),     # miniatura na listach
+    'detail': (1024, 1024, False),  # strona produktu
+    'avatar': (256, 256, True),     # zdjęcie profilowe
+}
+# rendycje tworzone dla pól z obrazami (katalog upload_to → nazwy rendycji)
+FIELD_RENDITIONS = {
+    'products/': ('thumb', 'detail'),
+    'avatars/': ('avatar',),
+}
+JPEG_QUALITY = 82
+
+
+class RenditionError(ValueError):
+    pass
+
+
+def version(name, storage=default_storage):
+    """Wersja oryginału – zmienia się przy każdym nadpisaniu pliku (OSError, gdy go brak)."""
+    stamp = f"{storage.get_modified_time(name).timestamp()}:{storage.size(name)}"
+    return hashlib.sha1(stamp.encode()).hexdigest()[:10]
+
+
+def rendition_name(name, kind, version):
+    root, _ = posixpath.splitext(name)
+    return f"{root}.{kind}.{version}.jpg"
+
+
+def is_rendition(name):
+    # x.thumb.<wersja>.jpg (oraz x.thumb.jpg sprzed wersjonowania)
+    parts = posixpath.basename(name).split('.')
+    return len(parts) >= 3 and any(part in RENDITIONS for part in parts[-3:-1])
+
+
+def kinds_for(name):
+    if is_rendition(name):
+        return ()
+    for prefix, kinds in FIELD_RENDITIONS.items():
+        if name.startswith(prefix):
+            return kinds
+    return ()
+
+
+def render(data, kind):
+    """Bajty JPEG rendycji `kind` obrazu z `data` (plik lub strumień)."""
+    width, height, crop = RENDITIONS[kind]
+    try:
+        with Image.open(data) as image:
+            image = ImageOps.exif_transpose(image)
+            if crop:
+                image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+            else:
+                image.thumbnail((width, height), Image.LANCZOS)  # tylko zmniejsza, zachowuje proporcje
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    except (UnidentifiedImageError, OSError) as exc:
+        raise RenditionError(f"Nie można przetworzyć obrazu: {exc}")
+    return output.getvalue()
+
+
+def create(name, kinds=None, force=False, storage=default_storage):
+    """Tworzy brakujące (lub wszystkie przy force) rendycje oryginału `name`. Zwraca ich nazwy."""
+    created = []
+    current = version(name, storage)
+    for kind in kinds or kinds_for(name):
+        target = rendition_name(name, kind, current)
+        if storage.exists(target):
+            if not force:
+                continue
+            storage.delete(target)
+        with storage.open(name, 'rb') as original:
+            storage.save(target, ContentFile(render(original, kind)))
+        created.append(target)
+    return created
+
+
+def get_or_create(name, kind, storage=default_storage):
+    """Nazwa rendycji bieżącej wersji oryginału – tworzona przy pierwszym użyciu."""
+    if kind not in kinds_for(name) or not storage.exists(name):
+        raise RenditionError(f"Brak rendycji {kind} dla {name}.")
+    create(name, [kind], storage=storage)
+    return rendition_name(name, kind, version(name, storage))
@@ -0,0 +1,165 @@
+# rentals/importing.py
+"""
+Strumieniowy import produktów z plików CSV/XLSX.
+
+Plik czytany jest wiersz po wierszu (nigdy w całości do pamięci), wiersze są
+walidowane i deduplikowane po EAN / numerze seryjnym, a następnie zapisywane
+paczkami przez bulk_create (ID i kody produktów przydziela ProductQuerySet.bulk_create).
+Używane przez komendę import_products oraz widok importu w panelu admina.
+
+Kolumny: brand, model, category (nazwa), serial_number, ean_code, description,
+status, quantity, weight.
+"""
+import csv
+import io
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import counters, search, versioning
+from .models import Category, Product, STATUS_CHOICES
+
+VALID_STATUSES = {value for value, _ in STATUS_CHOICES}
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    created: int = 0
+    duplicates: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)  # [(numer wiersza, komunikat)], max MAX_REPORTED_ERRORS
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, message))
+
+
+def iter_csv(stream, delimiter=','):
+    """Wiersze CSV jako słowniki. `stream` może być plikiem binarnym (np. upload)."""
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    yield from csv.DictReader(stream, delimiter=delimiter)
+
+
+def iter_xlsx(stream):
+    """Wiersze pierwszego arkusza XLSX jako słowniki (openpyxl w trybie read_only)."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RowError("Import XLSX wymaga pakietu openpyxl (pip install openpyxl).")
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(cell or '').strip() for cell in next(rows, ())]
+        for values in rows:
+            yield {name: '' if value is None else str(value) for name, value in zip(header, values)}
+    finally:
+        workbook.close()
+
+
+def iter_rows(stream, filename='', delimiter=','):
+    if filename.lower().endswith('.xlsx'):
+        return iter_xlsx(stream)
+    return iter_csv(stream, delimiter)
+
+
+class ProductImporter:
+    def __init__(self, batch_size=500, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress  # progress(report) wywoływane po każdej paczce
+        self.categories = {c.name: c for c in Category.objects.all()}
+        self.seen_eans = set()
+        self.seen_serials = set()
+
+    def run(self, rows):
+        report = ImportReport()
+        batch = []
+        # numer wiersza liczony od 2 – wiersz 1 to nagłówek
+        for row_number, row in enumerate(rows, start=2):
+            report.rows += 1
+            try:
+                batch.append((row_number, self.build(row)))
+            except RowError as exc:
+                report.add_error(row_number, str(exc))
+            if len(batch) >= self.batch_size:
+                self.flush(batch, report)
+                batch = []
+        self.flush(batch, report)
+        return report
+
+    def build(self, row):
+        row = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+        brand, model = row.get('brand', ''), row.get('model', '')
+        if not brand or not model:
+            raise RowError("Brak marki lub modelu.")
+        category_name = row.get('category', '')
+        if not category_name:
+            raise RowError("Brak kategorii.")
+        status = row.get('status') or 'magazyn'
+        if status not in VALID_STATUSES:
+            raise RowError(f"Nieznany status: {status}.")
+        ean = row.get('ean_code') or None
+        if ean and (len(ean) > 13 or not ean.isdigit()):
+            raise RowError(f"Nieprawidłowy kod EAN: {ean}.")
+        try:
+            quantity = int(row.get('quantity') or 1)
+            weight = Decimal(row['weight']) if row.get('weight') else None
+        except (ValueError, InvalidOperation):
+            raise RowError("Nieprawidłowa ilość lub waga.")
+        if quantity < 0:
+            raise RowError("Ilość nie może być ujemna.")
+        return Product(brand=brand, model=model, category=self.category(category_name),
+                       serial_number=row.get('serial_number') or None, ean_code=ean,
+                       description=row.get('description', ''), status=status,
+                       quantity=quantity, weight=weight)
+
+    def category(self, name):
+        if name not in self.categories:
+            self.categories[name], _ = Category.objects.get_or_create(name=name)
+        return self.categories[name]
+
+    def flush(self, batch, report):
+        if not batch:
+            return
+        eans = {p.ean_code for _, p in batch if p.ean_code}
+        serials = {p.serial_number for _, p in batch if p.serial_number}
+        existing_eans, existing_serials = set(), set()
+        if eans or serials:
+            for ean, serial in (Product.objects
+                                .filter(Q(ean_code__in=eans) | Q(serial_number__in=serials))
+                                .values_list('ean_code', 'serial_number')):
+                existing_eans.add(ean)
+                existing_serials.add(serial)
+
+        products = []
+        for row_number, product in batch:
+            ean, serial = product.ean_code, product.serial_number
+            if (ean and (ean in existing_eans or ean in self.seen_eans)) or \
+                    (serial and (serial in existing_serials or serial in self.seen_serials)):
+                report.duplicates += 1
+                continue
+            if ean:
+                self.seen_eans.add(ean)
+            if serial:
+                self.seen_serials.add(serial)
+            products.append(product)
+
+        with transaction.atomic():
+            created = Product.objects.bulk_create(products)
+            # bulk_create pomija sygnały – liczniki i indeks wyszukiwania aktualizujemy jawnie
+            counters.shift(Counter((p.category_id, p.status) for p in created))
+            search.get_backend().index(created)
+            versioning.bump('product')
+        report.created += len(created)
+        if self.progress:
+            self.progress(report)
@@ -0,0 +1,118 @@
+# rentals/loadtest.py
+"""
+Prosty generator obciążenia HTTP/1.1 na asyncio (bez zewnętrznych zależności).
+
+Każdy z `concurrency` klientów utrzymuje własne połączenie keep-alive i wysyła
+kolejne żądania, aż łącznie zostanie wykonanych `total`. Opcjonalne `read_delay`
+symuluje wolnego klienta (telefon w słabej sieci), który odbiera odpowiedź z opóźnieniem.
+Używane przez komendę load_benchmark do porównania ścieżki WSGI i ASGI.
+"""
+import asyncio
+import statistics
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+
+@dataclass
+class LoadResult:
+    url: str
+    requests: int = 0
+    errors: int = 0
+    statuses: dict = field(default_factory=dict)
+    latencies_ms: list = field(default_factory=list)
+    elapsed_s: float = 0.0
+
+    def summary(self):
+        latencies = sorted(self.latencies_ms) or [0.0]
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+        return {
+            'url': self.url,
+            'requests': self.requests,
+            'errors': self.errors,
+            'statuses': self.statuses,
+            'rps': round(self.requests / self.elapsed_s, 1) if self.elapsed_s else 0.0,
+            'mean_ms': round(statistics.mean(latencies), 2),
+            'p50_ms': round(pct(50), 2),
+            'p95_ms': round(pct(95), 2),
+            'p99_ms': round(pct(99), 2),
+        }
+
+
+async def read_response(reader):
+    """Status i treść odpowiedzi (Content-Length lub chunked)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Serwer zamknął połączenie.")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            body += await reader.readexactly(size)
+            await reader.readline()
+    else:
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers, bytes(body)
+
+
+async def client(url, queue, result, headers, read_delay):
+    parts = urlsplit(url)
+    path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+    request = (f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+               + ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+               + "\r\n").encode('latin-1')
+    reader = writer = None
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            writer.write(request)
+            await writer.drain()
+            if read_delay:
+                await asyncio.sleep(read_delay)
+            status, response_headers, _ = await read_response(reader)
+            if response_headers.get('connection', '').lower() == 'close':
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, ValueError, asyncio.IncompleteReadError):
+            result.errors += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            continue
+        result.latencies_ms.append((time.perf_counter() - start) * 1000)
+        result.requests += 1
+        result.statuses[status] = result.statuses.get(status, 0) + 1
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url, total=500, concurrency=50, headers=None, read_delay=0.0):
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+    result = LoadResult(url)
+    start = time.perf_counter()
+    await asyncio.gather(*[client(url, queue, result, headers or {}, read_delay)
+                           for _ in range(concurrency)])
+    result.elapsed_s = time.perf_counter() - start
+    return result
@@ -0,0 +1,110 @@
+# rentals/mail.py
+"""
+Kolejka wiadomości e-mail (outbox) w bazie danych.
+
+Widoki jedynie zapisują wiadomość (queue_mail), a komenda send_queued_mail
+wysyła je paczkami przez jedno, ponownie używane połączenie SMTP.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 60  # 1 min, 2 min, 4 min, ...
+CLAIM_SECONDS = 600  # po tylu sekundach wiadomość 'sending' przerwanego workera wraca do kolejki
+
+
+def queue_mail(subject, body, to, from_email=''):
+    """Zapisuje wiadomość w kolejce – bez łączenia się z serwerem SMTP."""
+    return OutgoingEmail.objects.create(subject=subject, body=body, to=to, from_email=from_email)
+
+
+def backoff(attempts):
+    """Odstęp przed kolejną próbą rośnie wykładniczo z liczbą nieudanych prób."""
+    return datetime.timedelta(seconds=BACKOFF_SECONDS * 2 ** (attempts - 1))
+
+
+def claim(batch_size=50, now=None, max_attempts=MAX_ATTEMPTS):
+    """Rezerwuje paczkę wiadomości do wysłania w krótkiej transakcji i zwraca ją.
+
+    Wiadomości dostają status 'sending' i dzierżawę do now + CLAIM_SECONDS – jeśli worker
+    padnie w trakcie wysyłki, po jej upływie pobierze je kolejny. Próba jest liczona już
+    przy rezerwacji, więc wiadomość z wygasłą dzierżawą i wyczerpanym limitem prób
+    (przerywająca worker) trafia do 'failed' zamiast do kolejnej paczki.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = OutgoingEmail.objects.filter(status='sending', next_attempt_at__lte=now)
+        expired.filter(attempts__gte=max_attempts).update(
+            status='failed', last_error="Wysyłka przerwana – wyczerpany limit prób.")
+        # skip_locked: kilka równoległych workerów nie pobierze tych samych wiadomości
+        batch = list(OutgoingEmail.objects
+                     .select_for_update(skip_locked=True)
+                     .filter(status__in=('pending', 'sending'), next_attempt_at__lte=now,
+                             attempts__lt=max_attempts)
+                     .order_by('next_attempt_at', 'pk')[:batch_size])
+        if batch:
+            OutgoingEmail.objects.filter(pk__in=[message.pk for message in batch]).update(
+                status='sending', attempts=F('attempts') + 1,
+                next_attempt_at=now + datetime.timedelta(seconds=CLAIM_SECONDS))
+    for message in batch:
+        message.status = 'sending'
+        message.attempts += 1
+    return batch
+
+
+def _record_failure(message, exc, now, max_attempts):
+    message.last_error = str(exc)
+    if message.attempts >= max_attempts:
+        message.status = 'failed'
+    else:
+        message.status = 'pending'
+        message.next_attempt_at = now + backoff(message.attempts)
+    message.save(update_fields=['status', 'next_attempt_at', 'last_error'])
+
+
+def send_queued(batch_size=50, max_attempts=MAX_ATTEMPTS, connection=None):
+    """Wysyła jedną paczkę oczekujących wiadomości. Zwraca (wysłane, nieudane) – (0, 0), gdy
+    nie było czego wysłać.
+
+    Połączenie SMTP i wysyłka odbywają się poza transakcją (bez blokad w bazie), a wynik
+    każdej wiadomości zapisywany jest od razu – przerwanie paczki nie wysyła ponownie
+    wiadomości, które już wyszły.
+    """
+    now = timezone.now()
+    batch = claim(batch_size, now, max_attempts)
+    if not batch:
+        return 0, 0
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as exc:  # serwer niedostępny – próba i backoff dla całej paczki
+        for message in batch:
+            _record_failure(message, exc, now, max_attempts)
+        return 0, len(batch)
+    sent = failed = 0
+    try:
+        for message in batch:
+            email = EmailMessage(message.subject, message.body,
+                                 message.from_email or settings.DEFAULT_FROM_EMAIL,
+                                 [message.to], connection=connection)
+            try:
+                email.send()
+            except Exception as exc:  # błąd jednej wiadomości nie przerywa paczki
+                _record_failure(message, exc, now, max_attempts)
+                failed += 1
+            else:
+                message.status = 'sent'
+                message.sent_at = timezone.now()
+                message.last_error = ''
+                message.save(update_fields=['status', 'sent_at', 'last_error'])
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from rentals import images
+from rentals.models import Product, UserProfile
+
+
+def _init_worker():
+    # przy starcie procesów metodą spawn (macOS/Windows) Django trzeba skonfigurować od nowa
+    django.setup()
+
+
+def _render(name, force):
+    try:
+        return name, images.create(name, force=force), None
+    except (images.RenditionError, OSError) as exc:
+        return name, [], str(exc)
+
+
+class Command(BaseCommand):
+    help = "Tworzy brakujące pomniejszone wersje zdjęć produktów i awatarów (równolegle, pula procesów)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--force', action='store_true', help="Utwórz ponownie także istniejące rendycje.")
+
+    def handle(self, *args, **options):
+        names = set(Product.objects.exclude(image='').exclude(image__isnull=True)
+                    .values_list('image', flat=True).iterator())
+        names |= set(UserProfile.objects.exclude(avatar='').exclude(avatar__isnull=True)
+                     .values_list('avatar', flat=True).iterator())
+        # procesy potomne nie korzystają z bazy – nie mogą dziedziczyć otwartych połączeń
+        connections.close_all()
+
+        created = errors = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = [pool.submit(_render, name, options['force']) for name in sorted(names)]
+            for future in as_completed(futures):
+                name, renditions, error = future.result()
+                if error:
+                    errors += 1
+                    self.stderr.write(f"{name}: {error}")
+                created += len(renditions)
+        self.stdout.write(self.style.SUCCESS(
+            f"Obrazów: {len(names)}, utworzono rendycji: {created}, błędy: {errors}."))
@@ -0,0 +1,76 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from rentals import availability
+from rentals.models import BorrowHistory, Komplet, Order, OrderLine, Product, Service
+
+# Tabele słownikowe, których pełny skan jest akceptowalny (kilkadziesiąt wierszy)
+SMALL_TABLES = {'rentals_category', 'rentals_categorystatuscount', 'rentals_idsequence', 'rentals_serwis'}
+
+
+def main_querysets():
+    """Zapytania z głównych widoków i endpointów API (te same filtry co w rentals/views.py)."""
+    start, end = availability.default_range()
+    user_id = 1
+    return {
+        'product_list': availability.available_between(start, end).select_related('category').order_by('id')[:10],
+        'product_list_category': availability.available_between(start, end, category=1).order_by('id')[:10],
+        'komplet_list': availability.available_komplets_between(start, end).order_by('id')[:10],
+        # to samo zapytanie co availability.unavailable_items() przy składaniu zamówienia
+        'order_availability_check': availability.with_available_quantity(
+            Product.objects.filter(pk__in=[1, 2, 3]), start, end),
+        'api_products_by_status': Product.objects.filter(status='serwis').order_by('-id')[:50],
+        'api_komplets_by_status': Komplet.objects.filter(status='magazyn').order_by('-id')[:50],
+        'dashboard_active_orders': Order.objects.filter(user_id=user_id).exclude(status='returned')
+                                   .order_by('-reserved_at', '-pk')[:20],
+        'dashboard_past_orders': Order.objects.filter(user_id=user_id, status='returned')
+                                 .order_by('-return_date', '-pk')[:20],
+        'dashboard_order_lines': OrderLine.objects.filter(order_id__in=[1, 2]).select_related('product'),
+        'open_borrows_for_products': BorrowHistory.objects.filter(product_id__in=[1, 2], return_date__isnull=True),
+        'open_borrows_for_komplets': BorrowHistory.objects.filter(komplet_id__in=[1, 2], return_date__isnull=True),
+        'product_borrow_history': BorrowHistory.objects.filter(product_id=1).order_by('-return_date'),
+        'open_services': Service.objects.filter(resolved=False).order_by('-reported_at')[:50],
+        # rentals.services.check_in(): rozpoznanie partii zeskanowanych kodów
+        'check_in_lookup': Product.objects.filter(Q(code__in=['SM58_1', '5901234123457'])
+                                                  | Q(ean_code__in=['SM58_1', '5901234123457'])),
+        'lookup_by_ean_or_serial': Product.objects.filter(Q(ean_code='5901234123457') | Q(serial_number='S1')),
+    }
+
+
+def full_scans(plan):
+    """Tabele czytane pełnym skanem według planu EXPLAIN."""
+    if connection.vendor == 'sqlite':
+        # "SCAN tabela" bez "USING ... INDEX" = przejście po całej tabeli
+        tables = re.findall(r'\bSCAN (\w+)\b(?! USING)', plan)
+    else:
+        tables = re.findall(r'Seq Scan on (\w+)', plan)
+    return sorted(set(tables) - SMALL_TABLES)
+
+
+class Command(BaseCommand):
+    help = "Uruchamia EXPLAIN dla głównych zapytań widoków i kończy się błędem, gdy któreś wymaga pełnego skanu tabeli."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help="Wypisz pełne plany zapytań.")
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'postgresql':
+            # na małych tabelach planer i tak wybrałby Seq Scan – sprawdzamy, czy indeks w ogóle istnieje
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+        failures = {}
+        for name, queryset in main_querysets().items():
+            plan = queryset.explain()
+            scans = full_scans(plan)
+            if scans:
+                failures[name] = scans
+            status = self.style.ERROR(f"pełny skan: {', '.join(scans)}") if scans else self.style.SUCCESS("OK")
+            self.stdout.write(f"{name}: {status}")
+            if options['verbose_plans']:
+                self.stdout.write(plan)
+        if failures:
+            raise CommandError(f"Zapytania bez indeksu: {', '.join(failures)}")
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rentals import exports
+
+
+class Command(BaseCommand):
+    help = "Strumieniowy eksport historii wypożyczeń lub zamówień do CSV / JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--format', dest='fmt', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help="Plik wynikowy (domyślnie standardowe wyjście).")
+        parser.add_argument('--date-from')
+        parser.add_argument('--date-to')
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            lines = exports.stream(options['name'], options['fmt'], options['date_from'], options['date_to'],
+                                   options['chunk_size'])
+        except exports.ExportError as exc:
+            raise CommandError(str(exc))
+        count = 0
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for count, line in enumerate(lines, start=1):
+                    output.write(line)
+            self.stderr.write(f"Zapisano {count} linii do {options['output']}.")
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rentals.datagen import SCALES, DataGenerator
+
+
+class Command(BaseCommand):
+    help = ("Generuje syntetyczne dane do testów wydajności (bulk_create), np. --scale medium "
+            "albo --products 20000 --orders 10000. Dane dopisywane są do bieżącej bazy.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small',
+                            help=", ".join(f"{name}: {size['products']} produktów" for name, size in SCALES.items()))
+        for name in ('products', 'komplets', 'users', 'orders', 'services'):
+            parser.add_argument(f'--{name}', type=int, help=f"Liczba: {name} (nadpisuje --scale).")
+        parser.add_argument('--years', type=int, default=3, help="Zakres historii zamówień w latach.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--no-usage', action='store_true',
+                            help="Bez przeliczania podsumowań analitycznych (refresh_usage).")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        sizes = dict(SCALES[options['scale']])
+        sizes.update({name: options[name] for name in sizes if options[name] is not None})
+        if any(value < 0 for value in sizes.values()) or options['years'] < 1 or options['batch_size'] < 1:
+            raise CommandError("Liczności nie mogą być ujemne, a --years i --batch-size muszą być dodatnie.")
+        generator = DataGenerator(**sizes, years=options['years'], seed=options['seed'],
+                                  batch_size=options['batch_size'], progress=self.progress)
+        report = generator.run(refresh_usage=not options['no_usage'])
+        self.stdout.write(self.style.SUCCESS(
+            "Utworzono: " + ", ".join(f"{name}: {count}" for name, count in report.counts.items()) + "."))
+
+    def progress(self, name, count):
+        if self.verbosity > 1:
+            self.stdout.write(f"... {name}: {count}")
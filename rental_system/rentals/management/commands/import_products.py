@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rentals.importing import ProductImporter, RowError, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Strumieniowy import produktów z pliku CSV/XLSX (paczkami przez bulk_create)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--delimiter', default=',')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        mode = 'rb' if path.lower().endswith('.xlsx') else 'r'
+        try:
+            with open(path, mode, **({} if mode == 'rb' else {'encoding': 'utf-8-sig', 'newline': ''})) as stream:
+                importer = ProductImporter(options['batch_size'], progress=self.progress)
+                report = importer.run(iter_rows(stream, path, options['delimiter']))
+        except (OSError, RowError) as exc:
+            raise CommandError(str(exc))
+        for row_number, message in report.errors:
+            self.stderr.write(f"Wiersz {row_number}: {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Wierszy: {report.rows}, dodano: {report.created}, duplikaty: {report.duplicates}, "
+            f"błędy: {report.error_count}."))
+
+    def progress(self, report):
+        self.stdout.write(f"... {report.rows} wierszy, dodano {report.created}")
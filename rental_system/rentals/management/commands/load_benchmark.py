@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+
+from rentals.loadtest import run_load
+
+DEFAULT_PATHS = [
+    '/api/products/?format=json',
+    '/api/async/products/',
+    '/api/komplets/?format=json',
+    '/api/async/komplets/',
+    '/api/async/availability/',
+]
+
+
+class Command(BaseCommand):
+    help = ("Test obciążeniowy endpointów katalogu na uruchomionych serwerach, np. "
+            "--target wsgi=http://127.0.0.1:8000 (gunicorn rental_system.wsgi) "
+            "--target asgi=http://127.0.0.1:8001 (uvicorn rental_system.asgi:application).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, metavar='NAZWA=URL',
+                            help="Serwer do przetestowania (można podać wielokrotnie).")
+        parser.add_argument('--path', action='append', dest='paths',
+                            help="Ścieżka do odpytywania (domyślnie listy produktów/kompletów i dostępność).")
+        parser.add_argument('--requests', type=int, default=500, help="Liczba żądań na ścieżkę.")
+        parser.add_argument('--concurrency', type=int, default=50, help="Liczba równoległych klientów.")
+        parser.add_argument('--read-delay', type=float, default=0.0,
+                            help="Opóźnienie odbioru odpowiedzi w sekundach (symulacja wolnych klientów).")
+        parser.add_argument('--user', help="Użytkownik, dla którego zostanie utworzona sesja logowania.")
+        parser.add_argument('--json', action='store_true', help="Wyniki w formacie JSON.")
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, url = target.partition('=')
+            if not sep or not url.startswith('http://'):
+                raise CommandError(f"Nieprawidłowy cel: {target} (oczekiwano NAZWA=http://host:port).")
+            targets.append((name, url.rstrip('/')))
+        headers = {'Accept': 'application/json'}
+        if options['user']:
+            headers['Cookie'] = f"{settings.SESSION_COOKIE_NAME}={self.login(options['user'])}"
+
+        results = []
+        for name, base_url in targets:
+            for path in options['paths'] or DEFAULT_PATHS:
+                result = asyncio.run(run_load(base_url + path, options['requests'], options['concurrency'],
+                                              headers, options['read_delay']))
+                results.append({'target': name, 'path': path, **result.summary()})
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'cel':<8} {'ścieżka':<32} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+                          f"{'p99 ms':>8} {'błędy':>6}  statusy")
+        for row in results:
+            self.stdout.write(f"{row['target']:<8} {row['path']:<32} {row['rps']:>8} {row['p50_ms']:>8} "
+                              f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['errors']:>6}  {row['statuses']}")
+
+    def login(self, username):
+        """Sesja w bazie dla wskazanego użytkownika – serwery muszą korzystać z tej samej bazy."""
+        try:
+            user = get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Nie ma użytkownika {username}.")
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
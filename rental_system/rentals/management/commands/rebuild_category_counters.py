@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from rentals import counters
+
+
+class Command(BaseCommand):
+    help = "Przelicza liczniki produktów w kategoriach (CategoryStatusCount) i porównuje je ze stanem w tabeli Product."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Tylko sprawdź zgodność (kod wyjścia 1 przy rozbieżności), nic nie zapisuj.")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            diff = counters.compare()
+        else:
+            with transaction.atomic():
+                diff = counters.rebuild()
+        for (category_id, status), (stored, live) in sorted(diff.items(), key=str):
+            self.stdout.write(f"kategoria={category_id} status={status}: licznik={stored}, stan={live}")
+        if options['check'] and diff:
+            raise CommandError(f"Liczniki niezgodne ze stanem magazynu ({len(diff)} pozycji).")
+        self.stdout.write(self.style.SUCCESS("Liczniki zgodne." if not diff else "Liczniki przeliczone."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rentals import search
+
+
+class Command(BaseCommand):
+    help = "Odbudowuje indeks wyszukiwania produktów (np. po imporcie masowym)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        with transaction.atomic():
+            count = backend.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Zindeksowano produktów: {count} ({type(backend).__name__})."))
@@ -0,0 +1,37 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from rentals import analytics
+
+
+def _date(value):
+    day = parse_date(value)
+    if day is None:
+        raise CommandError(f"Nieprawidłowa data: {value}.")
+    return day
+
+
+class Command(BaseCommand):
+    help = ("Przelicza dzienne podsumowania wykorzystania sprzętu (DailyUsage). Domyślnie przyrostowo – "
+            "od ostatniego podsumowanego dnia do dziś; uruchamiać np. co godzinę z crona.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=_date, help="Pierwszy przeliczany dzień (RRRR-MM-DD).")
+        parser.add_argument('--until', type=_date, help="Ostatni przeliczany dzień (domyślnie dziś).")
+        parser.add_argument('--full', action='store_true', help="Przelicz całą historię od pierwszego wypożyczenia.")
+
+    def handle(self, *args, **options):
+        since = options['since']
+        if options['full']:
+            since = analytics.first_activity_day()
+            if since is None:
+                self.stdout.write("Brak danych do podsumowania.")
+                return
+        if since and options['until'] and since > options['until']:
+            raise CommandError("--since nie może być późniejsze niż --until.")
+        started = datetime.datetime.now()
+        days = analytics.refresh(since, options['until'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Przeliczono dni: {days} ({(datetime.datetime.now() - started).total_seconds():.1f} s)."))
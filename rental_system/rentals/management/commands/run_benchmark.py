@@ -0,0 +1,71 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from rentals import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Mierzy czas odpowiedzi, liczbę zapytań i szczyt pamięci dla każdego endpointu z rentals/urls.py "
+            "(w procesie, na bieżącej bazie – np. po generate_data) i zapisuje wynik jako JSON. "
+            "Z --compare porównuje z wcześniejszym wynikiem.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Plik wynikowy JSON (domyślnie tylko tabela na wyjściu).")
+        parser.add_argument('--repeat', type=int, default=5, help="Liczba pomiarów czasu na endpoint.")
+        parser.add_argument('--only', action='append', metavar='NAZWA', help="Tylko wskazane endpointy (nazwy URL).")
+        parser.add_argument('--exclude', action='append', default=[], metavar='NAZWA')
+        parser.add_argument('--user', help="Użytkownik, jako który wykonywane są żądania "
+                                           "(domyślnie tymczasowy administrator, usuwany po pomiarze).")
+        parser.add_argument('--compare', metavar='PLIK', help="Wcześniejszy wynik do porównania.")
+        parser.add_argument('--threshold', type=float, default=1.2,
+                            help="Dopuszczalny wzrost mediany czasu / pamięci (krotność).")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat musi być dodatnie.")
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as stream:
+                    baseline = json.load(stream)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Nie można wczytać {options['compare']}: {exc}")
+
+        # wszystko w transakcji wycofywanej na końcu – pomiar nie zostawia sesji ani użytkownika
+        with transaction.atomic():
+            result = benchmark.run(self.get_user(options['user']), options['repeat'], options['only'],
+                                   options['exclude'], progress=self.progress)
+            transaction.set_rollback(True)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(result, stream, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Zapisano {options['output']}.")
+        if baseline is not None:
+            regressions = benchmark.compare(baseline, result, options['threshold'])
+            for row in regressions:
+                self.stdout.write(self.style.WARNING(f"{row['name']}: {'; '.join(row['problems'])}"))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS("Brak regresji względem " + options['compare'] + "."))
+            elif options['fail_on_regression']:
+                raise CommandError(f"Regresje: {len(regressions)}.")
+
+    def get_user(self, username):
+        model = get_user_model()
+        if username:
+            try:
+                return model.objects.get(username=username)
+            except model.DoesNotExist:
+                raise CommandError(f"Nie ma użytkownika {username}.")
+        return model.objects.create_superuser('benchmark-tmp', 'benchmark@example.com', None)
+
+    def progress(self, row):
+        if 'skipped' in row:
+            self.stdout.write(f"{row['name']:<32} pominięty: {row['skipped']}")
+            return
+        self.stdout.write(f"{row['name']:<32} {row['status']:>4} {row['p50_ms']:>9} ms {row['queries']:>4} zapytań "
+                          f"{row['peak_kib']:>9} KiB  {row['path']}")
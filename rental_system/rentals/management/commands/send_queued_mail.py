@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rentals.mail import MAX_ATTEMPTS, send_queued
+
+
+class Command(BaseCommand):
+    help = ("Wysyła wiadomości z kolejki e-mail (OutgoingEmail) paczkami przez jedno połączenie SMTP, "
+            "aż kolejka będzie pusta.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+        parser.add_argument('--loop', action='store_true', help="Po opróżnieniu kolejki czekaj na nowe wiadomości (worker).")
+        parser.add_argument('--interval', type=float, default=10.0,
+                            help="Przerwa w sekundach, gdy kolejka jest pusta (tryb --loop).")
+
+    def handle(self, *args, **options):
+        # paczka za paczką aż do opróżnienia kolejki; --loop czeka potem na nowe wiadomości
+        while True:
+            try:
+                sent, failed = send_queued(options['batch_size'], options['max_attempts'])
+            except Exception as exc:  # np. serwer SMTP niedostępny – spróbujemy ponownie później
+                if not options['loop']:
+                    raise
+                self.stderr.write(f"Błąd wysyłki: {exc}")
+                sent = failed = 0
+            if sent or failed:
+                self.stdout.write(f"Wysłano: {sent}, błędy: {failed}")
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
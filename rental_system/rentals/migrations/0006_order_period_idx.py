@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0005_alter_product_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'pickup_date', 'return_date'], name='order_period_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    Product = apps.get_model('rentals', 'Product')
+    CategoryStatusCount = apps.get_model('rentals', 'CategoryStatusCount')
+    rows = Product.objects.values('category_id', 'status').annotate(n=models.Count('pk')).order_by()
+    CategoryStatusCount.objects.bulk_create([
+        CategoryStatusCount(category_id=row['category_id'], status=row['status'], count=row['n'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0007_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('magazyn', 'Magazyn'), ('wyjazd', 'Wyjazd'), ('serwis', 'Serwis'), ('odrzucone', 'Odrzucone')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_counts', to='rentals.category')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('category', 'status'), name='unique_category_status_count')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
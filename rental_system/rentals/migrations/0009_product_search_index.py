@@ -0,0 +1,37 @@
+from django.db import migrations
+
+FTS_TABLE = 'rentals_product_fts'
+SEARCH_FIELDS = ('brand', 'model', 'code', 'ean_code', 'serial_number', 'description')
+
+
+def create_fts_index(apps, schema_editor):
+    # Indeks FTS5 tylko na SQLite – inne bazy używają DatabaseSearchBackend (rentals/search.py)
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    columns = ', '.join(SEARCH_FIELDS)
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{columns}, tokenize='unicode61 remove_diacritics 2')")
+    Product = apps.get_model('rentals', 'Product')
+    rows = [(p['id'], *[p[field] or '' for field in SEARCH_FIELDS])
+            for p in Product.objects.values('id', *SEARCH_FIELDS).iterator()]
+    if rows:
+        placeholders = ', '.join(['?'] * (len(SEARCH_FIELDS) + 1))
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES ({placeholders})", rows)
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0008_categorystatuscount'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:17
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, Concat
+
+
+def seed_and_backfill(apps, schema_editor):
+    Product = apps.get_model('rentals', 'Product')
+    IdSequence = apps.get_model('rentals', 'IdSequence')
+    last_id = Product.objects.aggregate(last=models.Max('id'))['last'] or 0
+    IdSequence.objects.update_or_create(name='product', defaults={'next_value': last_id + 1})
+    # produkty bez kodu (np. z importu bulk) dostają kod marka_model_id jednym UPDATE
+    Product.objects.filter(code__isnull=True).update(code=Concat(
+        'brand', models.Value('_'), 'model', models.Value('_'), Cast('id', models.CharField()),
+        output_field=models.CharField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0009_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(seed_and_backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0010_idsequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowhistory',
+            index=models.Index(fields=['product', 'return_date'], name='borrow_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowhistory',
+            index=models.Index(fields=['komplet', 'return_date'], name='borrow_komplet_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowhistory',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['product'], name='borrow_open_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowhistory',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['komplet'], name='borrow_open_komplet_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='komplet',
+            index=models.Index(fields=['status'], name='komplet_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status', '-reserved_at'], name='order_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', 'category'], name='product_status_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('status', 'magazyn')), fields=['category', 'id'], name='product_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['ean_code'], name='product_ean_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['serial_number'], name='product_serial_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['resolved', '-reported_at'], name='service_resolved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(condition=models.Q(('resolved', False)), fields=['-reported_at'], name='service_open_idx'),
+        ),
+    ]
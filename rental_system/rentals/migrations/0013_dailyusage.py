@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0012_updated_at_collectionversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('out_seconds', models.PositiveIntegerField(default=0)),
+                ('service_seconds', models.PositiveIntegerField(default=0)),
+                ('rentals', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('rental_seconds', models.BigIntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='rentals.category')),
+                ('komplet', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='rentals.komplet')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='rentals.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'category'], name='dailyusage_day_category_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('product__isnull', False)), fields=('day', 'product'), name='unique_daily_usage_product'), models.UniqueConstraint(condition=models.Q(('komplet__isnull', False)), fields=('day', 'komplet'), name='unique_daily_usage_komplet')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_stock(apps, schema_editor):
+    """Stan magazynu z dotychczasowych statusów, pozycje zamówień z relacji Order.products.
+
+    Dotąd zamówienie blokowało cały produkt, więc pozycja rezerwuje wszystkie jego sztuki.
+    """
+    Product = apps.get_model('rentals', 'Product')
+    Order = apps.get_model('rentals', 'Order')
+    OrderLine = apps.get_model('rentals', 'OrderLine')
+    Product.objects.update(in_stock=models.F('quantity'))
+    Product.objects.filter(status='wyjazd').update(in_stock=0)
+    links = Order.products.through.objects.values_list('order_id', 'product_id', 'product__quantity')
+    OrderLine.objects.bulk_create(
+        [OrderLine(order_id=order_id, product_id=product_id, quantity=max(quantity, 1))
+         for order_id, product_id, quantity in links.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0013_dailyusage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='borrowhistory',
+            name='quantity',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='in_stock',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='orderline',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='rentals.order'),
+        ),
+        migrations.AddField(
+            model_name='orderline',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_lines', to='rentals.product'),
+        ),
+        migrations.AddIndex(
+            model_name='orderline',
+            index=models.Index(fields=['product', 'order'], name='orderline_product_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderline',
+            constraint=models.UniqueConstraint(fields=('order', 'product'), name='unique_order_line'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderline',
+            constraint=models.CheckConstraint(condition=models.Q(('quantity__gte', 1)), name='order_line_quantity_positive'),
+        ),
+        migrations.RunPython(fill_stock, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.CheckConstraint(condition=models.Q(('in_stock__lte', models.F('quantity'))), name='product_in_stock_lte_quantity'),
+        ),
+    ]
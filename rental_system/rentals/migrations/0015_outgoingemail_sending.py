@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0014_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outgoingemail',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Oczekuje'), ('sending', 'Wysyłanie'), ('sent', 'Wysłano'), ('failed', 'Błąd')], default='pending', max_length=10),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+STATUSES = ('magazyn', 'wyjazd', 'serwis', 'odrzucone')
+COLLECTIONS = ('product', 'komplet', 'order', 'category')
+
+
+def create_counter_rows(apps, schema_editor):
+    # wiersze liczników i wersji istnieją z góry – counters.shift() i versioning.bump() to zawsze
+    # jeden UPDATE, także przy pierwszej zmianie (stała liczba zapytań wydania sprzętu)
+    Category = apps.get_model('rentals', 'Category')
+    CategoryStatusCount = apps.get_model('rentals', 'CategoryStatusCount')
+    CollectionVersion = apps.get_model('rentals', 'CollectionVersion')
+    CategoryStatusCount.objects.bulk_create(
+        [CategoryStatusCount(category_id=category_id, status=status, count=0)
+         for category_id in Category.objects.values_list('pk', flat=True) for status in STATUSES],
+        ignore_conflicts=True)
+    CollectionVersion.objects.bulk_create([CollectionVersion(name=name) for name in COLLECTIONS],
+                                          ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0015_outgoingemail_sending'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_counter_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:15
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+BATCH_SIZE = 1000
+
+
+def link_and_mark_issued(apps, schema_editor):
+    """Dotąd services.checkout() wydawał sprzęt już przy rezerwacji. Teraz wydanie następuje
+    w dniu odbioru (lub przy services.pick_up), więc:
+
+    - pozycje zakończonych zamówień są w całości zwrócone,
+    - dotychczasowe rezerwacje mają sprzęt już wydany – są więc w trakcie wypożyczenia
+      ('ongoing') niezależnie od daty odbioru; stan magazynu się nie zmienia,
+    - wpisy historii łączone są z zamówieniem tylko wtedy, gdy pasuje dokładnie jedno:
+      zamówienie tego użytkownika z tą pozycją, utworzone w tej samej chwili co wpis
+      (checkout) albo odebrane w dniu wpisu. Niejednoznaczne wpisy zostają bez zamówienia
+      i zamykane są jak dotąd, wg stanu produktu.
+    """
+    Order = apps.get_model('rentals', 'Order')
+    OrderLine = apps.get_model('rentals', 'OrderLine')
+    BorrowHistory = apps.get_model('rentals', 'BorrowHistory')
+    F, Q, OuterRef = models.F, models.Q, models.OuterRef
+
+    OrderLine.objects.filter(order__status__in=('returned', 'canceled')).update(returned=F('quantity'))
+    Order.objects.filter(status='reserved').update(status='ongoing')
+
+    matching = (Order.objects.annotate(window_end=models.ExpressionWrapper(
+        F('reserved_at') + datetime.timedelta(minutes=1), output_field=models.DateTimeField()))
+        .filter(Q(reserved_at__lte=OuterRef('borrow_date'), window_end__gt=OuterRef('borrow_date'))
+                | Q(pickup_date=OuterRef('borrow_day'))))
+    for item, related in (('product_id', 'lines__product_id'), ('komplet_id', 'komplets')):
+        candidates = (matching.filter(user_id=OuterRef('user_id'), **{related: OuterRef(item)})
+                      .order_by().values('user_id'))
+        borrows = (BorrowHistory.objects.filter(order__isnull=True, **{f'{item}__isnull': False})
+                   .annotate(borrow_day=TruncDate('borrow_date'))
+                   .annotate(candidates=models.Subquery(candidates.annotate(n=models.Count('pk', distinct=True))
+                                                        .values('n')),
+                             candidate=models.Subquery(candidates.annotate(first=models.Min('pk')).values('first')))
+                   .filter(candidates=1).values_list('pk', 'candidate'))
+        links = [BorrowHistory(pk=pk, order_id=order_id) for pk, order_id in borrows]
+        BorrowHistory.objects.bulk_update(links, ['order'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0017_product_available_idx_statuses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowhistory',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='borrows', to='rentals.order'),
+        ),
+        migrations.AddField(
+            model_name='orderline',
+            name='returned',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='orderline',
+            constraint=models.CheckConstraint(condition=models.Q(('returned__lte', models.F('quantity'))), name='order_line_returned_lte_quantity'),
+        ),
+        migrations.RunPython(link_and_mark_issued, migrations.RunPython.noop),
+    ]
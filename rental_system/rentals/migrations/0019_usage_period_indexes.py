@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals', '0018_order_pickup_and_returns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowhistory',
+            index=models.Index(fields=['return_date', 'borrow_date'], name='borrow_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['resolved_at', 'reported_at'], name='service_period_idx'),
+        ),
+    ]
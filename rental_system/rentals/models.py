@@ -1,8 +1,12 @@
 # rentals/models.py
-from django.db import models
+import threading
+
+from django.db import connection, models, transaction
+from django.db.models.functions import Greatest, Least
 from django.contrib.auth.models import User  # używamy wbudowanego modelu użytkownika
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 # Definicja dostępnych statusów dla produktu/kompletu
 STATUS_CHOICES = [
@@ -12,6 +16,110 @@ STATUS_CHOICES = [
     ('odrzucone', 'Odrzucone'),   # wycofany z użytku
 ]
 
+ID_BLOCK_SIZE = 100  # ile ID rezerwuje jeden zapis do IdSequence (blok w pamięci wątku)
+_id_blocks = threading.local()
+
+
+class _IdBlock:
+    """Zakres [next, end) zarezerwowany w IdSequence i wydawany bez zapytań.
+
+    Blok zarezerwowany wewnątrz transakcji jest ważny dopiero po jej zatwierdzeniu – po
+    wycofaniu UPDATE na IdSequence te same numery mógłby dostać inny proces. Do tego czasu
+    blok żyje tak długo, jak jego callback w kolejce on_commit połączenia (wycofanie
+    transakcji lub savepointu usuwa callback).
+    """
+
+    def __init__(self, first, size):
+        self.next, self.end = first, first + size
+        self.committed = not connection.in_atomic_block
+        if not self.committed:
+            transaction.on_commit(self.mark_committed)
+
+    def mark_committed(self):
+        self.committed = True
+
+    def remaining(self):
+        if not self.committed and not any(func == self.mark_committed for _, func, _ in connection.run_on_commit):
+            return 0
+        return self.end - self.next
+
+    def take(self, count):
+        first = self.next
+        self.next += count
+        return first
+
+
+class IdSequence(models.Model):
+    """ Licznik identyfikatorów przydzielanych przed INSERT (np. ID produktu potrzebne do kodu) """
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+
+    @classmethod
+    def allocate(cls, name, count=1):
+        """Rezerwuje `count` kolejnych ID i zwraca pierwsze z nich.
+
+        UPDATE wykonywany jest przed odczytem, więc blokada wiersza/bazy chroni
+        przed przydzieleniem tego samego bloku dwóm transakcjom.
+        """
+        with transaction.atomic():
+            if not cls.objects.filter(name=name).update(next_value=models.F('next_value') + count):
+                cls.objects.get_or_create(name=name)
+                cls.objects.filter(name=name).update(next_value=models.F('next_value') + count)
+            return cls.objects.filter(name=name).values_list('next_value', flat=True).get() - count
+
+    @classmethod
+    def take(cls, name, count=1):
+        """Zwraca pierwsze z `count` kolejnych ID – z bloku w pamięci wątku, a gdy się
+        wyczerpie, z nowego bloku (jeden allocate() na ID_BLOCK_SIZE identyfikatorów)."""
+        blocks = _id_blocks.__dict__.setdefault('blocks', {})
+        block = blocks.get(name)
+        if block is None or block.remaining() < count:
+            block = blocks[name] = _IdBlock(cls.allocate(name, count + ID_BLOCK_SIZE), count + ID_BLOCK_SIZE)
+        return block.take(count)
+
+    @classmethod
+    def skip_past(cls, name, value):
+        """Przesuwa licznik za ID nadane ręcznie (np. import z zachowanymi ID), żeby kolejne
+        przydziały go nie powtórzyły; blok wątku obejmujący to ID jest porzucany."""
+        updated = cls.objects.filter(name=name).update(next_value=Greatest(models.F('next_value'), value + 1))
+        if not updated:
+            cls.objects.get_or_create(name=name, defaults={'next_value': value + 1})
+        block = _id_blocks.__dict__.get('blocks', {}).get(name)
+        if block is not None and block.next <= value:
+            del _id_blocks.blocks[name]
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+class CollectionVersion(models.Model):
+    """ Wersja kolekcji (np. 'product') podbijana przy każdej zmianie – podstawa ETag list """
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name}: v{self.version}"
+
+
+class ProductQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # ID (a więc i kod) nowych produktów przydzielane jednym blokiem z IdSequence
+        objs = list(objs)
+        new = [obj for obj in objs if obj.pk is None]
+        preset = [obj.pk for obj in objs if obj.pk is not None]
+        if preset:
+            IdSequence.skip_past('product', max(preset))
+        if new:
+            first = IdSequence.take('product', len(new))
+            for offset, obj in enumerate(new):
+                obj.id = first + offset
+        for obj in objs:
+            obj.code = obj.code or obj.build_code()
+            obj.in_stock = obj.initial_stock()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     def __str__(self):
@@ -23,26 +131,75 @@ class Product(models.Model):
     model = models.CharField(max_length=100)        # model
     code = models.CharField(max_length=50, unique=True, null=True, editable=False)   # unikatowy kod produktu
 
+    objects = ProductQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
-        # If the object is new and has no ID yet, save it to generate an ID first
-        if not self.id:
-            super().save(*args, **kwargs)
-            # Generate the product code using brand, model, and the newly generated ID
-            self.code = f"{self.brand}_{self.model}_{self.id}"
-            # Save again to update the code field (use update_fields to avoid recursion)
-            super().save(update_fields=["code"])
-        else:
-            # If updating an existing object, proceed with normal save
-            super().save(*args, **kwargs)
+        if self._state.adding:
+            if not self.id:
+                # ID z bloku zarezerwowanego w IdSequence jest znane przed INSERT, więc kod
+                # produktu zapisujemy od razu – jeden zapis zamiast INSERT + UPDATE
+                self.id = IdSequence.take('product')
+                kwargs.setdefault('force_insert', True)
+            else:
+                IdSequence.skip_past('product', self.id)
+            self.code = self.code or self.build_code()
+            self.in_stock = self.initial_stock()
+        elif kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # in_stock zmieniają wyłącznie warunkowe UPDATE-y (rentals/stock.py) – zwykły zapis
+            # nie może nadpisać go wartością odczytaną przed równoległym wydaniem
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name != 'in_stock']
+            loaded = getattr(self, '_loaded_quantity', None)
+            delta = self.quantity - loaded if loaded is not None else 0
+            if delta:
+                # zmiana liczby posiadanych sztuk przesuwa stan magazynu w tym samym UPDATE
+                self.in_stock = models.Case(
+                    models.When(in_stock__lt=-delta, then=models.Value(0)),
+                    default=Least(models.F('in_stock') + delta, models.Value(self.quantity)))
+                kwargs['update_fields'].append('in_stock')
+        super().save(*args, **kwargs)
+        if isinstance(self.in_stock, models.Expression):
+            self.refresh_from_db(fields=['in_stock'])
+        self._loaded_quantity = self.quantity
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_quantity = instance.__dict__.get('quantity')
+        return instance
+
+    def build_code(self):
+        """Kod produktu: marka_model_id."""
+        return f"{self.brand}_{self.model}_{self.id}"
+
+    def initial_stock(self):
+        return 0 if self.status == 'wyjazd' else self.quantity
 
     serial_number = models.CharField(max_length=100, blank=True, null=True)  # numer seryjny
     description = models.TextField(blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='magazyn')
     category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='products', default="null")
     quantity = models.PositiveIntegerField(default=1)    # ilość sztuk (jeśli dotyczy)
+    in_stock = models.PositiveIntegerField(default=1, editable=False)  # sztuki obecnie w magazynie (rentals/stock.py)
     weight = models.DecimalField(max_digits=6, decimal_places=2, blank=True, null=True)  # waga w kg
     ean_code = models.CharField(max_length=13, blank=True, null=True)  # kod EAN
     image = models.ImageField(upload_to='products/', blank=True, null=True)  # zdjęcie produktu
+    updated_at = models.DateTimeField(auto_now=True)  # ostatnia zmiana (ETag / Last-Modified)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'category'], name='product_status_category_idx'),
+            # lista dostępnych produktów (filtr po kategorii) – indeks częściowy; warunek jak
+            # w availability.available_between() (status IN AVAILABLE_STATUSES)
+            models.Index(fields=['category', 'id'], condition=models.Q(status__in=('magazyn', 'wyjazd')),
+                         name='product_available_idx'),
+            models.Index(fields=['ean_code'], name='product_ean_idx'),
+            models.Index(fields=['serial_number'], name='product_serial_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(in_stock__lte=models.F('quantity')),
+                                   name='product_in_stock_lte_quantity'),
+        ]
 
     def __str__(self):
         return f"{self.brand} {self.model} ({self.code})"
@@ -51,8 +208,14 @@ class Komplet(models.Model):
     name = models.CharField(max_length=100, unique=True)
     products = models.ManyToManyField(Product, related_name='komplets')  # lista produktów wchodzących w skład kompletu
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='magazyn')
+    updated_at = models.DateTimeField(auto_now=True)
     # Historia wypożyczeń kompletu będzie śledzona w modelu BorrowHistory (powiązanie przez pole 'komplet')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='komplet_status_idx'),
+        ]
+
     def __str__(self):
         return f"Komplet: {self.name}"
 
@@ -71,17 +234,64 @@ class Order(models.Model):
     reserved_at = models.DateTimeField(auto_now_add=True)  # data rezerwacji
     pickup_date = models.DateField(null=True, blank=True)  # planowana data odbioru
     return_date = models.DateField(null=True, blank=True)  # planowana data zwrotu
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # wyszukiwanie zamówień nachodzących na przedział dat (rentals/availability.py)
+            models.Index(fields=['status', 'pickup_date', 'return_date'], name='order_period_idx'),
+            # kokpit użytkownika: zamówienia wg statusu, najnowsze najpierw
+            models.Index(fields=['user', 'status', '-reserved_at'], name='order_user_status_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.user.username} ({self.status})"
 
+class OrderLine(models.Model):
+    """ Pozycja zamówienia: liczba sztuk produktu zarezerwowanych w zamówieniu (ewidencja ilościowa) """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='order_lines')
+    quantity = models.PositiveIntegerField(default=1)
+    returned = models.PositiveIntegerField(default=0)  # sztuki tej pozycji zwrócone do magazynu
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product'], name='unique_order_line'),
+            models.CheckConstraint(condition=models.Q(quantity__gte=1), name='order_line_quantity_positive'),
+            models.CheckConstraint(condition=models.Q(returned__lte=models.F('quantity')),
+                                   name='order_line_returned_lte_quantity'),
+        ]
+        indexes = [
+            # suma rezerwacji produktu w zamówieniach z przedziału dat (rentals/availability.py)
+            models.Index(fields=['product', 'order'], name='orderline_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} x{self.quantity} (zamówienie #{self.order_id})"
+
 class BorrowHistory(models.Model):
     """ Historia wypożyczeń poszczególnych produktów i kompletów """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True)
     komplet = models.ForeignKey(Komplet, on_delete=models.CASCADE, null=True, blank=True)
+    # zamówienie, w ramach którego wydano sprzęt (puste dla wpisów sprzed ewidencji pozycji)
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='borrows')
     borrow_date = models.DateTimeField(auto_now_add=True)
     return_date = models.DateTimeField(null=True, blank=True)
+    quantity = models.PositiveIntegerField(default=1)  # liczba wydanych sztuk produktu
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'return_date'], name='borrow_product_idx'),
+            models.Index(fields=['komplet', 'return_date'], name='borrow_komplet_idx'),
+            # otwarte wypożyczenia (bez daty zwrotu) – indeksy częściowe
+            models.Index(fields=['product'], condition=models.Q(return_date__isnull=True),
+                         name='borrow_open_product_idx'),
+            models.Index(fields=['komplet'], condition=models.Q(return_date__isnull=True),
+                         name='borrow_open_komplet_idx'),
+            # wypożyczenia nachodzące na przedział dat (analytics.compute_range)
+            models.Index(fields=['return_date', 'borrow_date'], name='borrow_period_idx'),
+        ]
 
     def __str__(self):
         item = self.product or self.komplet  # który obiekt został wypożyczony
@@ -111,6 +321,15 @@ class Service(models.Model):
     resolved = models.BooleanField(default=False)            # czy naprawa zakończona
     resolved_at = models.DateTimeField(null=True, blank=True)  # data zakończenia naprawy
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['resolved', '-reported_at'], name='service_resolved_idx'),
+            # otwarte zgłoszenia – indeks częściowy
+            models.Index(fields=['-reported_at'], condition=models.Q(resolved=False),
+                         name='service_open_idx'),
+            models.Index(fields=['resolved_at', 'reported_at'], name='service_period_idx'),
+        ]
+
     def __str__(self):
         item = self.product or self.komplet
         return f"Zgłoszenie serwisowe: {item} ({'naprawione' if self.resolved else 'w toku'})"
@@ -125,6 +344,76 @@ class UserProfile(models.Model):
         return f"Profil: {self.user.username}"
 
 
+class CategoryStatusCount(models.Model):
+    """ Zdenormalizowany licznik produktów danej kategorii w danym statusie (rentals/counters.py) """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='status_counts')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'status'], name='unique_category_status_count'),
+        ]
+
+    def __str__(self):
+        return f"{self.category}: {self.status} = {self.count}"
+
+
+class OutgoingEmail(models.Model):
+    """ Kolejka wiadomości e-mail (outbox) wysyłanych przez komendę send_queued_mail """
+    STATUS_CHOICES = [
+        ('pending', 'Oczekuje'),
+        ('sending', 'Wysyłanie'),      # pobrana przez worker (dzierżawa do next_attempt_at)
+        ('sent', 'Wysłano'),
+        ('failed', 'Błąd'),            # przekroczono limit prób
+    ]
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    to = models.EmailField()
+    from_email = models.CharField(max_length=255, blank=True)  # pusty = DEFAULT_FROM_EMAIL
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)  # kolejna próba (backoff)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outgoingemail_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to} ({self.status})"
+
+
+
+class DailyUsage(models.Model):
+    """ Dzienne podsumowanie wykorzystania produktu lub kompletu (rentals/analytics.py) """
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True)
+    komplet = models.ForeignKey(Komplet, on_delete=models.CASCADE, null=True, blank=True)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)  # kategoria produktu
+    out_seconds = models.PositiveIntegerField(default=0)      # czas poza magazynem (wypożyczenie) w danym dniu
+    service_seconds = models.PositiveIntegerField(default=0)  # czas w serwisie w danym dniu
+    rentals = models.PositiveIntegerField(default=0)          # rozpoczęte wypożyczenia
+    returns = models.PositiveIntegerField(default=0)          # zakończone wypożyczenia
+    rental_seconds = models.BigIntegerField(default=0)        # łączna długość wypożyczeń zakończonych tego dnia
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], condition=models.Q(product__isnull=False),
+                                    name='unique_daily_usage_product'),
+            models.UniqueConstraint(fields=['day', 'komplet'], condition=models.Q(komplet__isnull=False),
+                                    name='unique_daily_usage_komplet'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'category'], name='dailyusage_day_category_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.product or self.komplet}"
+
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
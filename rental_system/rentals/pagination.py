@@ -0,0 +1,11 @@
+# rentals/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Paginacja kursorowa (keyset) – kolejne strony to WHERE id < ostatnie_id zamiast OFFSET,
+    więc koszt pobrania głębokiej strony jest taki sam jak pierwszej."""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-id'
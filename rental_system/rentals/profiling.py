@@ -0,0 +1,185 @@
+# rentals/profiling.py
+"""
+Profilowanie żądań: liczba zapytań SQL, czas SQL, powtórzone zapytania (N+1),
+czas renderowania odpowiedzi (szablon / serializacja JSON) i czas całkowity.
+
+Próbkowanie ustawia RENTALS_PROFILING_SAMPLE_RATE (0.0–1.0, domyślnie 0 = wyłączone);
+przy wyłączonym próbkowaniu middleware tylko przekazuje żądanie dalej.
+Wyniki trafiają do bufora cyklicznego w pamięci procesu (RENTALS_PROFILING_BUFFER_SIZE
+ostatnich pomiarów na endpoint) i są prezentowane w raporcie dla personelu.
+"""
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+
+@dataclass
+class Sample:
+    wall_ms: float
+    sql_ms: float
+    queries: int
+    duplicates: int           # zapytania powtórzone z tą samą treścią SQL (bez parametrów)
+    render_ms: float
+    duplicate_sql: str = ''   # najczęściej powtarzane zapytanie
+
+
+_lock = threading.Lock()
+# recorder bieżącego żądania – w trybie ASGI połączenie jest współdzielone przez równoległe żądania
+_current_recorder = ContextVar('profiling_recorder', default=None)
+_samples = defaultdict(lambda: deque(maxlen=getattr(settings, 'RENTALS_PROFILING_BUFFER_SIZE', 500)))
+
+
+def record(endpoint, sample):
+    with _lock:
+        _samples[endpoint].append(sample)
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+
+
+def percentile(values, p):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[p - 1]
+
+
+def report():
+    """Zestawienie per endpoint, posortowane malejąco wg p95 czasu całkowitego."""
+    with _lock:
+        snapshot = {endpoint: list(samples) for endpoint, samples in _samples.items()}
+    rows = []
+    for endpoint, samples in snapshot.items():
+        wall = [s.wall_ms for s in samples]
+        worst = max(samples, key=lambda s: s.duplicates)
+        rows.append({
+            'endpoint': endpoint,
+            'count': len(samples),
+            'p50': percentile(wall, 50),
+            'p95': percentile(wall, 95),
+            'p99': percentile(wall, 99),
+            'queries': statistics.mean(s.queries for s in samples),
+            'sql_ms': statistics.mean(s.sql_ms for s in samples),
+            'render_ms': statistics.mean(s.render_ms for s in samples),
+            'duplicates': worst.duplicates,
+            'duplicate_sql': worst.duplicate_sql,
+        })
+    return sorted(rows, key=lambda row: row['p95'], reverse=True)
+
+
+class QueryRecorder:
+    """execute_wrapper zbierający treść i czas zapytań SQL."""
+
+    def __init__(self):
+        self.sql = Counter()
+        self.queries = 0
+        self.sql_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        if _current_recorder.get() is not self:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - start) * 1000
+            self.queries += 1
+            self.sql[sql] += 1
+
+
+class ProfilingMiddleware:
+    # obsługuje oba tryby – synchroniczny middleware wymusiłby wątek na każde żądanie ASGI
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'RENTALS_PROFILING_SAMPLE_RATE', 0.0)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._profiling = {'render_ms': 0.0}
+        start = time.perf_counter()
+        token = _current_recorder.set(recorder)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+        self.finish(request, recorder, start)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._profiling = {'render_ms': 0.0}
+        start = time.perf_counter()
+        token = _current_recorder.set(recorder)
+        # async ORM wykonuje zapytania we wspólnym wątku sync_to_async – podpinamy się pod jego
+        # połączenia; zapytania innych żądań odfiltrowuje _current_recorder
+        db_connections = await sync_to_async(connections.all)()
+        for connection in db_connections:
+            connection.execute_wrappers.append(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            for connection in db_connections:
+                connection.execute_wrappers.remove(recorder)
+            _current_recorder.reset(token)
+        self.finish(request, recorder, start)
+        return response
+
+    def finish(self, request, recorder, start):
+        wall_ms = (time.perf_counter() - start) * 1000
+        repeated = [(count, sql) for sql, count in recorder.sql.items() if count > 1]
+        top = max(repeated, default=(0, ''))
+        record(request._profiling.get('endpoint', '(nierozpoznany URL)'), Sample(
+            wall_ms=wall_ms, sql_ms=recorder.sql_ms, queries=recorder.queries,
+            duplicates=sum(count - 1 for count, _ in repeated), render_ms=request._profiling['render_ms'],
+            duplicate_sql=top[1][:500]))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not hasattr(request, '_profiling'):
+            return None
+        name = request.resolver_match.view_name if request.resolver_match else view_func.__name__
+        # viewsety DRF: nazwa akcji (list/retrieve/...) zamiast samej metody HTTP
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower())
+        request._profiling['endpoint'] = f"{request.method} {name}" + (f" [{action}]" if action else '')
+        return None
+
+    def process_template_response(self, request, response):
+        # renderowanie (szablon HTML lub serializacja JSON w DRF) następuje zaraz po tym wywołaniu
+        if hasattr(request, '_profiling'):
+            start = time.perf_counter()
+
+            def rendered(response):
+                request._profiling['render_ms'] += (time.perf_counter() - start) * 1000
+
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,134 @@
+# rentals/routing.py
+"""
+Kierowanie odczytów do replik bazy (settings.RENTALS_DB_REPLICAS – aliasy z DATABASES).
+
+Zapisy zawsze trafiają do 'default'. Odczyt idzie do repliki tylko wtedy, gdy widok sam
+o to poprosi (ReplicaReadMixin w rentals/views.py, dekorator reads_from_replica,
+async_api_view) – reszta kodu, w tym wydawanie sprzętu, czyta z bazy głównej. Alias
+wybranej repliki trzyma ContextVar, więc działa to także w widokach asynchronicznych
+i w wątkach sync_to_async.
+
+Read-your-writes: po żądaniu zmieniającym dane (POST/PUT/PATCH/DELETE) middleware
+ustawia ciasteczko, które przez RENTALS_DB_STICKY_SECONDS przypina odczyty użytkownika
+do bazy głównej – własna rezerwacja jest widoczna od razu, zanim dotrze do repliki.
+Sesje i konta użytkowników zawsze czytane są z bazy głównej.
+
+Lokalnie wystarczą dwa pliki SQLite: kopia bazy (np. `sqlite3 db.sqlite3 ".backup replica.sqlite3"`)
+i RENTALS_DB_REPLICAS=replica.sqlite3 (rental_system/database.py).
+"""
+import functools
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+STICKY_COOKIE = 'rentals_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_APPS = {'sessions', 'auth'}  # zawsze z bazy głównej (logowanie tuż po zapisie sesji)
+
+_read_alias = ContextVar('rentals_read_alias', default=None)
+
+
+def replicas():
+    return list(getattr(settings, 'RENTALS_DB_REPLICAS', ()))
+
+
+def read_alias(request):
+    """Replika dla odczytów tego żądania albo None (baza główna): brak replik, żądanie
+    zmieniające dane lub użytkownik świeżo po własnym zapisie."""
+    aliases = replicas()
+    if not aliases or request.method not in SAFE_METHODS or request.COOKIES.get(STICKY_COOKIE):
+        return None
+    return random.choice(aliases)
+
+
+@contextmanager
+def reading_from(alias):
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def routed(iterator, alias):
+    """Iterator odczytujący z `alias` także wtedy, gdy jest konsumowany po powrocie z widoku
+    (StreamingHttpResponse)."""
+    iterator = iter(iterator)
+    while True:
+        with reading_from(alias):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def render_on(alias, response):
+    """Renderuje odpowiedź (szablon / DRF) jeszcze w kontekście repliki – leniwe querysety
+    w szablonie są wykonywane dopiero przy renderowaniu."""
+    if alias is not None and callable(getattr(response, 'render', None)) and not response.is_rendered:
+        with reading_from(alias):
+            response.render()
+    return response
+
+
+def reads_from_replica(view):
+    """Dekorator synchronicznych widoków funkcyjnych tylko do odczytu (raporty)."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = read_alias(request)
+        if alias is None:
+            return view(request, *args, **kwargs)
+        with reading_from(alias):
+            response = view(request, *args, **kwargs)
+        return render_on(alias, response)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Router bazy: odczyty w kontekście reading_from() idą do wybranej repliki, zapisy do 'default'."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return 'default'
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replika to ta sama baza (z opóźnieniem) – obiekty z obu mogą być powiązane
+        aliases = {'default', *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaStickinessMiddleware:
+    """Po żądaniu zmieniającym dane przypina odczyty użytkownika do bazy głównej (ciasteczko)."""
+    # oba tryby – inaczej pod ASGI każde żądanie (także widoki async) szłoby przez sync_to_async
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.stick(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.stick(request, await self.get_response(request))
+
+    def stick(self, request, response):
+        if request.method not in SAFE_METHODS and replicas():
+            response.set_cookie(STICKY_COOKIE, '1', max_age=getattr(settings, 'RENTALS_DB_STICKY_SECONDS', 10),
+                                httponly=True, samesite='Lax')
+        return response
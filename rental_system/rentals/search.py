@@ -0,0 +1,134 @@
+# rentals/search.py
+"""
+Wyszukiwanie produktów po marce, modelu, kodzie, EAN, numerze seryjnym i opisie.
+
+Backend wybierany jest ustawieniem RENTALS_SEARCH_BACKEND (ścieżka do klasy);
+domyślnie na SQLite używany jest indeks pełnotekstowy FTS5, a na innych bazach
+prosty backend oparty o filtry ORM. Indeks aktualizują sygnały (rentals/signals.py),
+a po operacjach masowych – komenda rebuild_search_index.
+
+Backend dostaje queryset wywołującego (np. produkty wolne w przedziale dat) i stosuje
+go w tym samym zapytaniu co ranking – `limit` obcina dopiero wyniki po filtrach.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Case, IntegerField, Q, When
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+SEARCH_FIELDS = ('brand', 'model', 'code', 'ean_code', 'serial_number', 'description')
+FTS_TABLE = 'rentals_product_fts'
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+class DatabaseSearchBackend:
+    """Backend bez dodatkowego indeksu: dopasowanie prefiksowe/częściowe przez ORM.
+
+    Ranking: dokładny kod/EAN/numer seryjny, potem prefiks kodu/EAN, potem pozostałe.
+    """
+
+    def search(self, query, limit=50, queryset=None):
+        terms = _terms(query)
+        if not terms:
+            return []
+        queryset = Product.objects.all() if queryset is None else queryset
+        condition = Q()
+        for term in terms:
+            condition &= Q(*[Q(**{f'{field}__icontains': term}) for field in SEARCH_FIELDS], _connector=Q.OR)
+        query = query.strip()
+        rank = Case(
+            When(Q(code__iexact=query) | Q(ean_code=query) | Q(serial_number__iexact=query), then=0),
+            When(Q(code__istartswith=query) | Q(ean_code__startswith=query), then=1),
+            default=2, output_field=IntegerField(),
+        )
+        return list(queryset.filter(condition).annotate(search_rank=rank)
+                    .order_by('search_rank', 'pk').values_list('pk', flat=True)[:limit])
+
+    def index(self, products):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        return 0
+
+
+class SQLiteFTSBackend:
+    """Indeks FTS5 (tabela wirtualna rentals_product_fts, rowid = Product.id), ranking bm25."""
+
+    # wagi kolumn dla bm25 – trafienie w kod/EAN/numer seryjny liczy się bardziej niż w opis
+    WEIGHTS = (2.0, 2.0, 5.0, 5.0, 5.0, 0.5)
+
+    def search(self, query, limit=50, queryset=None):
+        terms = _terms(query)
+        if not terms:
+            return []
+        # każdy wyraz jako prefiks: "sm5"* AND "shure"*
+        match = ' AND '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(w) for w in self.WEIGHTS)
+        restrict, params, using = '', [], 'default'
+        if queryset is not None:
+            # filtry wywołującego jako podzapytanie w tym samym SELECT – przed LIMIT; MATCH liczony
+            # najpierw w zmaterializowanym CTE, bo `rowid IN (...)` obok MATCH wymusza skan całego FTS
+            subquery, params = queryset.order_by().values('pk').query.sql_with_params()
+            restrict, params, using = f" WHERE m.id IN ({subquery})", list(params), queryset.db
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"WITH m AS MATERIALIZED (SELECT rowid AS id, bm25({FTS_TABLE}, {weights}) AS r "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s) "
+                f"SELECT m.id FROM m{restrict} ORDER BY m.r LIMIT %s", [match, *params, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def index(self, products):
+        rows = [(p.pk, *[getattr(p, field) or '' for field in SEARCH_FIELDS]) for p in products]
+        if not rows:
+            return
+        columns = ', '.join(SEARCH_FIELDS)
+        placeholders = ', '.join(['%s'] * (len(SEARCH_FIELDS) + 1))
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES ({placeholders})", rows)
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in product_ids])
+
+    def rebuild(self, batch_size=1000):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        count = 0
+        batch = []
+        for product in Product.objects.only('pk', *SEARCH_FIELDS).iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                self.index(batch)
+                count += len(batch)
+                batch = []
+        self.index(batch)
+        return count + len(batch)
+
+
+def get_backend():
+    path = getattr(settings, 'RENTALS_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    return DatabaseSearchBackend()
+
+
+def search_products(query, queryset=None, limit=50):
+    """Produkty z `queryset` pasujące do zapytania, posortowane wg trafności (najwyżej `limit`)."""
+    queryset = Product.objects.all() if queryset is None else queryset
+    ids = get_backend().search(query, limit, queryset)
+    if not ids:
+        return queryset.none()
+    order = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)])
+    return queryset.filter(pk__in=ids).order_by(order)
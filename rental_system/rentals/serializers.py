@@ -1,34 +1,115 @@
 # rentals/serializers.py
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Category, Product, Komplet, Order, BorrowHistory, Serwis, Service, UserProfile
+from .models import Category, Product, Komplet, Order, OrderLine, BorrowHistory, Serwis, Service, UserProfile
+from . import availability
 
-class CategorySerializer(serializers.ModelSerializer):
+
+class EagerLoadingMixin:
+    """Serializer deklaruje, jakich relacji potrzebuje; viewset dokłada je do querysetu.
+
+    Dzięki temu liczba zapytań dla listy nie zależy od liczby zwracanych obiektów (brak N+1).
+    Przyjmuje też argument `fields` (sparse fieldset) – serializer zwraca wtedy tylko
+    wskazane pola, a relacje niepotrzebne dla tych pól nie są doładowywane. Relacja o innej
+    nazwie niż pole, które z niej korzysta, jest przypisana do pola w `related_field_names`.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    related_field_names = {}
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def unknown_fields(cls, fields):
+        """Nazwy z `fields`, których serializer nie ma."""
+        available = cls().fields
+        return [name for name in fields if name not in available]
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        def needed(lookup):
+            # relacja jest pomijana tylko gdy odpowiada polu serializera, którego nie zażądano
+            name = getattr(lookup, 'prefetch_through', lookup).split('__')[0]
+            name = cls.related_field_names.get(name, name)
+            return not fields or name in fields or name not in cls.Meta.fields
+
+        select = [f for f in cls.select_related_fields if needed(f)]
+        prefetch = [p for p in cls.prefetch_related_fields if needed(p)]
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+def products_with_category():
+    return Product.objects.select_related('category')
+
+class CategorySerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    prefetch_related_fields = ('status_counts',)
+    related_field_names = {'status_counts': 'counts'}
+    counts = serializers.SerializerMethodField()  # liczba produktów wg statusu (CategoryStatusCount)
+    def get_counts(self, obj):
+        return {c.status: c.count for c in obj.status_counts.all() if c.count}
     class Meta:
         model = Category
-        fields = ['id', 'name']
+        fields = ['id', 'name', 'counts']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('category',)
     category = serializers.StringRelatedField()  # wyświetli nazwę kategorii
     class Meta:
         model = Product
         fields = ['id', 'brand', 'model', 'code', 'serial_number', 'description', 'status',
-                  'category', 'quantity', 'weight', 'ean_code', 'image']
+                  'category', 'quantity', 'in_stock', 'weight', 'ean_code', 'image']
+        read_only_fields = ['in_stock']  # zmieniany tylko przez wydania i zwroty (rentals/stock.py)
 
-class KompletSerializer(serializers.ModelSerializer):
+class KompletSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    prefetch_related_fields = (Prefetch('products', queryset=products_with_category()),)
     products = ProductSerializer(many=True, read_only=True)  # zagnieżdżone produkty (tylko do odczytu)
+    # wyliczane ze statusów produktów (availability.with_komplet_availability)
+    effective_status = serializers.CharField(read_only=True)
+    available = serializers.BooleanField(read_only=True)
     class Meta:
         model = Komplet
-        fields = ['id', 'name', 'status', 'products']
+        fields = ['id', 'name', 'status', 'effective_status', 'available', 'products']
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        queryset = super().setup_eager_loading(queryset, fields)
+        if not fields or {'effective_status', 'available'} & set(fields):
+            queryset = availability.with_komplet_availability(queryset)
+        return queryset
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderLine
+        fields = ['product', 'quantity']
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('user',)
+    prefetch_related_fields = (
+        'lines',
+        Prefetch('products', queryset=products_with_category()),
+        Prefetch('komplets', queryset=availability.with_komplet_availability(Komplet.objects.all())),
+        Prefetch('komplets__products', queryset=products_with_category()),
+    )
     products = ProductSerializer(many=True, read_only=True)
     komplets = KompletSerializer(many=True, read_only=True)
+    lines = OrderLineSerializer(many=True, read_only=True)  # liczba sztuk zarezerwowanych produktów
     user = serializers.StringRelatedField()  # pokaże username
     class Meta:
         model = Order
-        fields = ['id', 'user', 'conference_code', 'status', 'reserved_at', 'pickup_date', 'return_date', 'products', 'komplets']
+        fields = ['id', 'user', 'conference_code', 'status', 'reserved_at', 'pickup_date', 'return_date', 'products',
+                  'lines', 'komplets']
 
-class BorrowHistorySerializer(serializers.ModelSerializer):
+class BorrowHistorySerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('user', 'product', 'komplet')
     user = serializers.StringRelatedField()
     # Pokazujemy nazwę produktu lub kompletu w zależności od tego, co było wypożyczone
     item = serializers.SerializerMethodField()
@@ -38,12 +119,13 @@ class BorrowHistorySerializer(serializers.ModelSerializer):
         model = BorrowHistory
         fields = ['id', 'user', 'item', 'borrow_date', 'return_date']
 
-class SerwisSerializer(serializers.ModelSerializer):
+class SerwisSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Serwis
-        fields = ['id', 'name', 'contact', 'address']
+        fields = ['id', 'name', 'phone_number', 'email', 'street', 'number', 'postal_code', 'city', 'country']
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('product', 'komplet', 'serwis')
     product = serializers.StringRelatedField(required=False)
     komplet = serializers.StringRelatedField(required=False)
     serwis = SerwisSerializer(read_only=True)
@@ -51,7 +133,8 @@ class ServiceSerializer(serializers.ModelSerializer):
         model = Service
         fields = ['id', 'product', 'komplet', 'description', 'reported_at', 'resolved', 'resolved_at', 'serwis']
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('user',)
     user = serializers.StringRelatedField()
     class Meta:
         model = UserProfile
@@ -0,0 +1,288 @@
+# rentals/services.py
+"""
+Operacje zmieniające stan magazynu (wydanie i zwrot sprzętu) wykonywane w jednej transakcji.
+"""
+import re
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+
+from django.db import transaction
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, Value, When
+from django.utils import timezone
+
+from .models import Product, Komplet, Order, OrderLine, BorrowHistory
+from . import availability, counters, stock, versioning
+
+
+class ItemsUnavailable(Exception):
+    """Część wybranego sprzętu jest zajęta w wybranym terminie."""
+
+    def __init__(self, products, komplets):
+        self.products = products
+        self.komplets = komplets
+        super().__init__("Wybrany sprzęt nie jest dostępny w wybranym terminie.")
+
+
+class NotReserved(Exception):
+    """Zamówienie nie czeka na odbiór (zostało już wydane, zwrócone lub anulowane)."""
+
+
+def _is_due(order, today=None):
+    """Czy sprzęt zamówienia wydajemy od razu: odbiór dziś, w przeszłości lub bez daty."""
+    return order.pickup_date is None or order.pickup_date <= (today or timezone.localdate())
+
+
+def checkout(order, products, komplets, quantities=None):
+    """Zapisuje zamówienie: blokada wierszy, kontrola dostępności w przedziale dat
+    i pozycje z liczbą sztuk (rezerwacja). Zamówienie z odbiorem dziś (lub wcześniej)
+    jest od razu wydawane – warunkowe zdjęcie sztuk ze stanu, zmiana statusów jednym
+    UPDATE i historia jednym INSERT; późniejsze wydaje pick_up() w dniu odbioru.
+
+    `quantities` – {product_id: liczba sztuk} (domyślnie po jednej). Liczba zapytań nie
+    zależy od liczby pozycji w koszyku. Rzuca ItemsUnavailable, jeśli któryś produkt/komplet
+    jest zajęty lub brakuje sztuk – wtedy nic nie zostaje zapisane.
+    """
+    product_ids = sorted({p.pk for p in products})
+    komplet_ids = sorted({k.pk for k in komplets})
+    quantities = {pk: (quantities or {}).get(pk, 1) for pk in product_ids}
+    start, end = availability.default_range(order.pickup_date, order.return_date)
+
+    with transaction.atomic():
+        # Blokujemy wybrane produkty oraz produkty wchodzące w skład wybranych kompletów,
+        # żeby równoległe wydanie tego samego sprzętu czekało na zakończenie tej transakcji.
+        # Stała kolejność (po pk) zapobiega zakleszczeniom.
+        members = Komplet.products.through.objects.filter(komplet_id__in=komplet_ids).values('product_id')
+        locked_products = list(Product.objects.select_for_update()
+                               .filter(Q(pk__in=product_ids) | Q(pk__in=members))
+                               .order_by('pk'))
+        locked_komplets = list(Komplet.objects.select_for_update().filter(pk__in=komplet_ids).order_by('pk'))
+        wanted = set(product_ids)
+        wanted_products = [p for p in locked_products if p.pk in wanted]
+
+        busy_products, busy_komplets = availability.unavailable_items(
+            wanted_products, locked_komplets, start, end, quantities=quantities)
+        if busy_products or busy_komplets:
+            raise ItemsUnavailable(busy_products, busy_komplets)
+
+        due = _is_due(order)
+        if due:
+            order.status = 'ongoing'
+        order.save()
+        Order.products.through.objects.bulk_create(
+            [Order.products.through(order_id=order.pk, product_id=pk) for pk in product_ids])
+        OrderLine.objects.bulk_create(
+            [OrderLine(order_id=order.pk, product_id=pk, quantity=quantities[pk]) for pk in product_ids])
+        Order.komplets.through.objects.bulk_create(
+            [Order.komplets.through(order_id=order.pk, komplet_id=pk) for pk in komplet_ids])
+        if due:
+            _issue(order, quantities, komplet_ids)
+    return order
+
+
+def pick_up(order):
+    """Odbiór zarezerwowanego zamówienia: wydaje sprzęt z magazynu (jak checkout() dla
+    zamówienia na dziś) i oznacza zamówienie jako wypożyczone. Rzuca NotReserved dla
+    zamówienia, które nie czeka na odbiór, i ItemsUnavailable, gdy sprzęt jest w serwisie,
+    wciąż poza magazynem (np. nieoddany z poprzedniego zamówienia) lub brakuje sztuk."""
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        if order.status != 'reserved':
+            raise NotReserved(f"Zamówienie #{order.pk} nie oczekuje na odbiór.")
+        quantities = dict(OrderLine.objects.filter(order_id=order.pk).values_list('product_id', 'quantity'))
+        komplet_ids = Order.komplets.through.objects.filter(order_id=order.pk).values('komplet_id')
+        products = list(Product.objects.select_for_update().filter(pk__in=quantities).order_by('pk'))
+        komplets = list(Komplet.objects.select_for_update().filter(pk__in=komplet_ids).order_by('pk'))
+        busy_products = [p for p in products if p.status in availability.BLOCKED_STATUSES]
+        busy_komplets = [k for k in komplets if k.status != 'magazyn']
+        if busy_products or busy_komplets:
+            raise ItemsUnavailable(busy_products, busy_komplets)
+        order.status = 'ongoing'
+        order.save(update_fields=['status', 'updated_at'])
+        _issue(order, quantities, [k.pk for k in komplets])
+    return order
+
+
+def _issue(order, quantities, komplet_ids):
+    """Wydanie sprzętu zamówienia: sztuki ze stanu, statusy i historia wypożyczeń."""
+    if quantities:
+        try:
+            stock.take(quantities)
+        except stock.OutOfStock as exc:
+            raise ItemsUnavailable(exc.products, [])
+        # produkt ma status 'wyjazd' dopiero, gdy w magazynie nie została żadna sztuka
+        counters.move_status(Product.objects.filter(pk__in=quantities, in_stock=0), 'wyjazd')
+    if komplet_ids:
+        Komplet.objects.filter(pk__in=komplet_ids).update(status='wyjazd', updated_at=timezone.now())
+        versioning.bump('komplet')
+    BorrowHistory.objects.bulk_create(
+        [BorrowHistory(user_id=order.user_id, order_id=order.pk, product_id=pk, quantity=n)
+         for pk, n in sorted(quantities.items())]
+        + [BorrowHistory(user_id=order.user_id, order_id=order.pk, komplet_id=pk) for pk in komplet_ids])
+
+
+CHECK_IN_BATCH = 1000  # maksymalna liczba kodów w jednej partii zwrotu
+
+
+@dataclass
+class CheckInResult:
+    products: list = field(default_factory=list)   # kody zwróconych produktów
+    komplets: list = field(default_factory=list)   # nazwy zwróconych kompletów
+    orders: list = field(default_factory=list)     # id zamówień oznaczonych jako zwrócone
+    unknown: list = field(default_factory=list)    # zeskanowane wartości bez dopasowania
+    not_out: list = field(default_factory=list)    # sprzęt, który nie był wypożyczony
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def parse_codes(text):
+    """Kody ze skanera: po jednym w linii (lub rozdzielone spacją/przecinkiem)."""
+    return [code for code in re.split(r'[\s,;]+', text or '') if code]
+
+
+def _is_out(item):
+    return item['status'] == 'wyjazd' or item['borrowed']
+
+
+def _units_out(item):
+    """Sztuki produktu poza magazynem (dla danych sprzed ewidencji ilościowej – wg statusu)."""
+    return item['quantity'] - item['in_stock'] or (1 if _is_out(item) else 0)
+
+
+def check_in(codes, now=None):
+    """Przyjmuje zwrot partii zeskanowanego sprzętu w jednej transakcji.
+
+    Wartość może być kodem produktu (Product.code), kodem EAN albo nazwą kompletu
+    (etykieta skrzyni). Każde zeskanowanie produktu to jedna zwrócona sztuka – kolejne
+    skany tego samego kodu lub EAN-u przyjmują kolejne wydane sztuki (ponowny skan ponad
+    liczbę wydanych jest pomijany). Przywraca sztuki na stan i przypisuje je do pozycji
+    wydanych zamówień (najpierw tych z najwcześniejszym terminem zwrotu), zamyka otwarte
+    wpisy BorrowHistory pozycji, które wróciły w komplecie, przywraca status 'magazyn'
+    i oznacza jako zwrócone zamówienia, których wszystkie pozycje i komplety wróciły.
+    Liczba zapytań nie zależy od liczby kodów w partii.
+    """
+    codes = [code.strip() for code in codes if code and code.strip()]
+    result = CheckInResult()
+    if not codes:
+        return result
+    now = now or timezone.now()
+    values = set(codes)
+
+    with transaction.atomic():
+        # jedno zapytanie po indeksach (unikalny code, product_ean_idx, unikalna nazwa kompletu)
+        products = list(Product.objects.select_for_update()
+                        .filter(Q(code__in=values) | Q(ean_code__in=values))
+                        .annotate(borrowed=Exists(BorrowHistory.objects.filter(
+                            product=OuterRef('pk'), return_date__isnull=True)))
+                        .order_by('pk').values('pk', 'code', 'ean_code', 'status', 'quantity', 'in_stock',
+                                               'borrowed'))
+        komplets = list(Komplet.objects.select_for_update()
+                        .filter(name__in=values)
+                        .annotate(borrowed=Exists(BorrowHistory.objects.filter(
+                            komplet=OuterRef('pk'), return_date__isnull=True)))
+                        .order_by('pk').values('pk', 'name', 'status', 'borrowed'))
+
+        by_code = {item['code']: item for item in products}
+        by_name = {item['name']: item for item in komplets}
+        by_ean = defaultdict(list)
+        for item in products:
+            if item['ean_code'] and _units_out(item):
+                by_ean[item['ean_code']].append(item)
+        known_eans = {item['ean_code'] for item in products}
+        returned_products = defaultdict(int)  # pk -> liczba zwróconych sztuk
+        returned_komplets = {}
+
+        for code in codes:
+            if code in by_code:
+                item = by_code[code]
+                if returned_products[item['pk']] < _units_out(item):
+                    returned_products[item['pk']] += 1
+                elif not returned_products[item['pk']]:
+                    result.not_out.append(code)
+            elif code in by_name:
+                item = by_name[code]
+                if item['pk'] in returned_komplets:
+                    continue  # ponowne zeskanowanie tej samej etykiety
+                if _is_out(item):
+                    returned_komplets[item['pk']] = item
+                else:
+                    result.not_out.append(code)
+            elif code in known_eans:
+                pending = [item for item in by_ean[code] if returned_products[item['pk']] < _units_out(item)]
+                if pending:
+                    returned_products[pending[0]['pk']] += 1
+                else:
+                    result.not_out.append(code)
+            else:
+                result.unknown.append(code)
+
+        returned_products = {pk: n for pk, n in returned_products.items() if n}
+        product_ids = sorted(returned_products)
+        komplet_ids = sorted(returned_komplets)
+        stock.put_back(returned_products)
+        _return_lines(returned_products)
+        if product_ids or komplet_ids:
+            # wypożyczenie kończy się, gdy wróciły wszystkie sztuki jego pozycji zamówienia;
+            # wpisy sprzed ewidencji pozycji (bez zamówienia) – gdy wróciły wszystkie sztuki produktu
+            line_complete = Exists(OrderLine.objects.filter(order_id=OuterRef('order_id'),
+                                                            product_id=OuterRef('product_id'),
+                                                            returned__gte=F('quantity')))
+            legacy_complete = Product.objects.filter(pk__in=product_ids, in_stock=F('quantity')).values('pk')
+            BorrowHistory.objects.filter(
+                Q(line_complete, product_id__in=product_ids, order__isnull=False)
+                | Q(product_id__in=legacy_complete, order__isnull=True)
+                | Q(komplet_id__in=komplet_ids),
+                return_date__isnull=True).update(return_date=now)
+        if product_ids:
+            # sprzęt zgłoszony w międzyczasie do serwisu zostaje w serwisie
+            counters.move_status(Product.objects.filter(pk__in=product_ids, status='wyjazd', in_stock__gt=0),
+                                 'magazyn')
+        if komplet_ids:
+            Komplet.objects.filter(pk__in=komplet_ids, status='wyjazd').update(status='magazyn', updated_at=now)
+            versioning.bump('komplet')
+        result.orders = _complete_orders(product_ids, komplet_ids, now)
+
+    codes_by_pk = {item['pk']: item['code'] for item in products}
+    result.products = [codes_by_pk[pk] for pk in product_ids for _ in range(returned_products[pk])]
+    result.komplets = [returned_komplets[pk]['name'] for pk in komplet_ids]
+    return result
+
+
+def _return_lines(returned_products):
+    """Przypisuje zwrócone sztuki {product_id: n} do pozycji wydanych zamówień – najpierw
+    tych z najwcześniejszym terminem zwrotu. Jeden SELECT i jeden UPDATE na partię."""
+    if not returned_products:
+        return
+    lines = (OrderLine.objects.select_for_update()
+             .filter(product_id__in=returned_products, order__status='ongoing', returned__lt=F('quantity'))
+             .order_by(F('order__return_date').asc(nulls_last=True), 'order_id')
+             .values_list('pk', 'product_id', 'quantity', 'returned'))
+    left = dict(returned_products)
+    increments = {}
+    for pk, product_id, quantity, returned in lines:
+        n = min(left[product_id], quantity - returned)
+        if n:
+            increments[pk] = n
+            left[product_id] -= n
+    if increments:
+        OrderLine.objects.filter(pk__in=increments).update(returned=F('returned') + Case(
+            *[When(pk=pk, then=Value(n)) for pk, n in increments.items()], output_field=IntegerField()))
+
+
+def _complete_orders(product_ids, komplet_ids, now):
+    """Zamyka wydane zamówienia zawierające zwrócony sprzęt, jeśli wróciły wszystkie ich
+    pozycje (sztuki liczone per zamówienie) i komplety."""
+    if not product_ids and not komplet_ids:
+        return []
+    order_komplets = Order.komplets.through.objects
+    ids = list(Order.objects
+               .filter(status='ongoing')
+               .filter(Q(pk__in=OrderLine.objects.filter(product_id__in=product_ids).values('order_id'))
+                       | Q(pk__in=order_komplets.filter(komplet_id__in=komplet_ids).values('order_id')))
+               .exclude(pk__in=OrderLine.objects.filter(returned__lt=F('quantity')).values('order_id'))
+               .exclude(pk__in=order_komplets.filter(komplet__status='wyjazd').values('order_id'))
+               .order_by('pk').values_list('pk', flat=True))
+    if ids:
+        Order.objects.filter(pk__in=ids).update(status='returned', updated_at=now)
+        versioning.bump('order')
+    return ids
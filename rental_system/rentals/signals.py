@@ -0,0 +1,124 @@
+# rentals/signals.py
+from django.db.models.signals import m2m_changed, post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, images, search, versioning
+from .models import Category, Komplet, Order, OrderLine, Product, UserProfile
+
+
+def _counter_key(instance):
+    # __dict__ zamiast atrybutów: pole odroczone (.only/.defer) nie może wywołać zapytania
+    return instance.__dict__.get('category_id'), instance.__dict__.get('status')
+
+
+@receiver(post_init, sender=Product)
+def remember_product_status(sender, instance, **kwargs):
+    instance._counter_key = _counter_key(instance)
+
+
+@receiver(post_save, sender=Product)
+def update_category_counters(sender, instance, created, **kwargs):
+    new = _counter_key(instance)
+    old = None if created else instance._counter_key
+    if old != new:
+        deltas = {new: 1}
+        if old is not None and None not in old:
+            deltas[old] = -1
+        counters.shift(deltas)
+    instance._counter_key = new
+
+
+@receiver(post_delete, sender=Product)
+def decrement_category_counters(sender, instance, **kwargs):
+    if None not in instance._counter_key:
+        counters.shift({instance._counter_key: -1})
+
+
+@receiver(post_save, sender=Category)
+def create_category_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.create_rows([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, **kwargs):
+    search.get_backend().index([instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.get_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Komplet)
+@receiver(post_delete, sender=Komplet)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_collection_version(sender, **kwargs):
+    versioning.bump(sender._meta.model_name)
+
+
+@receiver(m2m_changed, sender=Komplet.products.through)
+@receiver(m2m_changed, sender=Order.products.through)
+@receiver(m2m_changed, sender=Order.komplets.through)
+def touch_m2m_owner(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Zmiana składu kompletu/zamówienia to zmiana właściciela relacji (updated_at i wersja kolekcji)."""
+    if not action.startswith('post_'):
+        return
+    owner = type(instance) if not reverse else model
+    if reverse:
+        # np. product.komplets.add(...) – właścicielami są komplety z pk_set (przy clear nieznane)
+        owners = owner.objects.filter(pk__in=pk_set) if pk_set else owner.objects.none()
+    else:
+        owners = owner.objects.filter(pk=instance.pk)
+    owners.update(updated_at=timezone.now())
+    versioning.bump(owner._meta.model_name)
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def sync_order_lines(sender, instance, action, reverse, pk_set, **kwargs):
+    """Produkt dodany do zamówienia przez relację (admin, order.products.add) rezerwuje jedną sztukę.
+
+    services.checkout() zapisuje tabelę pośrednią bezpośrednio i tworzy pozycje sam.
+    """
+    lookup = 'product_id' if reverse else 'order_id'
+    if action == 'post_add':
+        pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+        OrderLine.objects.bulk_create([OrderLine(order_id=order_id, product_id=product_id)
+                                       for order_id, product_id in pairs], ignore_conflicts=True)
+    elif action == 'post_remove':
+        other = 'order_id' if reverse else 'product_id'
+        OrderLine.objects.filter(**{lookup: instance.pk, f'{other}__in': pk_set}).delete()
+    elif action == 'post_clear':
+        OrderLine.objects.filter(**{lookup: instance.pk}).delete()
+
+
+IMAGE_FIELDS = {Product: 'image', UserProfile: 'avatar'}
+
+
+def _image_name(instance):
+    value = instance.__dict__.get(IMAGE_FIELDS[type(instance)])
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=UserProfile)
+def remember_image(sender, instance, **kwargs):
+    instance._image_name = _image_name(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=UserProfile)
+def create_image_renditions(sender, instance, **kwargs):
+    name = _image_name(instance)
+    if name and name != instance._image_name:
+        try:
+            images.create(name)
+        except images.RenditionError:
+            pass  # uszkodzony plik – widok image_rendition zwróci 404
+    instance._image_name = name
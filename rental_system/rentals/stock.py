@@ -0,0 +1,72 @@
+# rentals/stock.py
+"""
+Ewidencja ilościowa sprzętu policzalnego (kable, baterie, mikrofony w większej liczbie).
+
+Zamiast osobnego wiersza Product na każdą sztukę produkt ma:
+- quantity – liczbę posiadanych sztuk,
+- in_stock – liczbę sztuk obecnie w magazynie,
+a zamówienie rezerwuje N sztuk pozycją OrderLine (wolne sztuki w przedziale dat liczy
+rentals/availability.py jednym zapytaniem z sumą pozycji).
+
+in_stock zmieniają wyłącznie poniższe funkcje – jednym warunkowym UPDATE dla całej
+partii produktów. Warunek `in_stock >= n` sprawdza baza w chwili zapisu, więc dwa
+równoległe wydania nie zejdą poniżej zera (brak odczytu-modyfikacji-zapisu).
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from . import versioning
+from .models import Product
+
+
+class OutOfStock(Exception):
+    """Brak wystarczającej liczby sztuk w magazynie."""
+
+    def __init__(self, products):
+        self.products = products
+        super().__init__("Brak wystarczającej liczby sztuk w magazynie.")
+
+
+def _per_product(quantities, expression):
+    return Case(*[When(pk=pk, then=expression(n)) for pk, n in quantities.items()],
+                output_field=IntegerField())
+
+
+def take(quantities):
+    """Wydaje z magazynu {product_id: liczba sztuk} – wszystko albo nic. Przy braku rzuca
+    OutOfStock z listą brakujących produktów, nie zmieniając stanu."""
+    quantities = {pk: n for pk, n in quantities.items() if n}
+    if not quantities:
+        return
+    condition = Q()
+    for pk, n in quantities.items():
+        condition |= Q(pk=pk, in_stock__gte=n)
+    try:
+        with transaction.atomic():  # savepoint – częściowe wydanie jest wycofywane
+            updated = (Product.objects.filter(condition)
+                       .update(in_stock=F('in_stock') - _per_product(quantities, Value),
+                               updated_at=timezone.now()))
+            if updated != len(quantities):
+                raise OutOfStock([])
+    except OutOfStock:
+        raise OutOfStock(shortages(quantities))
+    versioning.bump('product')
+
+
+def put_back(quantities):
+    """Przyjmuje do magazynu {product_id: liczba sztuk} (nie więcej niż quantity)."""
+    quantities = {pk: n for pk, n in quantities.items() if n}
+    if quantities:
+        (Product.objects.filter(pk__in=quantities)
+         .update(in_stock=Least(F('in_stock') + _per_product(quantities, Value), F('quantity')),
+                 updated_at=timezone.now()))
+        versioning.bump('product')
+
+
+def shortages(quantities):
+    """Produkty, których w magazynie jest mniej niż {product_id: liczba sztuk}."""
+    return [product for product in Product.objects.filter(pk__in=quantities).order_by('pk')
+            if product.in_stock < quantities[product.pk]]
+
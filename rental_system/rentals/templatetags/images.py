@@ -0,0 +1,18 @@
+from django import template
+from django.urls import reverse
+
+from rentals import images
+
+register = template.Library()
+
+
+@register.filter
+def rendition(image, kind):
+    """Adres pomniejszonej wersji obrazu: {{ product.image|rendition:'thumb' }}."""
+    if not image:
+        return ''
+    try:
+        current = images.version(image.name, image.storage)
+    except OSError:  # brak pliku oryginału
+        return ''
+    return reverse('rentals:image_rendition', args=[kind, current, image.name])
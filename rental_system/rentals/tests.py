@@ -1,3 +1,1543 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from rental_system import database
+
+from . import (analytics, availability, benchmark, counters, datagen, exports, forms, fragments, images, importing,
+               loadtest, profiling, routing, search, serializers, services, stock)
+from .mail import CLAIM_SECONDS, claim, queue_mail, send_queued
+from .models import (Category, Product, Komplet, Order, OrderLine, BorrowHistory, Serwis, Service, OutgoingEmail,
+                     DailyUsage)
+
+
+class AvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('jan', 'jan@example.com', 'haslo')
+        cls.category = Category.objects.create(name='Audio')
+        cls.mic = Product.objects.create(brand='Shure', model='SM58', category=cls.category)
+        cls.mixer = Product.objects.create(brand='Yamaha', model='MG10', category=cls.category)
+        cls.komplet = Komplet.objects.create(name='Nagłośnienie')
+        cls.komplet.products.add(cls.mixer)
+        cls.day = datetime.date(2025, 6, 1)
+
+    def book(self, start, end, products=(), komplets=(), status='reserved'):
+        order = Order.objects.create(user=self.user, conference_code='KONF', status=status,
+                                     pickup_date=start, return_date=end)
+        order.products.set(products)
+        order.komplets.set(komplets)
+        return order
+
+    def days(self, n):
+        return self.day + datetime.timedelta(days=n)
+
+    def test_overlapping_order_blocks_product(self):
+        self.book(self.days(0), self.days(3), products=[self.mic])
+        self.assertFalse(availability.is_product_available(self.mic, self.days(2), self.days(5)))
+        self.assertTrue(availability.is_product_available(self.mixer, self.days(2), self.days(5)))
+
+    def test_future_booking_after_return_is_allowed(self):
+        self.book(self.days(0), self.days(3), products=[self.mic])
+        # przedział półotwarty: dzień zwrotu jest wolny dla kolejnego odbioru
+        self.assertTrue(availability.is_product_available(self.mic, self.days(3), self.days(6)))
+
+    def test_same_day_order_blocks_its_day(self):
+        # zapisany zwrot w dniu odbioru = rezerwacja jednodniowa, jak przy default_range
+        self.book(self.days(1), self.days(1), products=[self.mic])
+        self.assertFalse(availability.is_product_available(self.mic, self.days(1), self.days(2)))
+        self.assertFalse(availability.is_product_available(self.mic, self.days(0), self.days(2)))
+        self.assertTrue(availability.is_product_available(self.mic, self.days(2), self.days(3)))
+        self.assertTrue(availability.is_product_available(self.mic, self.days(0), self.days(1)))
+
+    def test_finished_orders_do_not_block(self):
+        self.book(self.days(0), self.days(3), products=[self.mic], status='returned')
+        self.assertTrue(availability.is_product_available(self.mic, self.days(1), self.days(2)))
+
+    def test_komplet_blocked_by_member_product(self):
+        self.book(self.days(0), self.days(3), products=[self.mixer])
+        self.assertFalse(availability.is_komplet_available(self.komplet, self.days(1), self.days(2)))
+
+    def test_product_blocked_by_booked_komplet(self):
+        self.book(self.days(0), self.days(3), komplets=[self.komplet])
+        available = availability.available_between(self.days(1), self.days(2), category=self.category)
+        self.assertEqual(list(available), [self.mic])
+
+    def test_service_status_blocks_regardless_of_dates(self):
+        Product.objects.filter(pk=self.mixer.pk).update(status='serwis')
+        self.assertFalse(availability.is_product_available(self.mixer, self.days(10), self.days(11)))
+        self.assertFalse(availability.is_komplet_available(self.komplet, self.days(10), self.days(11)))
+
+    def test_unavailable_items_query_count_is_constant(self):
+        products = [Product.objects.create(brand='AKG', model=f'C{i}', category=self.category) for i in range(20)]
+        self.book(self.days(0), self.days(3), products=products[:5])
+        with self.assertNumQueries(2):
+            busy_products, busy_komplets = availability.unavailable_items(
+                products, [self.komplet], self.days(1), self.days(2))
+        self.assertEqual(set(busy_products), set(products[:5]))
+        self.assertEqual(busy_komplets, [])
+
+    def test_order_form_rejects_booked_product(self):
+        self.book(self.days(0), self.days(3), products=[self.mic])
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('rentals:order_create'), {
+            'conference_code': 'KONF2',
+            'products': [self.mic.pk],
+            'pickup_date': self.days(1),
+            'return_date': self.days(4),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('products', response.context['form'].errors)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class ApiQueryCountTests(TestCase):
+    """Liczba zapytań dla list API nie może rosnąć wraz z liczbą obiektów."""
+    endpoints = ['categories', 'products', 'komplets', 'orders', 'borrow-history', 'services', 'serwisy']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'haslo')
+        cls.serwis = Serwis.objects.create(name='Serwis Audio')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_batch(self, n):
+        start = Category.objects.count()
+        for i in range(start, start + n):
+            category = Category.objects.create(name=f'Kategoria {i}')
+            products = [Product.objects.create(brand='Marka', model=f'M{i}-{j}', category=category) for j in range(3)]
+            komplet = Komplet.objects.create(name=f'Komplet {i}')
+            komplet.products.set(products[:2])
+            order = Order.objects.create(user=self.user, conference_code=f'K{i}')
+            order.products.set(products[2:])
+            order.komplets.set([komplet])
+            BorrowHistory.objects.create(user=self.user, product=products[0])
+            BorrowHistory.objects.create(user=self.user, komplet=komplet)
+            Service.objects.create(product=products[1], description='usterka', serwis=self.serwis)
+
+    def count_queries(self, endpoint):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/{endpoint}/', format='json')
+        self.assertEqual(response.status_code, 200, endpoint)
+        return len(ctx)
+
+    def test_list_endpoints_have_constant_query_count(self):
+        self.create_batch(2)
+        small = {endpoint: self.count_queries(endpoint) for endpoint in self.endpoints}
+        self.create_batch(10)
+        large = {endpoint: self.count_queries(endpoint) for endpoint in self.endpoints}
+        self.assertEqual(small, large)
+
+
+class ApiListingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ola', 'ola@example.com', 'haslo')
+        cls.audio = Category.objects.create(name='Audio')
+        cls.video = Category.objects.create(name='Video')
+        for i in range(5):
+            Product.objects.create(brand='Shure', model=f'SM{i}', category=cls.audio)
+        Product.objects.create(brand='Sony', model='FX6', category=cls.video, status='serwis')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_pagination(self):
+        first = self.client.get('/api/products/', {'page_size': 4}, format='json').json()
+        self.assertEqual(len(first['results']), 4)
+        self.assertNotIn('count', first)
+        second = self.client.get(first['next'], format='json').json()
+        self.assertEqual(len(second['results']), 2)
+        ids = [p['id'] for p in first['results'] + second['results']]
+        self.assertEqual(ids, sorted(set(ids), reverse=True))
+
+    def test_filtering(self):
+        response = self.client.get('/api/products/', {'status': 'serwis'}, format='json').json()
+        self.assertEqual([p['model'] for p in response['results']], ['FX6'])
+        response = self.client.get('/api/products/', {'category': self.audio.pk}, format='json').json()
+        self.assertEqual(len(response['results']), 5)
+        response = self.client.get('/api/products/', {'category': 'abc'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_repeated_range_parameter_uses_last_value(self):
+        today = datetime.date.today()
+        Order.objects.create(user=self.user, conference_code='A', pickup_date=today)
+        Order.objects.create(user=self.user, conference_code='B', pickup_date=today + datetime.timedelta(days=30))
+        later = (today + datetime.timedelta(days=10)).isoformat()
+        response = self.client.get(f'/api/orders/?date_from={today.isoformat()}&date_from={later}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o['conference_code'] for o in response.json()['results']], ['B'])
+        response = self.client.get(f'/api/borrow-history/?date_from={today.isoformat()}&date_from={later}')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/orders/?date_from=jutro')
+        self.assertEqual(response.status_code, 400)
+
+    def test_sparse_fieldset(self):
+        response = self.client.get('/api/products/', {'fields': 'id,code'}, format='json').json()
+        self.assertEqual(set(response['results'][0]), {'id', 'code'})
+        response = self.client.get('/api/products/', {'fields': 'id,kod'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('kod', response.json()['fields'])
+
+    def test_sparse_fieldset_skips_unused_prefetch(self):
+        categories = Category.objects.all()
+        self.assertEqual(serializers.CategorySerializer.setup_eager_loading(categories, ['id', 'name'])
+                         ._prefetch_related_lookups, ())
+        self.assertEqual(serializers.CategorySerializer.setup_eager_loading(categories, ['counts'])
+                         ._prefetch_related_lookups, ('status_counts',))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/categories/', {'fields': 'id,name'}, format='json')
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'name'})
+        self.assertFalse([q for q in queries if 'rentals_categorystatuscount' in q['sql']])
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ewa', 'ewa@example.com', 'haslo')
+        cls.category = Category.objects.create(name='Światło')
+        cls.products = [Product.objects.create(brand='ARRI', model=f'L{i}', category=cls.category) for i in range(12)]
+        cls.komplets = []
+        for i in range(4):
+            komplet = Komplet.objects.create(name=f'Zestaw {i}')
+            komplet.products.add(cls.products[i])
+            cls.komplets.append(komplet)
+
+    def new_order(self):
+        return Order(user=self.user, conference_code='KONF',
+                     pickup_date=datetime.date(2025, 6, 1), return_date=datetime.date(2025, 6, 3))
+
+    def test_checkout_updates_statuses_and_history(self):
+        order = services.checkout(self.new_order(), self.products[5:8], self.komplets[:2])
+        self.assertEqual(set(order.products.all()), set(self.products[5:8]))
+        self.assertEqual(Product.objects.filter(status='wyjazd').count(), 3)
+        self.assertEqual(Komplet.objects.filter(status='wyjazd').count(), 2)
+        self.assertEqual(BorrowHistory.objects.filter(user=self.user).count(), 5)
+
+    def test_checkout_query_count_does_not_depend_on_basket_size(self):
+        with CaptureQueriesContext(connection) as small:
+            services.checkout(self.new_order(), self.products[4:5], self.komplets[:1])
+        Order.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            services.checkout(self.new_order(), self.products[5:12], self.komplets[1:4])
+        self.assertEqual(len(small), len(large))
+
+    def test_checkout_rejects_booked_items_atomically(self):
+        services.checkout(self.new_order(), [self.products[0]], [])
+        with self.assertRaises(services.ItemsUnavailable) as ctx:
+            services.checkout(self.new_order(), [self.products[6]], [self.komplets[0]])
+        self.assertEqual(ctx.exception.komplets, [self.komplets[0]])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.products[6].pk).status, 'magazyn')
+
+    def test_order_view_checks_out_and_redirects(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('rentals:order_create'), {
+            'conference_code': 'KONF',
+            'products': [self.products[5].pk, self.products[6].pk],
+            'komplets': [self.komplets[1].pk],
+            'pickup_date': '2025-06-01',
+            'return_date': '2025-06-03',
+        })
+        self.assertRedirects(response, reverse('rentals:dashboard'), fetch_redirect_response=False)
+        order = Order.objects.get()
+        self.assertEqual(order.user, self.user)
+        self.assertEqual(order.products.count(), 2)
+        # potwierdzenie trafia do kolejki, a nie bezpośrednio do SMTP
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.get().to, 'ewa@example.com')
+
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise OSError("SMTP niedostępny")
+
+
+class UnreachableEmailBackend(EmailBackend):
+    def open(self):
+        raise OSError("Brak połączenia z SMTP")
+
+
+class CrashingEmailBackend(EmailBackend):
+    """Wysyła pierwszą wiadomość, przy drugiej worker "pada"."""
+
+    def send_messages(self, messages):
+        if mail.outbox:
+            raise KeyboardInterrupt
+        return super().send_messages(messages)
+
+
+class MailQueueTests(TestCase):
+    def test_command_sends_queued_mail_over_one_connection(self):
+        for i in range(3):
+            queue_mail(f"Temat {i}", "Treść", f"user{i}@example.com")
+        call_command('send_queued_mail', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutgoingEmail.objects.exclude(status='sent').exists())
+
+    def test_command_drains_queue_in_batches(self):
+        for i in range(5):
+            queue_mail(f"Temat {i}", "Treść", f"user{i}@example.com")
+        out = io.StringIO()
+        call_command('send_queued_mail', '--batch-size', '2', stdout=out)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(out.getvalue().count("Wysłano"), 3)
+
+    @override_settings(EMAIL_BACKEND='rentals.tests.FailingEmailBackend')
+    def test_failed_mail_is_retried_with_backoff(self):
+        message = queue_mail("Temat", "Treść", "user@example.com")
+        self.assertEqual(send_queued(max_attempts=2), (0, 1))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('pending', 1))
+        self.assertIn("SMTP", message.last_error)
+        # przed upływem backoffu wiadomość nie jest pobierana ponownie
+        self.assertEqual(send_queued(max_attempts=2), (0, 0))
+        OutgoingEmail.objects.update(next_attempt_at=message.created_at)
+        send_queued(max_attempts=2)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('failed', 2))
+
+    @override_settings(EMAIL_BACKEND='rentals.tests.UnreachableEmailBackend')
+    def test_connection_failure_is_recorded(self):
+        message = queue_mail("Temat", "Treść", "user@example.com")
+        self.assertEqual(send_queued(), (0, 1))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('pending', 1))
+        self.assertIn("SMTP", message.last_error)
+        self.assertGreater(message.next_attempt_at, timezone.now())
+
+    @override_settings(EMAIL_BACKEND='rentals.tests.CrashingEmailBackend')
+    def test_interrupted_batch_keeps_sent_messages(self):
+        first = queue_mail("Temat 1", "Treść", "a@example.com")
+        second = queue_mail("Temat 2", "Treść", "b@example.com")
+        with self.assertRaises(KeyboardInterrupt):
+            send_queued()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, 'sent')
+        self.assertEqual((second.status, second.attempts), ('sending', 1))
+        # do upływu dzierżawy nikt jej nie pobiera, potem wraca do wysyłki – bez ponownej wysyłki pierwszej
+        self.assertEqual(claim(now=timezone.now()), [])
+        later = timezone.now() + datetime.timedelta(seconds=CLAIM_SECONDS + 1)
+        self.assertEqual([m.pk for m in claim(now=later)], [second.pk])
+
+    def test_expired_claim_over_attempt_limit_fails(self):
+        message = queue_mail("Temat", "Treść", "user@example.com")
+        # worker padał przy każdej próbie – dzierżawa wygasła po ostatniej
+        OutgoingEmail.objects.update(status='sending', attempts=2)
+        later = timezone.now() + datetime.timedelta(seconds=1)
+        self.assertEqual(claim(now=later, max_attempts=2), [])
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('failed', 2))
+
+
+class CategoryCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('adam', 'adam@example.com', 'haslo')
+        cls.audio = Category.objects.create(name='Audio')
+        cls.video = Category.objects.create(name='Video')
+
+    def counts(self, category):
+        return counters.summary()[category]
+
+    def test_counters_follow_saves_and_deletes(self):
+        mic = Product.objects.create(brand='Shure', model='SM58', category=self.audio)
+        Product.objects.create(brand='Shure', model='SM57', category=self.audio)
+        self.assertEqual(self.counts(self.audio), {'magazyn': 2})
+        mic.status = 'serwis'
+        mic.save()
+        self.assertEqual(self.counts(self.audio), {'magazyn': 1, 'serwis': 1})
+        mic.category = self.video
+        mic.save()
+        self.assertEqual(self.counts(self.video), {'serwis': 1})
+        mic.delete()
+        self.assertEqual(self.counts(self.video), {})
+        self.assertEqual(counters.compare(), {})
+
+    def test_checkout_moves_counters_in_bulk(self):
+        products = [Product.objects.create(brand='Sony', model=f'A{i}', category=self.video) for i in range(3)]
+        order = Order(user=self.user, conference_code='KONF')
+        services.checkout(order, products[:2], [])
+        self.assertEqual(self.counts(self.video), {'magazyn': 1, 'wyjazd': 2})
+        self.assertEqual(counters.compare(), {})
+
+    def test_rebuild_command_detects_and_fixes_drift(self):
+        Product.objects.create(brand='Sony', model='FX3', category=self.video)
+        Product.objects.update(status='serwis')  # zmiana z pominięciem liczników
+        with self.assertRaises(CommandError):
+            call_command('rebuild_category_counters', '--check', stdout=io.StringIO())
+        call_command('rebuild_category_counters', stdout=io.StringIO())
+        self.assertEqual(self.counts(self.video), {'serwis': 1})
+        call_command('rebuild_category_counters', '--check', stdout=io.StringIO())
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ala', 'ala@example.com', 'haslo')
+        category = Category.objects.create(name='Audio')
+        cls.sm58 = Product.objects.create(brand='Shure', model='SM58', category=category,
+                                          ean_code='0042406019', description='Mikrofon dynamiczny')
+        cls.beta = Product.objects.create(brand='Shure', model='Beta 58A', category=category,
+                                          serial_number='XB-1234')
+        cls.mixer = Product.objects.create(brand='Yamaha', model='MG10XU', category=category,
+                                           description='Mikser z efektami')
+
+    def ids(self, query, backend=None):
+        backend = backend or search.get_backend()
+        return backend.search(query)
+
+    def test_prefix_and_multi_term_search(self):
+        self.assertEqual(self.ids('sm5'), [self.sm58.pk])
+        self.assertEqual(set(self.ids('shure')), {self.sm58.pk, self.beta.pk})
+        self.assertEqual(self.ids('shure mikro'), [self.sm58.pk])
+        self.assertEqual(self.ids('004240'), [self.sm58.pk])
+        self.assertEqual(self.ids('xb'), [self.beta.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.mixer.model = 'TF1'
+        self.mixer.description = 'Konsoleta cyfrowa'
+        self.mixer.save()
+        self.assertEqual(self.ids('tf1'), [self.mixer.pk])
+        self.assertEqual(self.ids('efekt'), [])
+        self.mixer.delete()
+        self.assertEqual(self.ids('tf1'), [])
+
+    def test_database_backend(self):
+        backend = search.DatabaseSearchBackend()
+        self.assertEqual(self.ids(self.sm58.code, backend)[0], self.sm58.pk)
+        self.assertEqual(set(self.ids('shure', backend)), {self.sm58.pk, self.beta.pk})
+
+    def test_limit_applies_after_caller_filters(self):
+        video = Category.objects.create(name='Video')
+        # słabsze trafienie (tylko opis) w kategorii, po której filtruje wywołujący
+        camera = Product.objects.create(brand='Sony', model='FX6', category=video, description='Shure w zestawie')
+        for backend in (search.SQLiteFTSBackend(), search.DatabaseSearchBackend()):
+            with self.subTest(backend=type(backend).__name__):
+                self.assertNotIn(camera.pk, backend.search('shure', limit=2))
+                self.assertEqual(backend.search('shure', 2, Product.objects.filter(category=video)), [camera.pk])
+        self.assertEqual(list(search.search_products('shure', Product.objects.filter(category=video), limit=2)),
+                         [camera])
+
+    def test_match_runs_before_caller_filters(self):
+        # rowid z podzapytania nie może sterować FTS (plan "INDEX 0:=M…" = MATCH dla każdego wiersza)
+        with CaptureQueriesContext(connection) as queries:
+            search.SQLiteFTSBackend().search('sh', 5, Product.objects.filter(category=self.sm58.category))
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + queries.captured_queries[-1]['sql'])
+            plan = [row[3] for row in cursor.fetchall()]
+        self.assertIn(f'SCAN {search.FTS_TABLE} VIRTUAL TABLE INDEX 0:M6', plan)
+
+    def test_search_endpoint_and_list_view(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/products/search/', {'q': 'mikser'}, format='json')
+        self.assertEqual([p['id'] for p in response.json()], [self.mixer.pk])
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('rentals:product_list'), {'q': 'beta'})
+        self.assertEqual(list(response.context['products']), [self.beta])
+
+
+class ProductCodeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Audio')
+
+    def test_save_writes_product_row_once(self):
+        Product.objects.create(brand='AKG', model='C414', category=self.category)  # rezerwuje blok ID
+        with CaptureQueriesContext(connection) as ctx:
+            product = Product.objects.create(brand='Shure', model='SM58', category=self.category)
+        writes = [q['sql'] for q in ctx if not q['sql'].startswith('SELECT')]
+        # jedyny zapis do tabeli produktów to INSERT; pozostałe to liczniki, indeks wyszukiwania i wersja
+        self.assertEqual([sql.split()[0] for sql in writes if 'rentals_product"' in sql], ['INSERT'])
+        self.assertFalse([sql for sql in writes if 'rentals_idsequence' in sql or 'SAVEPOINT' in sql])
+        self.assertEqual(len(writes), 5)
+        self.assertEqual(Product.objects.get(pk=product.pk).code, f'Shure_SM58_{product.pk}')
+
+    def test_id_block_is_dropped_with_rolled_back_transaction(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            lost = Product.objects.create(brand='AKG', model='C414', category=self.category)
+            raise RuntimeError
+        # po wycofaniu zarezerwowany blok mógł trafić do innego procesu – nowy allocate()
+        with CaptureQueriesContext(connection) as ctx:
+            product = Product.objects.create(brand='Shure', model='SM58', category=self.category)
+        self.assertTrue([q for q in ctx if 'rentals_idsequence' in q['sql']])
+        self.assertEqual(product.pk, lost.pk)
+
+    def test_bulk_create_allocates_ids_and_codes(self):
+        first = Product.objects.create(brand='AKG', model='C414', category=self.category)
+        created = Product.objects.bulk_create(
+            [Product(brand='Sennheiser', model=f'E{i}', category=self.category) for i in range(3)])
+        self.assertEqual([p.pk for p in created], [first.pk + 1, first.pk + 2, first.pk + 3])
+        self.assertEqual(sorted(Product.objects.values_list('code', flat=True)),
+                         sorted([first.code] + [f'Sennheiser_E{i}_{first.pk + 1 + i}' for i in range(3)]))
+
+
+    def test_explicit_ids_are_inserted_with_codes(self):
+        Product.objects.create(brand='AKG', model='C414', category=self.category)  # blok ID w pamięci
+        product = Product(id=5000, brand='Shure', model='SM58', category=self.category, quantity=3)
+        product.save()
+        bulk = Product.objects.bulk_create([Product(id=6000, brand='Sony', model='FX6', category=self.category),
+                                            Product(brand='Sony', model='FX3', category=self.category)])
+        self.assertEqual(Product.objects.get(pk=5000).code, 'Shure_SM58_5000')
+        self.assertEqual(Product.objects.get(pk=5000).in_stock, 3)
+        self.assertEqual(Product.objects.get(pk=6000).code, 'Sony_FX6_6000')
+        # kolejne ID z sekwencji omijają nadane ręcznie
+        self.assertEqual(bulk[1].pk, 6001)
+        self.assertEqual(Product.objects.create(brand='Shure', model='SM7B', category=self.category).pk, 6002)
+
+class ProductImportTests(TestCase):
+    CSV = (
+        "brand,model,category,serial_number,ean_code,status,quantity\n"
+        "Shure,SM58,Audio,S1,5901234123457,magazyn,1\n"
+        "Shure,SM58,Audio,S2,5901234123457,magazyn,1\n"   # duplikat EAN w pliku
+        "Sony,FX6,Video,S3,,serwis,1\n"
+        ",Bez marki,Audio,,,,\n"                            # błąd walidacji
+        "Yamaha,MG10,Audio,S4,,nieznany,1\n"                 # błąd walidacji
+        "Yamaha,MG12,Audio,S1,,magazyn,1\n"                  # duplikat numeru seryjnego
+        "AKG,C414,Audio,S5,,magazyn,2\n"
+    )
+
+    def test_import_batches_validates_and_deduplicates(self):
+        Product.objects.create(brand='AKG', model='C414', serial_number='S5',
+                               category=Category.objects.create(name='Audio'))
+        progress = []
+        report = importing.ProductImporter(batch_size=2, progress=progress.append).run(
+            importing.iter_rows(io.StringIO(self.CSV), 'produkty.csv'))
+        self.assertEqual((report.rows, report.created, report.duplicates, report.error_count), (7, 2, 3, 2))
+        self.assertEqual([row for row, _ in report.errors], [5, 6])
+        self.assertEqual(len(progress), 3)  # 5 poprawnych wierszy w paczkach po 2
+        fx6 = Product.objects.get(model='FX6')
+        self.assertEqual(fx6.code, f'Sony_FX6_{fx6.pk}')
+        self.assertEqual(fx6.category.name, 'Video')
+        self.assertFalse(Product.objects.filter(code__isnull=True).exists())
+        self.assertEqual(counters.compare(), {})
+        self.assertEqual(search.get_backend().search('fx6'), [fx6.pk])
+
+    def test_import_command(self):
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'produkty.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.CSV)
+            call_command('import_products', path, stdout=out, stderr=io.StringIO())
+        self.assertIn('dodano: 3', out.getvalue())
+
+
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('kasia', 'kasia@example.com', 'haslo', is_staff=True)
+        category = Category.objects.create(name='Audio')
+        for i in range(3):
+            Product.objects.create(brand='Shure', model=f'SM{i}', category=category)
+
+    def setUp(self):
+        profiling.reset()
+        self.addCleanup(profiling.reset)
+        self.client.force_login(self.user)
+
+    def test_disabled_sampling_records_nothing(self):
+        self.client.get(reverse('rentals:product_list'))
+        self.assertEqual(profiling.report(), [])
+
+    @override_settings(RENTALS_PROFILING_SAMPLE_RATE=1.0)
+    def test_samples_are_recorded_per_endpoint(self):
+        for _ in range(3):
+            self.client.get(reverse('rentals:product_list'))
+        self.client.get('/api/products/', HTTP_ACCEPT='application/json')
+        rows = {row['endpoint']: row for row in profiling.report()}
+        self.assertEqual(rows['GET rentals:product_list']['count'], 3)
+        self.assertGreater(rows['GET rentals:product_list']['queries'], 0)
+        self.assertIn('GET rentals:product-list [list]', rows)
+        response = self.client.get(reverse('rentals:profiling_report'))
+        self.assertContains(response, 'rentals:product_list')
+
+    @override_settings(RENTALS_PROFILING_SAMPLE_RATE=1.0)
+    def test_repeated_queries_are_reported(self):
+        def n_plus_one(request):
+            for product in Product.objects.all():
+                product.category.name  # zapytanie dla każdego produktu
+            return HttpResponse()
+        middleware = profiling.ProfilingMiddleware(n_plus_one)
+        middleware(RequestFactory().get('/'))
+        row = profiling.report()[0]
+        self.assertEqual(row['duplicates'], 2)
+        self.assertIn('rentals_category', row['duplicate_sql'])
+
+
+class QueryPlanTests(TestCase):
+    def test_main_queries_use_indexes(self):
+        out = io.StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('open_services', out.getvalue())
+
+    def test_full_scan_is_detected(self):
+        from .management.commands.check_query_plans import full_scans
+        if connection.vendor == 'sqlite':
+            plan = 'SCAN rentals_product\nSCAN X0 USING COVERING INDEX product_status_category_idx'
+        else:
+            plan = 'Seq Scan on rentals_product'
+        self.assertEqual(full_scans(plan), ['rentals_product'])
+
+
+class AsyncCatalogueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ewa', 'ewa@example.com', 'haslo')
+        cls.audio = Category.objects.create(name='Audio')
+        cls.products = [Product.objects.create(brand='Shure', model=f'SM{i}', category=cls.audio) for i in range(3)]
+        Product.objects.create(brand='Sony', model='FX6', category=cls.audio, status='serwis')
+        cls.komplet = Komplet.objects.create(name='Wokal')
+        cls.komplet.products.set(cls.products[:2])
+
+    async def test_requires_login(self):
+        response = await self.async_client.get('/api/async/products/')
+        self.assertEqual(response.status_code, 403)
+
+    async def test_product_list_pages_and_filters(self):
+        await self.async_client.aforce_login(self.user)
+        first = (await self.async_client.get('/api/async/products/', {'page_size': 3})).json()
+        self.assertEqual(len(first['results']), 3)
+        self.assertEqual(first['results'][0]['category_name'], 'Audio')
+        second = (await self.async_client.get('/api/async/products/', {'cursor': first['next_cursor']})).json()
+        self.assertEqual(len(second['results']), 1)
+        self.assertIsNone(second['next_cursor'])
+        serwis = (await self.async_client.get('/api/async/products/', {'status': 'serwis'})).json()
+        self.assertEqual([p['model'] for p in serwis['results']], ['FX6'])
+        both = (await self.async_client.get('/api/async/products/?status=serwis&status=magazyn')).json()
+        self.assertEqual(len(both['results']), 4)
+        response = await self.async_client.get('/api/async/products/', {'category': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_detail_komplets_categories_and_availability(self):
+        await self.async_client.aforce_login(self.user)
+        detail = (await self.async_client.get(f'/api/async/products/{self.products[0].pk}/')).json()
+        self.assertEqual(detail['model'], 'SM0')
+        self.assertEqual((await self.async_client.get('/api/async/products/999999/')).status_code, 404)
+        komplets = (await self.async_client.get('/api/async/komplets/')).json()
+        self.assertEqual(komplets['results'][0]['products'], [p.pk for p in self.products[:2]])
+        categories = (await self.async_client.get('/api/async/categories/')).json()
+        self.assertEqual(categories['results'][0]['counts'], {'magazyn': 3, 'serwis': 1})
+        free = (await self.async_client.get('/api/async/availability/', {'ids': 1})).json()
+        self.assertEqual(free['product_count'], 3)
+        self.assertEqual(free['komplets'], [self.komplet.pk])
+
+    @override_settings(RENTALS_PROFILING_SAMPLE_RATE=1.0)
+    async def test_async_requests_are_profiled(self):
+        self.addCleanup(profiling.reset)
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get('/api/async/komplets/')
+        rows = {row['endpoint']: row for row in profiling.report()}
+        self.assertGreaterEqual(rows['GET rentals:async_komplet_list']['queries'], 2)
+
+
+class LoadTestTests(TestCase):
+    def test_run_load_against_local_server(self):
+        async def handle(reader, writer):
+            try:
+                while await reader.readuntil(b'\r\n\r\n'):
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+                    await writer.drain()
+            except asyncio.IncompleteReadError:  # klient zamknął połączenie
+                writer.close()
+
+        async def scenario():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await loadtest.run_load(f'http://127.0.0.1:{port}/', total=20, concurrency=4)
+
+        summary = asyncio.run(scenario()).summary()
+        self.assertEqual(summary['requests'], 20)
+        self.assertEqual(summary['statuses'], {200: 20})
+        self.assertEqual(summary['errors'], 0)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('iza', 'iza@example.com', 'haslo')
+        cls.audio = Category.objects.create(name='Audio')
+        cls.mic = Product.objects.create(brand='Shure', model='SM58', category=cls.audio)
+        cls.komplet = Komplet.objects.create(name='Wokal')
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def revalidate(self, url, etag):
+        return self.api.get(url, HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT='application/json')
+
+    def test_list_not_modified_costs_one_query(self):
+        response = self.api.get('/api/products/', HTTP_ACCEPT='application/json')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            response = self.revalidate('/api/products/', etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        # inny filtr to inna reprezentacja
+        self.assertEqual(self.revalidate('/api/products/?status=serwis', etag).status_code, 200)
+
+    def test_changes_invalidate_etags(self):
+        products = self.api.get('/api/products/', HTTP_ACCEPT='application/json')['ETag']
+        komplets = self.api.get('/api/komplets/', HTTP_ACCEPT='application/json')['ETag']
+        self.mic.description = 'nowy opis'
+        self.mic.save()
+        self.assertEqual(self.revalidate('/api/products/', products).status_code, 200)
+        # komplety zagnieżdżają produkty – zmiana produktu zmienia też ich listę
+        self.assertEqual(self.revalidate('/api/komplets/', komplets).status_code, 200)
+
+    def test_bulk_paths_and_m2m_update_versions(self):
+        detail = f'/api/komplets/{self.komplet.pk}/'
+        etag = self.api.get(detail, HTTP_ACCEPT='application/json')['ETag']
+        before = Komplet.objects.get(pk=self.komplet.pk).updated_at
+        self.komplet.products.add(self.mic)
+        self.assertGreater(Komplet.objects.get(pk=self.komplet.pk).updated_at, before)
+        self.assertEqual(self.revalidate(detail, etag).status_code, 200)
+
+        etag = self.api.get('/api/products/', HTTP_ACCEPT='application/json')['ETag']
+        counters.move_status(Product.objects.filter(pk=self.mic.pk), 'wyjazd')
+        self.assertEqual(self.revalidate('/api/products/', etag).status_code, 200)
+
+    def test_html_product_detail(self):
+        self.client.force_login(self.user)
+        url = reverse('rentals:product_detail', args=[self.mic.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.audio.name = 'Nagłośnienie'
+        self.audio.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(reverse('rentals:product_detail', args=[999999])).status_code, 404)
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('adam', 'adam@example.com', 'haslo')
+        cls.audio = Category.objects.create(name='Audio')
+        cls.mic = Product.objects.create(brand='Shure', model='SM58', category=cls.audio)
+        cls.komplet = Komplet.objects.create(name='Wokal')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_listing_is_served_from_cache(self):
+        url = reverse('rentals:product_list')
+        with CaptureQueriesContext(connection) as miss:
+            first = self.client.get(url)
+        with CaptureQueriesContext(connection) as hit:
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+        self.assertContains(second, 'SM58')
+        self.assertLess(len(hit), len(miss))
+        self.assertFalse([q for q in hit.captured_queries if 'rentals_product"' in q['sql']])
+        stats = {row['name']: row for row in fragments.stats()}
+        self.assertEqual((stats['ProductListView']['hits'], stats['ProductListView']['misses']), (1, 1))
+
+    def test_booking_invalidates_availability(self):
+        url = reverse('rentals:product_list')
+        self.assertContains(self.client.get(url), 'SM58')
+        today = timezone.localdate()
+        order = Order(user=self.user, conference_code='KONF', pickup_date=today,
+                      return_date=today + datetime.timedelta(days=2))
+        services.checkout(order, [self.mic], [])
+        self.assertNotContains(self.client.get(url), 'SM58')
+
+    def test_signals_invalidate_komplet_and_category_fragments(self):
+        detail = reverse('rentals:komplet_detail', args=[self.komplet.pk])
+        self.assertNotContains(self.client.get(detail), 'SM58')
+        self.komplet.products.add(self.mic)
+        self.assertContains(self.client.get(detail), 'SM58')
+        self.audio.name = 'Nagłośnienie'
+        self.audio.save()
+        self.assertContains(self.client.get(detail), 'Nagłośnienie')
+        self.assertContains(self.client.get(reverse('rentals:product_list')), 'Nagłośnienie')
+
+
+def make_photo(name='foto.jpg', size=(1600, 1200)):
+    from PIL import Image
+    output = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(output, 'JPEG')
+    return SimpleUploadedFile(name, output.getvalue(), content_type='image/jpeg')
+
+
+class ImageRenditionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.audio = Category.objects.create(name='Audio')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def rendition_size(self, name):
+        from PIL import Image
+        with default_storage.open(name) as stream, Image.open(stream) as image:
+            return image.size
+
+    def rendition(self, name, kind):
+        return images.rendition_name(name, kind, images.version(name))
+
+    def url(self, kind, name, version=None):
+        return reverse('rentals:image_rendition', args=[kind, version or images.version(name), name])
+
+    def test_renditions_created_on_upload(self):
+        product = Product.objects.create(brand='Shure', model='SM58', category=self.audio, image=make_photo())
+        self.assertEqual(self.rendition_size(self.rendition(product.image.name, 'thumb')), (160, 160))
+        self.assertEqual(self.rendition_size(self.rendition(product.image.name, 'detail')), (1024, 768))
+
+    def test_lazy_rendition_view(self):
+        product = Product.objects.create(brand='Shure', model='SM58', category=self.audio, image=make_photo())
+        target = self.rendition(product.image.name, 'thumb')
+        default_storage.delete(target)
+        url = self.url('thumb', product.image.name)
+        # bez logowania nic nie jest przetwarzane
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertFalse(default_storage.exists(target))
+        self.client.force_login(User.objects.create_user('ola', 'ola@example.com', 'haslo'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(default_storage.exists(target))
+        # rendycje tylko z oryginałów i tylko zdefiniowanych rodzajów
+        self.assertEqual(self.client.get(self.url('thumb', target, 'v')).status_code, 404)
+        self.assertEqual(self.client.get(self.url('avatar', product.image.name)).status_code, 404)
+
+    def test_overwritten_original_gets_new_rendition(self):
+        self.client.force_login(User.objects.create_user('ola', 'ola@example.com', 'haslo'))
+        product = Product.objects.create(brand='Shure', model='SM58', category=self.audio, image=make_photo())
+        name = product.image.name
+        old_url = self.url('detail', name)
+        default_storage.delete(name)
+        default_storage.save(name, make_photo(size=(800, 400)))
+        new_url = self.url('detail', name)
+        self.assertNotEqual(old_url, new_url)
+        self.assertRedirects(self.client.get(old_url), new_url, fetch_redirect_response=False)
+        self.assertEqual(self.client.get(new_url).status_code, 200)
+        self.assertEqual(self.rendition_size(self.rendition(name, 'detail')), (800, 400))
+
+    def test_backfill_command(self):
+        product = Product.objects.create(brand='Shure', model='SM58', category=self.audio, image=make_photo())
+        for kind in ('thumb', 'detail'):
+            default_storage.delete(self.rendition(product.image.name, kind))
+        out = io.StringIO()
+        call_command('build_renditions', '--workers', '1', stdout=out, stderr=io.StringIO())
+        self.assertIn('utworzono rendycji: 2', out.getvalue())
+        self.assertTrue(default_storage.exists(self.rendition(product.image.name, 'detail')))
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('audyt', 'audyt@example.com', 'haslo', is_staff=True)
+        audio = Category.objects.create(name='Audio')
+        cls.mic = Product.objects.create(brand='Shure', model='SM58', category=audio)
+        cls.komplet = Komplet.objects.create(name='Wokal')
+        for i in range(5):
+            order = Order.objects.create(user=cls.staff, conference_code=f'K{i}',
+                                         pickup_date=datetime.date(2024, 1, 1 + i))
+            order.products.set([cls.mic])
+            if i % 2:
+                order.komplets.set([cls.komplet])
+        OrderLine.objects.filter(order__conference_code='K1').update(quantity=3)
+        BorrowHistory.objects.create(user=cls.staff, product=cls.mic, quantity=2, order=order)
+        BorrowHistory.objects.create(user=cls.staff, komplet=cls.komplet)
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_borrow_history_csv(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('rentals:export_data', args=['borrow-history', 'csv']))
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(self.content(response))))
+        self.assertEqual([(r['user'], r['product_code'], r['quantity'], r['komplet'], r['order']) for r in rows],
+                         [('audyt', self.mic.code, '2', '', str(Order.objects.get(conference_code='K4').pk)),
+                          ('audyt', '', '1', 'Wokal', '')])
+
+    def test_orders_jsonl_in_small_chunks(self):
+        lines = list(exports.stream('orders', 'jsonl', date_from='2024-01-02', chunk_size=2))
+        orders = [json.loads(line) for line in lines]
+        self.assertEqual([o['conference_code'] for o in orders], ['K1', 'K2', 'K3', 'K4'])
+        self.assertEqual(orders[0]['products'], [self.mic.code])
+        self.assertEqual([o['quantities'] for o in orders], [[3], [1], [1], [1]])
+        self.assertEqual([o['komplets'] for o in orders], [['Wokal'], [], ['Wokal'], []])
+        self.assertEqual(orders[0]['pickup_date'], '2024-01-02')
+
+    async def test_asgi_streams_asynchronously(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('rentals:export_data', args=['orders', 'jsonl']))
+        self.assertTrue(response.is_async)
+        lines = [line async for line in response.streaming_content]
+        self.assertEqual(len(lines), 5)
+
+    def test_access_and_validation(self):
+        url = reverse('rentals:export_data', args=['orders', 'csv'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url, {'date_from': 'wczoraj'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('rentals:export_data', args=['orders', 'xml'])).status_code, 400)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'orders.csv')
+            call_command('export_data', 'orders', '--output', path, stderr=io.StringIO())
+            with open(path, encoding='utf-8') as stream:
+                rows = list(csv.DictReader(stream))
+        self.assertEqual([row['quantities'] for row in rows], ['1', '3', '1', '1', '1'])
+
+
+def at(day, hour=0):
+    return timezone.make_aware(datetime.datetime(2024, 3, day, hour))
+
+
+class AnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('analityk', 'a@example.com', 'haslo', is_staff=True)
+        cls.audio = Category.objects.create(name='Audio')
+        cls.mic = Product.objects.create(brand='Shure', model='SM58', category=cls.audio)
+        cls.di = Product.objects.create(brand='Radial', model='ProDI', category=cls.audio)
+        cls.komplet = Komplet.objects.create(name='Wokal')
+
+        def borrow(start, end=None, **item):
+            record = BorrowHistory.objects.create(user=cls.staff, **item)
+            BorrowHistory.objects.filter(pk=record.pk).update(borrow_date=start, return_date=end)
+
+        borrow(at(1, 12), at(3, 6), product=cls.mic)   # 1,75 dnia
+        borrow(at(3, 18), at(4, 0), product=cls.di)
+        borrow(at(2), komplet=cls.komplet)             # wciąż wypożyczony
+        service = Service.objects.create(product=cls.mic, description="Trzeszczy")
+        Service.objects.filter(pk=service.pk).update(reported_at=at(3, 12), resolved_at=at(4))
+
+    def test_compute_day_aggregates_overlaps(self):
+        rows = {(row.product_id, row.komplet_id): row for row in analytics.compute_day(datetime.date(2024, 3, 3), at(10))}
+        mic = rows[self.mic.pk, None]
+        self.assertEqual((mic.out_seconds, mic.service_seconds, mic.returns, mic.rental_seconds),
+                         (6 * 3600, 12 * 3600, 1, 42 * 3600))
+        self.assertEqual(mic.category_id, self.audio.pk)
+        self.assertEqual((rows[self.di.pk, None].out_seconds, rows[self.di.pk, None].rentals), (6 * 3600, 1))
+        self.assertEqual(rows[None, self.komplet.pk].out_seconds, 24 * 3600)
+
+    def test_open_rental_counts_until_now(self):
+        rows = analytics.compute_day(datetime.date(2024, 3, 5), at(5, 8))
+        self.assertEqual([(row.komplet_id, row.out_seconds) for row in rows], [(self.komplet.pk, 8 * 3600)])
+
+    def test_refresh_is_incremental(self):
+        self.assertEqual(analytics.refresh(until=datetime.date(2024, 3, 4), now=at(10)), 4)
+        self.assertEqual(DailyUsage.objects.filter(product=self.mic).count(), 3)
+        # kolejne odświeżenie zaczyna od ostatniego podsumowanego dnia
+        self.assertEqual(analytics.refresh(until=datetime.date(2024, 3, 5), now=at(10)), 2)
+        self.assertEqual(DailyUsage.objects.filter(day=datetime.date(2024, 3, 4)).count(), 2)
+
+    def test_refresh_reads_history_once_per_chunk(self):
+        def rows(usage):
+            return sorted((u.day, u.product_id or 0, u.komplet_id or 0, u.out_seconds, u.service_seconds, u.rentals, u.returns,
+                           u.rental_seconds) for u in usage)
+
+        days = [datetime.date(2024, 2, 28) + datetime.timedelta(days=n) for n in range(10)]
+        self.assertEqual(rows(analytics.compute_range(days[0], days[-1], at(10))),
+                         rows(usage for day in days for usage in analytics.compute_day(day, at(10))))
+        with CaptureQueriesContext(connection) as queries:
+            analytics.refresh(since=datetime.date(2024, 1, 1), until=datetime.date(2024, 3, 31), now=at(10))
+        history = [q for q in queries if 'FROM "rentals_borrowhistory"' in q['sql']]
+        # trzy paczki po CHUNK_DAYS dni, jedno zapytanie na paczkę i rodzaj pozycji
+        self.assertEqual(len(history), 3 * len(analytics.ITEMS))
+
+    def test_report_ranks_in_database(self):
+        analytics.refresh(until=datetime.date(2024, 3, 4), now=at(10))
+        with self.assertNumQueries(4):
+            report = analytics.report(datetime.date(2024, 3, 1), datetime.date(2024, 3, 4))
+        self.assertEqual([(p['id'], p['category_rank']) for p in report['products']],
+                         [(self.mic.pk, 1), (self.di.pk, 2)])
+        self.assertEqual(report['products'][0]['average_rental_days'], 1.75)
+        self.assertEqual(report['products'][0]['days_in_service'], 0.5)
+        self.assertEqual(report['categories'][0]['products'], 2)
+        self.assertEqual(report['komplets'][0]['rentals'], 1)
+
+    def test_api_and_staff_report(self):
+        analytics.refresh(until=datetime.date(2024, 3, 4), now=at(10))
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        url = reverse('rentals:analytics')
+        self.assertEqual(client.get(url, {'date_from': '2024-03-05', 'date_to': '2024-03-01'}).status_code, 400)
+        response = client.get(url, {'date_from': '2024-03-01', 'date_to': '2024-03-04', 'category': self.audio.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['days'], 4)
+        self.assertEqual(len(response.json()['products']), 2)
+        client.force_authenticate(User.objects.create_user('gosc'))
+        self.assertEqual(client.get(url).status_code, 403)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('rentals:analytics_report'), {'date_from': '2024-03-01',
+                                                                         'date_to': '2024-03-04'})
+        self.assertContains(response, 'SM58')
+        self.assertContains(response, 'Wokal')
+
+    def test_refresh_command(self):
+        out = io.StringIO()
+        call_command('refresh_usage', '--since', '2024-03-01', '--until', '2024-03-02', stdout=out)
+        self.assertIn('Przeliczono dni: 2', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('refresh_usage', '--since', '2024-03-05', '--until', '2024-03-01')
+
+
+class CheckInTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('magazyn', 'm@example.com', 'haslo', is_staff=True)
+        cls.category = Category.objects.create(name='Audio')
+        cls.mics = [Product.objects.create(brand='Shure', model='SM58', ean_code='5901234123457',
+                                           category=cls.category) for _ in range(3)]
+        cls.products = [Product.objects.create(brand='Radial', model=f'DI{i}', category=cls.category)
+                        for i in range(6)]
+        cls.komplet = Komplet.objects.create(name='Wokal')
+
+    def setUp(self):
+        self.order = services.checkout(
+            Order(user=self.staff, conference_code='KONF', pickup_date=datetime.date(2025, 6, 1),
+                  return_date=datetime.date(2025, 6, 3)),
+            self.mics[:2] + self.products[:4], [self.komplet])
+
+    def test_batch_returns_items_and_completes_order(self):
+        codes = [p.code for p in self.products[:4]] + ['5901234123457', '5901234123457', 'Wokal']
+        result = services.check_in(codes)
+        self.assertEqual(len(result.products), 6)
+        self.assertEqual(result.komplets, ['Wokal'])
+        self.assertEqual(result.orders, [self.order.pk])
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'returned')
+        self.assertFalse(BorrowHistory.objects.filter(return_date__isnull=True).exists())
+        self.assertFalse(Product.objects.filter(status='wyjazd').exists())
+        self.assertEqual(Komplet.objects.get().status, 'magazyn')
+        self.assertEqual(counters.compare(), {})
+
+    def test_partial_return_keeps_order_open(self):
+        result = services.check_in([self.products[0].code, self.products[0].code, self.products[5].code, 'XYZ'])
+        self.assertEqual(result.products, [self.products[0].code])
+        self.assertEqual(result.not_out, [self.products[5].code])
+        self.assertEqual(result.unknown, ['XYZ'])
+        self.assertEqual(result.orders, [])
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'ongoing')
+        # trzecia sztuka o tym EAN-ie nie była wypożyczona
+        result = services.check_in(['5901234123457'] * 3)
+        self.assertEqual(len(result.products), 2)
+        self.assertEqual(result.not_out, ['5901234123457'])
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        with CaptureQueriesContext(connection) as small:
+            services.check_in([self.products[0].code])
+        with CaptureQueriesContext(connection) as large:
+            services.check_in([p.code for p in self.products[1:4]] + ['5901234123457', '5901234123457'])
+        self.assertEqual(len(small), len(large))
+
+    def test_api_and_staff_screen(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        url = reverse('rentals:api_check_in')
+        self.assertEqual(client.post(url, {'codes': 5}, format='json').status_code, 400)
+        response = client.post(url, {'codes': [self.products[0].code]}, format='json')
+        self.assertEqual(response.json()['products'], [self.products[0].code])
+        client.force_authenticate(User.objects.create_user('gosc'))
+        self.assertEqual(client.post(url, {'codes': []}, format='json').status_code, 403)
+
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse('rentals:check_in'), {'codes': f"{self.products[1].code}\nWokal\n"})
+        self.assertContains(response, self.products[1].code)
+        self.assertEqual(Komplet.objects.get().status, 'magazyn')
+
+
+class KompletAvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('admin', 'admin@example.com', 'haslo')
+        category = Category.objects.create(name='Audio')
+        cls.products = [Product.objects.create(brand='Shure', model=f'M{i}', category=category) for i in range(4)]
+        cls.vocal = Komplet.objects.create(name='Wokal')
+        cls.vocal.products.set(cls.products[:2])
+        cls.drums = Komplet.objects.create(name='Perkusja')
+        cls.drums.products.set(cls.products[2:])
+
+    def test_member_in_service_makes_komplet_unavailable(self):
+        self.client.force_login(self.staff)
+        self.client.post(reverse('rentals:service_create'), {'product': self.products[0].pk, 'description': 'Trzeszczy'})
+        komplets = {k.name: k for k in availability.with_komplet_availability(Komplet.objects.all())}
+        self.assertEqual((komplets['Wokal'].status, komplets['Wokal'].effective_status), ('magazyn', 'serwis'))
+        self.assertFalse(komplets['Wokal'].available)
+        self.assertEqual((komplets['Perkusja'].effective_status, komplets['Perkusja'].available), ('magazyn', True))
+
+        response = self.client.get(reverse('rentals:komplet_detail', args=[self.vocal.pk]))
+        self.assertContains(response, 'serwis (komplet: magazyn)')
+        response = self.client.get(reverse('rentals:komplet_list'))
+        self.assertEqual([k.name for k in response.context['komplets']], ['Perkusja'])
+
+    def test_serializer_reports_availability(self):
+        Product.objects.filter(pk=self.products[3].pk).update(status='wyjazd')
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        rows = {row['name']: row for row in client.get('/api/komplets/', format='json').json()['results']}
+        self.assertEqual((rows['Perkusja']['effective_status'], rows['Perkusja']['available']), ('wyjazd', True))
+        self.assertEqual(rows['Wokal']['effective_status'], 'magazyn')
+        # komplet zarezerwowany na dziś jest niedostępny, choć jego status to nadal 'magazyn'
+        order = Order.objects.create(user=self.staff, conference_code='K', pickup_date=timezone.localdate())
+        order.komplets.set([self.vocal])
+        rows = {row['name']: row for row in client.get('/api/komplets/', format='json').json()['results']}
+        self.assertFalse(rows['Wokal']['available'])
+        self.assertEqual(client.get('/api/komplets/?fields=id,name', format='json').json()['results'][0].keys(),
+                         {'id', 'name'})
+
+    def test_order_form_rejects_komplet_with_member_in_service(self):
+        Product.objects.filter(pk=self.products[0].pk).update(status='serwis')
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('rentals:order_create'))
+        self.assertEqual(list(response.context['form'].fields['komplets'].queryset), [self.drums])
+        response = self.client.post(reverse('rentals:order_create'), {
+            'conference_code': 'KONF', 'komplets': [self.vocal.pk],
+            'pickup_date': '2025-06-01', 'return_date': '2025-06-03'})
+        self.assertIn('komplets', response.context['form'].errors)
+        self.assertFalse(Order.objects.exists())
+
+
+class StockLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ola', 'ola@example.com', 'haslo', is_staff=True)
+        category = Category.objects.create(name='Okablowanie')
+        cls.cable = Product.objects.create(brand='Klotz', model='XLR 10m', quantity=10, category=category)
+        cls.battery = Product.objects.create(brand='Duracell', model='AA', quantity=2, category=category)
+
+    def order(self, pickup, days=2):
+        return Order(user=self.user, conference_code='KONF', pickup_date=pickup,
+                     return_date=pickup + datetime.timedelta(days=days))
+
+    def available(self, pickup, days=2):
+        start, end = availability.default_range(pickup, pickup + datetime.timedelta(days=days))
+        return {p.pk: p.available_quantity
+                for p in availability.with_available_quantity(Product.objects.all(), start, end)}
+
+    def test_order_lines_reserve_units(self):
+        june = datetime.date(2025, 6, 1)
+        services.checkout(self.order(june), [self.cable], [], {self.cable.pk: 4})
+        services.checkout(self.order(june), [self.cable], [], {self.cable.pk: 5})
+        cable = Product.objects.get(pk=self.cable.pk)
+        self.assertEqual((cable.in_stock, cable.status), (1, 'magazyn'))
+        self.assertEqual(self.available(june)[self.cable.pk], 1)
+        with self.assertRaises(services.ItemsUnavailable) as ctx:
+            services.checkout(self.order(june), [self.cable], [], {self.cable.pk: 2})
+        self.assertEqual(ctx.exception.products, [self.cable])
+        self.assertEqual(OrderLine.objects.count(), 2)
+        # ostatnia sztuka: produkt przestaje być w magazynie
+        services.checkout(self.order(june + datetime.timedelta(days=10)), [self.cable], [])
+        self.assertEqual(Product.objects.get(pk=self.cable.pk).status, 'wyjazd')
+        self.assertEqual(counters.compare(), {})
+
+    def test_available_quantity_in_one_query(self):
+        june = datetime.date(2025, 6, 1)
+        services.checkout(self.order(june), [self.cable, self.battery], [], {self.cable.pk: 3})
+        with self.assertNumQueries(1):
+            available = self.available(june)
+        self.assertEqual(available, {self.cable.pk: 7, self.battery.pk: 1})
+        self.assertEqual(self.available(june + datetime.timedelta(days=5)), {self.cable.pk: 10, self.battery.pk: 2})
+
+    def test_take_is_all_or_nothing(self):
+        with self.assertRaises(stock.OutOfStock) as ctx:
+            stock.take({self.cable.pk: 1, self.battery.pk: 3})
+        self.assertEqual(ctx.exception.products, [self.battery])
+        self.assertEqual(Product.objects.get(pk=self.cable.pk).in_stock, 10)
+        stock.take({self.cable.pk: 10})
+        self.assertEqual(Product.objects.get(pk=self.cable.pk).in_stock, 0)
+        stock.put_back({self.cable.pk: 12})
+        self.assertEqual(Product.objects.get(pk=self.cable.pk).in_stock, 10)
+
+    def test_save_does_not_overwrite_stock(self):
+        cable = Product.objects.get(pk=self.cable.pk)
+        stock.take({self.cable.pk: 4})
+        cable.description = 'Przewód mikrofonowy'
+        cable.save()
+        self.assertEqual(Product.objects.get(pk=self.cable.pk).in_stock, 6)
+        cable.quantity = 5  # wycofano 5 sztuk
+        cable.save()
+        self.assertEqual(cable.in_stock, 1)
+        cable.quantity = 3
+        cable.save()
+        self.assertEqual(cable.in_stock, 0)
+
+    def test_check_in_returns_units(self):
+        order = services.checkout(self.order(datetime.date(2025, 6, 1)), [self.cable], [], {self.cable.pk: 3})
+        result = services.check_in([self.cable.code] * 2)
+        self.assertEqual(result.products, [self.cable.code] * 2)
+        self.assertEqual(Product.objects.get(pk=self.cable.pk).in_stock, 9)
+        # wypożyczenie i zamówienie zamykają się dopiero po zwrocie ostatniej sztuki
+        self.assertTrue(BorrowHistory.objects.filter(return_date__isnull=True).exists())
+        self.assertEqual(result.orders, [])
+        result = services.check_in([self.cable.code] * 2)
+        self.assertEqual((result.products, result.orders), ([self.cable.code], [order.pk]))
+        self.assertFalse(BorrowHistory.objects.filter(return_date__isnull=True).exists())
+
+    def test_future_booking_reserves_without_taking_stock(self):
+        today = timezone.localdate()
+        future = services.checkout(self.order(today + datetime.timedelta(days=30)), [self.cable], [],
+                                   {self.cable.pk: 10})
+        cable = Product.objects.get(pk=self.cable.pk)
+        self.assertEqual((cable.in_stock, cable.status, future.status), (10, 'magazyn', 'reserved'))
+        self.assertFalse(BorrowHistory.objects.exists())
+        # dzisiejsze zamówienie nie koliduje z przyszłą rezerwacją – wydanie od razu
+        same_day = services.checkout(self.order(today), [self.cable], [], {self.cable.pk: 1})
+        self.assertEqual(same_day.status, 'ongoing')
+        self.assertEqual(Product.objects.get(pk=self.cable.pk).in_stock, 9)
+        # odbiór przyszłego zamówienia wymaga wszystkich sztuk w magazynie
+        with self.assertRaises(services.ItemsUnavailable):
+            services.pick_up(future)
+        services.check_in([self.cable.code])
+        services.pick_up(future)
+        cable = Product.objects.get(pk=self.cable.pk)
+        self.assertEqual((cable.in_stock, cable.status), (0, 'wyjazd'))
+        self.assertEqual(Order.objects.get(pk=future.pk).status, 'ongoing')
+        self.assertEqual(BorrowHistory.objects.get(return_date__isnull=True).order_id, future.pk)
+        with self.assertRaises(services.NotReserved):
+            services.pick_up(future)
+        self.assertEqual(counters.compare(), {})
+
+    def test_returns_are_tracked_per_order(self):
+        today = timezone.localdate()
+        first = services.checkout(self.order(today, days=1), [self.cable], [], {self.cable.pk: 2})
+        second = services.checkout(self.order(today, days=3), [self.cable], [], {self.cable.pk: 2})
+        # zwrot dwóch sztuk zamyka zamówienie z wcześniejszym terminem, drugie jest nadal wydane
+        result = services.check_in([self.cable.code] * 2)
+        self.assertEqual(result.orders, [first.pk])
+        self.assertEqual(Order.objects.get(pk=second.pk).status, 'ongoing')
+        self.assertEqual(list(BorrowHistory.objects.filter(return_date__isnull=True).values_list('order_id', flat=True)),
+                         [second.pk])
+        self.assertEqual(OrderLine.objects.get(order=first).returned, 2)
+        result = services.check_in([self.cable.code] * 2)
+        self.assertEqual(result.orders, [second.pk])
+
+    def test_pick_up_api(self):
+        future = services.checkout(self.order(timezone.localdate() + datetime.timedelta(days=7)), [self.battery], [])
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('rentals:order-pick-up', args=[future.pk])
+        self.assertEqual(client.post(url).json()['status'], 'ongoing')
+        self.assertEqual(client.post(url).status_code, 400)
+        self.assertEqual(Product.objects.get(pk=self.battery.pk).in_stock, 1)
+
+    def test_order_form_quantities(self):
+        self.client.force_login(self.user)
+        data = {'conference_code': 'KONF', 'products': [self.cable.pk], 'pickup_date': '2025-06-01',
+                'return_date': '2025-06-03'}
+        response = self.client.post(reverse('rentals:order_create'), {**data, f'quantity_{self.cable.pk}': 'dwa'})
+        self.assertIn('products', response.context['form'].errors)
+        # wybrany produkt wraca w formularzu razem z wpisaną liczbą sztuk
+        self.assertContains(response, f'name="quantity_{self.cable.pk}" value="dwa"')
+        response = self.client.post(reverse('rentals:order_create'), {**data, f'quantity_{self.cable.pk}': '11'})
+        self.assertIn('brak 11 wolnych sztuk', str(response.context['form'].errors))
+        self.client.post(reverse('rentals:order_create'), {**data, f'quantity_{self.cable.pk}': '6'})
+        self.assertEqual(OrderLine.objects.get().quantity, 6)
+        self.assertEqual(BorrowHistory.objects.get().quantity, 6)
+
+
+class DashboardQueryBudgetTests(TestCase):
+    """Kokpit i historia mają stałą liczbę zapytań – niezależnie od liczby zamówień."""
+    QUERY_BUDGET = 7  # sesja, użytkownik, profil, COUNT, zamówienia, pozycje, komplety
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('jan', 'jan@example.com', 'haslo')
+        category = Category.objects.create(name='Audio')
+        cls.products = [Product.objects.create(brand='Shure', model=f'M{i}', quantity=5, category=category)
+                        for i in range(3)]
+        cls.komplet = Komplet.objects.create(name='Wokal')
+
+    def create_orders(self, n, status):
+        for i in range(n):
+            order = Order.objects.create(user=self.user, conference_code=f'K{i}', status=status,
+                                         return_date=datetime.date(2025, 1, 1) + datetime.timedelta(days=i))
+            OrderLine.objects.create(order=order, product=self.products[i % 3], quantity=1 + i % 2)
+            order.komplets.set([self.komplet])
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx), self.QUERY_BUDGET, url)
+        return len(ctx)
+
+    def test_dashboard_and_history_stay_within_budget(self):
+        self.client.force_login(self.user)
+        urls = [reverse('rentals:dashboard'), reverse('rentals:order_history') + '?fragment=1']
+        self.create_orders(2, 'reserved')
+        self.create_orders(2, 'returned')
+        small = [self.count_queries(url) for url in urls]
+        self.create_orders(40, 'reserved')
+        self.create_orders(60, 'returned')
+        self.assertEqual([self.count_queries(url) for url in urls], small)
+
+    def test_history_is_loaded_separately_and_paginated(self):
+        self.create_orders(25, 'returned')
+        self.create_orders(2, 'reserved')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('rentals:dashboard'))
+        self.assertNotContains(response, 'Zwrócono')
+        self.assertContains(response, '×2')
+        response = self.client.get(reverse('rentals:order_history'), {'fragment': 1, 'page': 2})
+        self.assertTemplateNotUsed(response, 'rentals/base.html')
+        self.assertEqual(len(response.context['past_orders']), 5)
+        self.assertContains(self.client.get(reverse('rentals:order_history')), 'Historia wypożyczeń')
+
+
+class OrderPickerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ewa', 'ewa@example.com', 'haslo')
+        cls.audio = Category.objects.create(name='Audio')
+        cls.video = Category.objects.create(name='Wideo')
+        cls.mics = [Product.objects.create(brand='Shure', model=f'SM{i}', category=cls.audio) for i in range(3)]
+        cls.cable = Product.objects.create(brand='Klotz', model='XLR', quantity=5, category=cls.audio)
+        cls.camera = Product.objects.create(brand='Sony', model='FX6', category=cls.video)
+        cls.vocal = Komplet.objects.create(name='Wokal duży')
+        cls.vocal.products.set(cls.mics[:2])
+        cls.stage = Komplet.objects.create(name='Scena')
+        order = Order.objects.create(user=cls.user, conference_code='K', pickup_date=datetime.date(2025, 6, 1),
+                                     return_date=datetime.date(2025, 6, 3))
+        order.products.set([cls.camera])
+        OrderLine.objects.filter(order=order).update(quantity=1)
+        OrderLine.objects.create(order=order, product=cls.cable, quantity=2)
+
+    async def test_product_picker_filters(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse('rentals:picker_products')
+        dates = {'date_from': '2025-06-02', 'date_to': '2025-06-04'}
+        rows = (await self.async_client.get(url, dates)).json()['results']
+        self.assertNotIn(self.camera.pk, [row['id'] for row in rows])
+        self.assertEqual({row['id']: row['available_quantity'] for row in rows}[self.cable.pk], 3)
+        video = (await self.async_client.get(url, {'category': self.video.pk})).json()['results']
+        self.assertEqual([row['id'] for row in video], [self.camera.pk])
+        found = (await self.async_client.get(url, {'q': 'sm', 'page_size': 2})).json()
+        self.assertEqual(len(found['results']), 2)
+        rest = (await self.async_client.get(url, {'q': 'sm', 'page_size': 2, 'cursor': found['next_cursor']})).json()
+        self.assertEqual({row['id'] for row in found['results'] + rest['results']}, {p.pk for p in self.mics})
+        self.assertIsNone(rest['next_cursor'])
+
+    async def test_komplet_picker_matches_word_prefix(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse('rentals:picker_komplets')
+        rows = (await self.async_client.get(url, {'q': 'du'})).json()['results']
+        self.assertEqual(rows, [{'id': self.vocal.pk, 'name': 'Wokal duży'}])
+        rows = (await self.async_client.get(url, {'category': self.video.pk})).json()['results']
+        self.assertEqual(rows, [])
+
+    def test_form_does_not_render_inventory(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(reverse('rentals:order_create'))
+        self.assertNotContains(response, 'SM0')
+        Product.objects.bulk_create([Product(brand='Shure', model=f'B{i}', category=self.audio) for i in range(50)])
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('rentals:order_create'))
+        self.assertEqual(len(large), len(small))
+
+    def test_form_validates_only_submitted_ids(self):
+        form = forms.OrderForm({'conference_code': 'K', 'products': [self.mics[0].pk, 999999],
+                                'komplets': [self.vocal.pk]})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(form.is_valid())
+        self.assertIn('products', form.errors)
+        self.assertEqual(len(queries), 2)  # po jednym zapytaniu id__in na pole
+        form = forms.OrderForm({'conference_code': 'K', 'products': [self.mics[0].pk]})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(list(form.cleaned_data['products']), [self.mics[0]])
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.report = datagen.DataGenerator(products=80, komplets=4, users=3, orders=60, services=6, years=1,
+                                           seed=7, batch_size=25).run(refresh_usage=False)
+        cls.staff = User.objects.create_user('admin', 'admin@example.com', 'haslo', is_staff=True, is_superuser=True)
+
+    def test_generated_data_is_consistent(self):
+        self.assertEqual(self.report.counts['products'], 80)
+        self.assertEqual(Order.objects.count(), 60)
+        self.assertEqual(OrderLine.objects.count(), self.report.counts['order_lines'])
+        self.assertEqual(counters.compare(), {})
+        # stan magazynu zgodny z trwającymi zamówieniami, daty z historii zamiast auto_now_add
+        self.assertFalse(Product.objects.filter(status='wyjazd').exclude(in_stock=0).exists())
+        out = OrderLine.objects.filter(order__status='ongoing').values('product').annotate(n=Sum('quantity'))
+        for row in out:
+            product = Product.objects.get(pk=row['product'])
+            self.assertEqual(product.in_stock, product.quantity - row['n'])
+        self.assertLess(Order.objects.order_by('reserved_at').first().reserved_at,
+                        timezone.now() - datetime.timedelta(days=7))
+        self.assertEqual(len(search.search_products('sprzęt testowy', limit=200)), 80)
+
+    def test_runner_measures_endpoints_and_compares(self):
+        names = dict(benchmark.endpoints())
+        self.assertIn('product-detail', names)
+        self.assertIsNone(names['image_rendition'])  # brak zdjęć – endpoint pominięty
+        result = benchmark.run(self.staff, repeat=2, only={'product_list', 'order-list', 'image_rendition'})
+        rows = {row['name']: row for row in result['results']}
+        self.assertEqual(rows['order-list']['status'], 200)
+        self.assertGreater(rows['order-list']['queries'], 0)
+        self.assertIn('skipped', rows['image_rendition'])
+        self.assertEqual(result['meta']['rows']['product'], 80)
+        slower = json.loads(json.dumps(result))
+        slower['results'][0].update(p50_ms=slower['results'][0]['p50_ms'] + 50, queries=100)
+        self.assertEqual(benchmark.compare(result, result), [])
+        self.assertEqual(len(benchmark.compare(result, slower)[0]['problems']), 2)
+
+    def test_commands(self):
+        call_command('generate_data', products=5, komplets=1, users=1, orders=3, services=1, no_usage=True,
+                     stdout=io.StringIO())
+        self.assertEqual(Product.objects.count(), 85)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'wynik.json')
+            call_command('run_benchmark', output=path, repeat=1, only=['api-root'], stdout=io.StringIO())
+            with open(path, encoding='utf-8') as stream:
+                self.assertEqual(json.load(stream)['results'][0]['status'], 200)
+        self.assertFalse(User.objects.filter(username='benchmark-tmp').exists())
+
+
+class DatabaseConfigTests(TestCase):
+    def test_sqlite_profile(self):
+        config = database.database_config(Path('/srv'), {})
+        self.assertEqual(config['NAME'], Path('/srv/db.sqlite3'))
+        self.assertIn('PRAGMA journal_mode=WAL', config['OPTIONS']['init_command'])
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (60, True))
+        config = database.database_config(Path('/srv'), {'RENTALS_SQLITE_SYNCHRONOUS': 'FULL',
+                                                         'RENTALS_DB_CONN_MAX_AGE': 'none'})
+        self.assertIn('PRAGMA synchronous=FULL', config['OPTIONS']['init_command'])
+        self.assertIsNone(config['CONN_MAX_AGE'])
+
+    def test_pragmas_applied_on_connect(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Pragmy dotyczą tylko SQLite.")
+        with connection.cursor() as cursor:
+            values = {pragma: cursor.execute(f'PRAGMA {pragma}').fetchone()[0]
+                      for pragma in ('synchronous', 'cache_size', 'busy_timeout')}
+        self.assertEqual(values, {'synchronous': 1, 'cache_size': -65536, 'busy_timeout': 20000})
+
+    def test_postgresql_profile(self):
+        config = database.database_config(Path('/srv'), {
+            'RENTALS_DB_ENGINE': 'postgresql', 'RENTALS_DB_NAME': 'wypozyczalnia', 'RENTALS_DB_HOST': 'db',
+            'RENTALS_DB_CONN_HEALTH_CHECKS': '0'})
+        self.assertEqual((config['ENGINE'], config['NAME'], config['HOST']),
+                         ('django.db.backends.postgresql', 'wypozyczalnia', 'db'))
+        self.assertFalse(config['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertFalse(config['CONN_HEALTH_CHECKS'])
+        self.assertIn('statement_timeout=30000', config['OPTIONS']['options'])
+        config = database.database_config(Path('/srv'), {'RENTALS_DB_ENGINE': 'postgresql',
+                                                         'RENTALS_DB_PGBOUNCER': 'true'})
+        self.assertTrue(config['DISABLE_SERVER_SIDE_CURSORS'])
+        with self.assertRaises(ImproperlyConfigured):
+            database.database_config(Path('/srv'), {'RENTALS_DB_ENGINE': 'oracle'})
+        with self.assertRaises(ImproperlyConfigured):
+            database.database_config(Path('/srv'), {'RENTALS_SQLITE_TIMEOUT': 'dużo'})
+
+
+class ReplicaRoutingTests(TestCase):
+    """Replika to osobny plik SQLite z inną zawartością – widać, z której bazy czyta widok.
+    Alias dodawany jest przed przygotowaniem klasy; '__all__' obejmuje go transakcją testu."""
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        config = database.sqlite_config(Path(cls.directory), {'RENTALS_DB_NAME': os.path.join(cls.directory, 'r.db')})
+        configured = connections.configure_settings({'default': dict(connections.settings['default']),
+                                                     'replica_test': config})
+        connections.settings['replica_test'] = configured['replica_test']
+        call_command('migrate', database='replica_test', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica_test'].close()
+        del connections.settings['replica_test']
+        shutil.rmtree(cls.directory)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ewa', 'ewa@example.com', 'haslo')
+        Category.objects.create(name='Główna')
+        Category.objects.using('replica_test').create(name='Replika')
+
+    def names(self, path='/api/categories/'):
+        return [row['name'] for row in self.client.get(path).json()['results']]
+
+    def test_reads_from_replica_until_own_write(self):
+        self.client.force_login(self.user)
+        with override_settings(RENTALS_DB_REPLICAS=['replica_test']):
+            self.assertEqual(self.names(), ['Replika'])
+            self.assertEqual(self.names('/api/async/categories/'), ['Replika'])
+            # zapis (tu: odrzucony formularz zamówienia) przypina odczyty do bazy głównej
+            response = self.client.post(reverse('rentals:order_create'), {})
+            self.assertIn(routing.STICKY_COOKIE, response.cookies)
+            self.assertEqual(self.names(), ['Główna'])
+            self.client.cookies.pop(routing.STICKY_COOKIE)
+            self.assertEqual(self.names(), ['Replika'])
+        # bez replik wszystko idzie do bazy głównej, a zapis nie ustawia ciasteczka
+        self.assertEqual(self.names(), ['Główna'])
+        response = self.client.post(reverse('rentals:order_create'), {})
+        self.assertNotIn(routing.STICKY_COOKIE, response.cookies)
+
+    def test_stickiness_middleware_runs_natively_async(self):
+        async def view(request):
+            return HttpResponse()
+
+        middleware = routing.ReplicaStickinessMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with override_settings(RENTALS_DB_REPLICAS=['replica_test']):
+            response = asyncio.run(middleware(RequestFactory().post('/')))
+        self.assertIn(routing.STICKY_COOKIE, response.cookies)
+
+    def test_router(self):
+        router = routing.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Category))
+        with routing.reading_from('replica_test'):
+            self.assertEqual(router.db_for_read(Category), 'replica_test')
+            self.assertEqual(router.db_for_read(User), 'default')  # konta i sesje zawsze z bazy głównej
+            self.assertEqual(router.db_for_write(Category), 'default')
+
+        def lazy_names():
+            yield from Category.objects.order_by('name').values_list('name', flat=True)
+
+        # iterator konsumowany poza widokiem (odpowiedź strumieniowa) nadal czyta z repliki
+        self.assertEqual(list(routing.routed(lazy_names(), 'replica_test')), ['Replika'])
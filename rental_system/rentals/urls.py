@@ -1,6 +1,6 @@
 # rentals/urls.py
 from django.urls import path, include
-from . import views
+from . import async_views, views
 from rest_framework.routers import DefaultRouter
 
 # Router DRF dla endpointów API
@@ -23,8 +23,23 @@ urlpatterns = [
     path('komplety/<int:pk>/', views.KompletDetailView.as_view(), name='komplet_detail'),
     path('order/new/', views.OrderCreateView.as_view(), name='order_create'),
     path('dashboard/', views.UserDashboardView.as_view(), name='dashboard'),
+    path('dashboard/historia/', views.OrderHistoryView.as_view(), name='order_history'),
     path('profile/edit/', views.ProfileUpdateView.as_view(), name='profile_edit'),
     path('service/new/', views.ServiceCreateView.as_view(), name='service_create'),
+    path('obrazy/<str:kind>/<str:version>/<path:name>', views.image_rendition, name='image_rendition'),
+    path('eksport/<slug:name>.<str:fmt>', views.export_data, name='export_data'),
+    path('zwroty/', views.check_in, name='check_in'),
+    path('raporty/profilowanie/', views.profiling_report, name='profiling_report'),
+    path('raporty/analityka/', views.analytics_report, name='analytics_report'),
     # API endpoints
+    path('api/async/products/', async_views.product_list, name='async_product_list'),
+    path('api/async/products/<int:pk>/', async_views.product_detail, name='async_product_detail'),
+    path('api/async/komplets/', async_views.komplet_list, name='async_komplet_list'),
+    path('api/async/categories/', async_views.category_list, name='async_category_list'),
+    path('api/async/availability/', async_views.availability_view, name='async_availability'),
+    path('api/async/picker/products/', async_views.picker_products, name='picker_products'),
+    path('api/async/picker/komplets/', async_views.picker_komplets, name='picker_komplets'),
+    path('api/analytics/', views.AnalyticsView.as_view(), name='analytics'),
+    path('api/check-in/', views.CheckInView.as_view(), name='api_check_in'),
     path('api/', include(router.urls)),
 ]
@@ -0,0 +1,86 @@
+# rentals/versioning.py
+"""
+Wersje kolekcji i zasobów na potrzeby warunkowego GET (ETag / Last-Modified).
+
+Każda kolekcja ('product', 'komplet', 'order', 'category') ma wiersz w CollectionVersion,
+podbijany przy każdej zmianie – przez sygnały (rentals/signals.py) oraz jawnie w operacjach
+masowych (QuerySet.update, bulk_create). Sprawdzenie, czy lista się zmieniła, to więc jedno
+zapytanie po kluczu głównym zamiast przeliczania i serializacji całej listy.
+Pojedyncze obiekty wersjonuje pole `updated_at` (Product, Komplet, Order).
+"""
+import hashlib
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Subquery
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import CollectionVersion
+
+
+@dataclass
+class Stamp:
+    key: tuple           # składniki ETag (wersje kolekcji / updated_at obiektu)
+    last_modified: object = None  # datetime lub None
+
+
+def bump(*names):
+    """Podbija wersje kolekcji – wywoływane przy każdej zmianie ich zawartości."""
+    now = timezone.now()
+    for name in names:
+        updated = CollectionVersion.objects.filter(name=name).update(version=F('version') + 1, changed_at=now)
+        if not updated:
+            version, created = CollectionVersion.objects.get_or_create(name=name, defaults={'version': 1})
+            if not created:  # wiersz utworzył w międzyczasie inny proces
+                CollectionVersion.objects.filter(name=name).update(version=F('version') + 1, changed_at=now)
+
+
+def collection_stamp(names):
+    """Wersja zestawu kolekcji – jedno zapytanie."""
+    rows = {row.name: row for row in CollectionVersion.objects.filter(name__in=names)}
+    # changed_at w kluczu: po odtworzeniu bazy te same numery wersji nie dadzą starego ETag
+    key = tuple((name, rows[name].version, rows[name].changed_at.isoformat()) if name in rows else (name, 0)
+                for name in names)
+    return Stamp(key, max((row.changed_at for row in rows.values()), default=None))
+
+
+def resource_stamp(queryset, pk, related=()):
+    """Wersja obiektu (updated_at) i kolekcji, od których zależy jego reprezentacja – jedno zapytanie.
+
+    Zwraca None, gdy obiekt nie istnieje (widok sam zwróci wtedy 404).
+    """
+    annotations = {}
+    for name in related:
+        versions = CollectionVersion.objects.filter(name=name)
+        annotations[f'version_{name}'] = Subquery(versions.values('version')[:1])
+        annotations[f'changed_{name}'] = Subquery(versions.values('changed_at')[:1])
+    try:
+        row = queryset.filter(pk=pk).annotate(**annotations).values('updated_at', *annotations).first()
+    except (ValueError, TypeError, ValidationError):  # nieprawidłowy klucz z URL
+        return None
+    if row is None:
+        return None
+    key = (pk, row['updated_at'].isoformat(), *[(name, row[f'version_{name}'] or 0) for name in related])
+    changes = [row['updated_at'], *[row[f'changed_{name}'] for name in related]]
+    return Stamp(key, max(change for change in changes if change is not None))
+
+
+def make_etag(*parts):
+    """Silny ETag (bez W/) – skrót wszystkich składników, od których zależy treść odpowiedzi."""
+    return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def not_modified(request, etag, stamp):
+    """Odpowiedź 304/412 zgodnie z nagłówkami If-None-Match / If-Modified-Since albo None."""
+    last_modified = int(stamp.last_modified.timestamp()) if stamp.last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_headers(response, etag, stamp):
+    if response.status_code == 200:
+        response['ETag'] = etag
+        if stamp.last_modified:
+            response['Last-Modified'] = http_date(stamp.last_modified.timestamp())
+    return response
@@ -3,166 +3,474 @@ from django.shortcuts import render
 # Create your views here.
 # rentals/views.py (fragment z widokami API)
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from .models import Category, Product, Komplet, Order, BorrowHistory, Serwis, Service, UserProfile
 from .serializers import (
     CategorySerializer, ProductSerializer, KompletSerializer, OrderSerializer,
     BorrowHistorySerializer, SerwisSerializer, ServiceSerializer, UserProfileSerializer)
 from django.contrib.auth.models import User
-from .forms import ProfileForm
+from .forms import OrderForm, ProfileForm
+from . import analytics, routing, versioning
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class ReplicaReadMixin:
+    """Odczyty widoku (także przy renderowaniu odpowiedzi) z repliki bazy – dla widoków
+    tylko do odczytu. Po własnym zapisie użytkownik czyta z bazy głównej (rentals/routing.py)."""
+
+    def dispatch(self, request, *args, **kwargs):
+        alias = routing.read_alias(request)
+        if alias is None:
+            return super().dispatch(request, *args, **kwargs)
+        with routing.reading_from(alias):
+            response = super().dispatch(request, *args, **kwargs)
+        return routing.render_on(alias, response)
+
+
+class EagerLoadingViewSetMixin:
+    """Stosuje select_related/prefetch_related zadeklarowane w serializerze viewsetu
+    oraz obsługuje sparse fieldsets (?fields=id,name)."""
+
+    def get_requested_fields(self):
+        if self.request is None or self.request.method not in permissions.SAFE_METHODS:
+            return None
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+        fields = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = self.get_serializer_class().unknown_fields(fields)
+        if unknown:
+            raise ValidationError({'fields': f"Nieznane pola: {', '.join(unknown)}."})
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return self.get_serializer_class().setup_eager_loading(queryset, self.get_requested_fields())
+
+class ConditionalGetMixin:
+    """ETag i Last-Modified dla list i szczegółów viewsetu. Zgodny If-None-Match daje 304
+    po jednym zapytaniu o wersję – bez pobierania i serializacji danych.
+
+    `etag_collections`: kolekcje, od których zależy treść (pierwsza to kolekcja viewsetu).
+    Szczegóły modeli z `updated_at` wersjonowane są per obiekt.
+    """
+    etag_collections = ()
+
+    def list(self, request, *args, **kwargs):
+        stamp = versioning.collection_stamp(self.etag_collections)
+        return self.conditional(stamp, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        model = self.queryset.model
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if any(field.name == 'updated_at' for field in model._meta.fields):
+            stamp = versioning.resource_stamp(model._default_manager.all(), pk, self.etag_collections[1:])
+        else:
+            stamp = versioning.collection_stamp(self.etag_collections)
+        if stamp is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional(stamp, super().retrieve, request, *args, **kwargs)
+
+    def conditional(self, stamp, handler, request, *args, **kwargs):
+        # treść zależy też od adresu (filtry, kursor), formatu odpowiedzi i użytkownika
+        etag = versioning.make_etag(request.get_full_path(), request.accepted_media_type,
+                                    request.user.pk, stamp.key)
+        response = versioning.not_modified(request, etag, stamp)
+        if response is None:
+            response = versioning.set_headers(handler(request, *args, **kwargs), etag, stamp)
+        return response
+
+class CategoryViewSet(ReplicaReadMixin, ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    etag_collections = ('category', 'product')  # liczniki produktów wg statusu
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]  # wymagana autentykacja
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(ReplicaReadMixin, ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    etag_collections = ('product', 'category')
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_fields = {'status': 'status', 'category': 'category', 'category_name': 'category__name'}
 
-class KompletViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def search(self, request):
+        """Wyszukiwanie pełnotekstowe (?q=, prefiksy wyrazów), wyniki wg trafności (?limit=, max 200)."""
+        try:
+            limit = min(int(request.query_params.get('limit', 50)), 200)
+        except ValueError:
+            limit = 50
+        products = search.search_products(request.query_params.get('q', ''),
+                                          self.filter_queryset(self.get_queryset()), limit)
+        return Response(self.get_serializer(products, many=True).data)
+
+class KompletViewSet(ReplicaReadMixin, ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    etag_collections = ('komplet', 'product', 'category', 'order')  # dostępność zależy od zamówień
     queryset = Komplet.objects.all()
     serializer_class = KompletSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_fields = {'status': 'status'}
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
+    etag_collections = ('order', 'product', 'komplet', 'category')
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_fields = {'status': 'status', 'user': 'user', 'conference_code': 'conference_code',
+                     'date_from': 'pickup_date__gte', 'date_to': 'pickup_date__lte'}
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser], url_path='pick-up')
+    def pick_up(self, request, pk=None):
+        """Odbiór zarezerwowanego zamówienia – dopiero tu zdejmowany jest stan magazynu."""
+        try:
+            order = services.pick_up(self.get_object())
+        except (services.NotReserved, services.ItemsUnavailable) as exc:
+            raise ValidationError({'detail': str(exc)})
+        return Response(self.get_serializer(order).data)
 
-class BorrowHistoryViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = BorrowHistory.objects.select_related('user', 'product', 'komplet').all()
+class BorrowHistoryViewSet(ReplicaReadMixin, EagerLoadingViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = BorrowHistory.objects.all()
     serializer_class = BorrowHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_fields = {'user': 'user', 'product': 'product', 'komplet': 'komplet',
+                     'category': 'product__category',
+                     'date_from': 'borrow_date__date__gte', 'date_to': 'borrow_date__date__lte'}
 
-class SerwisViewSet(viewsets.ModelViewSet):
+class SerwisViewSet(EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Serwis.objects.all()
     serializer_class = SerwisSerializer
     permission_classes = [permissions.IsAdminUser]  # tylko admin
 
-class ServiceViewSet(viewsets.ModelViewSet):
-    queryset = Service.objects.select_related('product','komplet','serwis').all()
+class ServiceViewSet(EagerLoadingViewSetMixin, viewsets.ModelViewSet):
+    queryset = Service.objects.all()
     serializer_class = ServiceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_fields = {'resolved': 'resolved', 'product': 'product', 'komplet': 'komplet'}
+
+
+class AnalyticsView(ReplicaReadMixin, APIView):
+    """Wykorzystanie sprzętu z dziennych podsumowań, np. /api/analytics/?date_from=2024-01-01&category=3
+    (domyślnie ostatnie 30 dni)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            date_from, date_to, category = analytics.period_from_params(request.query_params)
+        except ValueError as exc:
+            raise ValidationError({'detail': str(exc)})
+        return Response(analytics.report(date_from, date_to, category))
+
 
+class CheckInView(APIView):
+    """Zwrot partii sprzętu: POST {"codes": ["SM58_12", "5901234123457", ...]} (lub tekst ze skanera)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        codes = request.data.get('codes')
+        if isinstance(codes, str):
+            codes = services.parse_codes(codes)
+        if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+            raise ValidationError({'codes': "Oczekiwano listy kodów."})
+        if len(codes) > services.CHECK_IN_BATCH:
+            raise ValidationError({'codes': f"Maksymalnie {services.CHECK_IN_BATCH} kodów w jednej partii."})
+        return Response(services.check_in(codes).as_dict())
 
 
 # rentals/views.py (ciąg dalszy)
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, TemplateView
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy
 from django.shortcuts import redirect
-from django.core.mail import send_mail
+from django.db import transaction
 from django.utils import timezone
-from .models import Product, Komplet, Order, BorrowHistory, Service, UserProfile
+from django.utils.dateparse import parse_date
+from django.template.loader import render_to_string
+from django.views.generic.list import MultipleObjectMixin
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
+from .models import Product, Komplet, Order, OrderLine, BorrowHistory, Service, UserProfile
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from . import availability, exports, fragments, images, profiling, search, services
+from .mail import queue_mail
+
+class AvailabilityRangeMixin:
+    """Odczyt przedziału dat (?date_from=&date_to=) i kategorii (?category=) z parametrów GET."""
+
+    def get_date_range(self):
+        start = parse_date(self.request.GET.get('date_from') or '')
+        end = parse_date(self.request.GET.get('date_to') or '')
+        return availability.default_range(start, end)
+
+    def get_category(self):
+        return self.request.GET.get('category') or None
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['date_from'], ctx['date_to'] = self.get_date_range()
+        # parametry filtrowania zachowywane w linkach paginacji
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        ctx['filter_query'] = params.urlencode()
+        return ctx
+
+    def get_availability_stamp(self):
+        """Wersja danych, od których zależy dostępność w przedziale (jeden odczyt na żądanie)."""
+        if not hasattr(self, '_availability_stamp'):
+            stamp = versioning.collection_stamp(('product', 'category', 'order', 'komplet'))
+            # domyślny przedział zależy od dzisiejszej daty
+            self._availability_stamp = versioning.Stamp(stamp.key + tuple(self.get_date_range()))
+        return self._availability_stamp
+
+class ConditionalGetViewMixin:
+    """ETag/Last-Modified dla widoków HTML; get_stamp() zwraca versioning.Stamp (None = bez ETag)."""
+
+    def get_stamp(self):
+        return None
+
+    def get_etag_parts(self):
+        return (self.request.get_full_path(), self.request.user.pk)
+
+    def get(self, request, *args, **kwargs):
+        stamp = self.get_stamp()
+        if stamp is None:
+            return super().get(request, *args, **kwargs)
+        etag = versioning.make_etag(*self.get_etag_parts(), stamp.key)
+        response = versioning.not_modified(request, etag, stamp)
+        if response is None:
+            response = versioning.set_headers(super().get(request, *args, **kwargs), etag, stamp)
+        return response
+
+class FragmentCacheMixin:
+    """Tabela wyników (fragment_template) renderowana raz i czytana z cache, dopóki nie zmieni
+    się wersja danych z get_fragment_stamp(). Szablon strony wstawia gotowy HTML ({{ fragment }})."""
+    fragment_template = None
+    fragment_collections = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fragments.NAMES.add(cls.__name__)
+
+    def get_fragment_stamp(self):
+        return versioning.collection_stamp(self.fragment_collections)
+
+    def get_fragment_key_parts(self):
+        # numer strony, filtry, wyszukiwana fraza
+        return (sorted(self.request.GET.lists()),)
 
-class ProductListView(LoginRequiredMixin, ListView):
+    def get(self, request, *args, **kwargs):
+        name = type(self).__name__
+        self.fragment_key = fragments.make_key(name, self.get_fragment_stamp().key, *self.get_fragment_key_parts())
+        self.fragment = fragments.load(self.fragment_key, name)
+        if self.fragment is not None and isinstance(self, MultipleObjectMixin):
+            # lista nie jest potrzebna – bez zapytań o obiekty i bez paginacji
+            self.object_list = self.model._default_manager.none()
+            self.paginate_by = None
+            return self.render_to_response(self.get_context_data())
+        return super().get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.fragment is None:
+            self.fragment = render_to_string(self.fragment_template, context, self.request)
+            fragments.store(self.fragment_key, self.fragment)
+        context['fragment'] = self.fragment
+        return context
+
+class ProductListView(ReplicaReadMixin, LoginRequiredMixin, ConditionalGetViewMixin, FragmentCacheMixin, AvailabilityRangeMixin, ListView):
     model = Product
     template_name = 'rentals/product_list.html'
+    fragment_template = 'rentals/includes/product_results.html'
     context_object_name = 'products'
     paginate_by = 10  # paginacja 10 na stronę (opcjonalnie)
-    queryset = Product.objects.filter(status='magazyn')  # domyślnie pokazuj tylko dostępne
 
-class ProductDetailView(LoginRequiredMixin, DetailView):
+    def get_queryset(self):
+        # domyślnie pokazuj tylko produkty wolne w wybranym przedziale dat
+        start, end = self.get_date_range()
+        products = (availability.available_between(start, end, category=self.get_category())
+                    .select_related('category').order_by('id'))
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            # wyniki wyszukiwania posortowane wg trafności
+            products = search.search_products(query, products, limit=200)
+        return products
+
+    def get_stamp(self):
+        # lista zależy od zamówień i od dzisiejszej daty (domyślny przedział),
+        # dlatego bez Last-Modified – o aktualności decyduje tylko ETag
+        return self.get_availability_stamp()
+
+    def get_fragment_stamp(self):
+        return self.get_availability_stamp()
+
+class ProductDetailView(ReplicaReadMixin, LoginRequiredMixin, ConditionalGetViewMixin, DetailView):
     model = Product
     template_name = 'rentals/product_detail.html'
     context_object_name = 'product'
 
-class KompletListView(LoginRequiredMixin, ListView):
+    def get_stamp(self):
+        return versioning.resource_stamp(Product.objects.all(), self.kwargs['pk'], related=('category',))
+
+class KompletListView(ReplicaReadMixin, LoginRequiredMixin, FragmentCacheMixin, AvailabilityRangeMixin, ListView):
     model = Komplet
     template_name = 'rentals/komplet_list.html'
+    fragment_template = 'rentals/includes/komplet_results.html'
     context_object_name = 'komplets'
     paginate_by = 10
-    queryset = Komplet.objects.filter(status='magazyn')
 
-class KompletDetailView(LoginRequiredMixin, DetailView):
+    def get_queryset(self):
+        start, end = self.get_date_range()
+        komplets = availability.available_komplets_between(start, end, category=self.get_category())
+        return availability.with_komplet_availability(komplets, start, end).order_by('id')
+
+    def get_fragment_stamp(self):
+        return self.get_availability_stamp()
+
+class KompletDetailView(ReplicaReadMixin, LoginRequiredMixin, FragmentCacheMixin, DetailView):
     model = Komplet
     template_name = 'rentals/komplet_detail.html'
+    fragment_template = 'rentals/includes/komplet_products.html'
+    fragment_collections = ('komplet', 'product', 'category')
     context_object_name = 'komplet'
 
+    def get_queryset(self):
+        return availability.with_komplet_availability(Komplet.objects.all())
+
+    def get_fragment_key_parts(self):
+        return (self.kwargs['pk'],)
+
+    def get_context_data(self, **kwargs):
+        if self.fragment is None:  # produkty potrzebne tylko do wyrenderowania fragmentu
+            kwargs['products'] = self.object.products.select_related('category').order_by('brand', 'model')
+        return super().get_context_data(**kwargs)
+
 # Formularz wypożyczenia (Order) – użyjemy CreateView, ale musimy nadpisać pewne zachowania
 class OrderCreateView(LoginRequiredMixin, CreateView):
     model = Order
-    fields = ['conference_code', 'products', 'komplets', 'pickup_date', 'return_date']  # pola w formularzu
+    form_class = OrderForm  # produkty i komplety wybierane przez podpowiedzi (PickerWidget)
     template_name = 'rentals/order_form.html'
     success_url = reverse_lazy('rentals:dashboard')  # po złożeniu zamówienia, przejdź na dashboard
 
-    def get_form(self, *args, **kwargs):
-        """Dostosowanie formularza: ograniczenie listy produktów/kompletów do dostępnych oraz ustawienie widgetów."""
-        form = super().get_form(*args, **kwargs)
-        # Ograniczamy wybór produktów/kompletów do dostępnych (status=magazyn)
-        form.fields['products'].queryset = Product.objects.filter(status='magazyn')
-        form.fields['komplets'].queryset = Komplet.objects.filter(status='magazyn')
-        # Ustawiamy atrybut HTML multiple dla pola produktów i kompletów (wielokrotny wybór)
-        form.fields['products'].widget.attrs.update({'class': 'form-select', 'multiple': 'multiple'})
-        form.fields['komplets'].widget.attrs.update({'class': 'form-select', 'multiple': 'multiple'})
-        # Opcjonalnie można ustawić pola daty jako type=date
-        form.fields['pickup_date'].widget.attrs.update({'type': 'date', 'class': 'form-control'})
-        form.fields['return_date'].widget.attrs.update({'type': 'date', 'class': 'form-control'})
-        form.fields['conference_code'].widget.attrs.update({'class': 'form-control'})
-        return form
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['categories'] = Category.objects.order_by('name')  # filtr podpowiedzi
+        return ctx
 
     def form_valid(self, form):
         """Automatyczne przypisanie użytkownika do zamówienia i sprawdzenie dostępności sprzętu."""
         form.instance.user = self.request.user  # przypisz zalogowanego użytkownika
-        # Sprawdź czy wybrane produkty/komplety są dostępne (nadal w magazynie)
         selected_products = form.cleaned_data.get('products')
         selected_komplets = form.cleaned_data.get('komplets')
-        for prod in selected_products:
-            if prod.status != 'magazyn':
-                form.add_error('products', f"Produkt {prod} nie jest dostępny do wypożyczenia.")
-        for komp in selected_komplets:
-            if komp.status != 'magazyn':
-                form.add_error('komplets', f"Komplet {komp} nie jest dostępny do wypożyczenia.")
-        if form.errors:
+        pickup_date = form.cleaned_data.get('pickup_date')
+        return_date = form.cleaned_data.get('return_date')
+        if pickup_date and return_date and return_date < pickup_date:
+            form.add_error('return_date', "Data zwrotu nie może być wcześniejsza niż data odbioru.")
+            return self.form_invalid(form)
+        quantities = self.get_quantities(selected_products)
+        if quantities is None:
+            form.add_error('products', "Liczba sztuk musi być dodatnią liczbą całkowitą.")
+            return self.form_invalid(form)
+        # Zapisz zamówienie i wydaj sprzęt w jednej transakcji (z kontrolą dostępności w terminie);
+        # potwierdzenie e-mail trafia do kolejki w tej samej transakcji
+        try:
+            with transaction.atomic():
+                self.object = services.checkout(form.instance, selected_products, selected_komplets, quantities)
+                self.send_confirmation_email(self.object, selected_products, selected_komplets, quantities)
+        except services.ItemsUnavailable as exc:
+            for prod in exc.products:
+                if quantities[prod.pk] > 1:
+                    form.add_error('products', f"Produkt {prod}: brak {quantities[prod.pk]} wolnych sztuk "
+                                               f"w wybranym terminie.")
+                else:
+                    form.add_error('products', f"Produkt {prod} nie jest dostępny w wybranym terminie.")
+            for komp in exc.komplets:
+                form.add_error('komplets', f"Komplet {komp} nie jest dostępny w wybranym terminie.")
             return self.form_invalid(form)  # jeśli wykryto błędy dostępności, przerwij zapisywanie
-        # Zapisz zamówienie
-        response = super().form_valid(form)  # to utworzy obiekt Order i zapisze powiązania M2M
-        order = self.object  # nowo utworzone zamówienie
-        # Aktualizuj statusy produktów i kompletów na "wyjazd" oraz zarejestruj historię wypożyczenia
-        for prod in order.products.all():
-            prod.status = 'wyjazd'
-            prod.save()
-            BorrowHistory.objects.create(user=self.request.user, product=prod, borrow_date=timezone.now())
-        for komp in order.komplets.all():
-            komp.status = 'wyjazd'
-            komp.save()
-            BorrowHistory.objects.create(user=self.request.user, komplet=komp, borrow_date=timezone.now())
-        # Wysłanie potwierdzenia e-mail do użytkownika
-        self.send_confirmation_email(order)
-        return response
+        return redirect(self.get_success_url())
 
-    def send_confirmation_email(self, order):
-        """Wysyła e-mail potwierdzający złożenie zamówienia."""
+    def get_quantities(self, products):
+        """Liczba sztuk z pól quantity_<id> formularza (domyślnie 1); None przy błędnej wartości."""
+        quantities = {}
+        for product in products:
+            try:
+                quantities[product.pk] = int(self.request.POST.get(f'quantity_{product.pk}') or 1)
+            except ValueError:
+                return None
+            if quantities[product.pk] < 1:
+                return None
+        return quantities
+
+    def send_confirmation_email(self, order, products, komplets, quantities=None):
+        """Kolejkuje e-mail potwierdzający złożenie zamówienia (wysyłka: komenda send_queued_mail)."""
         user_email = order.user.email
         if not user_email:
             return
+        quantities = quantities or {}
+        items = [f"{p} x{quantities[p.pk]}" if quantities.get(p.pk, 1) > 1 else str(p) for p in products]
         subject = "Potwierdzenie wypożyczenia sprzętu"
         body = (f"Dziękujemy za złożenie wypożyczenia.\n\n"
                 f"Kod konferencji: {order.conference_code}\n"
-                f"Wypożyczone produkty: {', '.join(str(p) for p in order.products.all())}\n"
-                f"Wypożyczone komplety: {', '.join(str(k) for k in order.komplets.all())}\n"
+                f"Wypożyczone produkty: {', '.join(items)}\n"
+                f"Wypożyczone komplety: {', '.join(str(k) for k in komplets)}\n"
                 f"Planowana data odbioru: {order.pickup_date}\n"
                 f"Planowana data zwrotu: {order.return_date}\n\n"
                 f"Prosimy o terminowy zwrot sprzętu. \nPozdrawiamy,\nZespół Wypożyczalni")
-        from django.conf import settings
-        send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [user_email], fail_silently=True)
+        queue_mail(subject, body, user_email)
+
+def orders_with_contents(orders):
+    """Zamówienia z pozycjami (produkt, liczba sztuk) i kompletami – dwa zapytania prefetch
+    na stronę, niezależnie od liczby zamówień."""
+    return orders.prefetch_related(
+        Prefetch('lines', queryset=OrderLine.objects.select_related('product')
+                 .only('order', 'quantity', 'product__brand', 'product__model').order_by('product_id')),
+        Prefetch('komplets', queryset=Komplet.objects.only('name').order_by('name')),
+    )
+
 
 class UserDashboardView(LoginRequiredMixin, TemplateView):
+    """Aktywne zamówienia (stronicowane). Historia ładowana osobno – OrderHistoryView."""
     template_name = "rentals/dashboard.html"
+    paginate_by = 20
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         user = self.request.user
         # Aktywne wypożyczenia: zamówienia, które nie są oznaczone jako zwrócone
-        ctx['active_orders'] = Order.objects.filter(user=user).exclude(status='returned').order_by('-reserved_at')
-        # Historia wypożyczeń (zakończone)
-        ctx['past_orders'] = Order.objects.filter(user=user, status='returned').order_by('-return_date')
+        active_orders = orders_with_contents(
+            Order.objects.filter(user=user).exclude(status='returned').order_by('-reserved_at', '-pk'))
+        ctx['active_page'] = Paginator(active_orders, self.paginate_by).get_page(self.request.GET.get('page'))
         # Profil użytkownika
         ctx['profile'] = user.profile  # dzięki related_name 'profile' w UserProfile
         return ctx
 
+class OrderHistoryView(LoginRequiredMixin, ListView):
+    """Zakończone zamówienia użytkownika. Z ?fragment=1 zwraca sam fragment listy –
+    kokpit doładowuje go po wyświetleniu strony."""
+    template_name = 'rentals/order_history.html'
+    context_object_name = 'past_orders'
+    paginate_by = 20
+
+    def get_queryset(self):
+        return orders_with_contents(
+            Order.objects.filter(user=self.request.user, status='returned').order_by('-return_date', '-pk'))
+
+    def get_template_names(self):
+        if self.request.GET.get('fragment'):
+            return ['rentals/includes/order_history.html']
+        return [self.template_name]
+
 class ProfileUpdateView(LoginRequiredMixin, UpdateView):
     model = User
     form_class = ProfileForm
@@ -207,7 +515,84 @@ class ServiceCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
             service.komplet.save()
         return response
 
-class KompletListView(ListView):
-    model = Komplet
-    template_name = 'rentals/komplet_list.html'
-    context_object_name = 'komplets'
+
+# Raport profilowania żądań (rentals/profiling.py) – tylko dla personelu
+@staff_member_required
+def profiling_report(request):
+    if request.method == 'POST':
+        profiling.reset()
+        fragments.reset_stats()
+        return redirect('rentals:profiling_report')
+    return render(request, 'rentals/profiling_report.html', {
+        'rows': profiling.report(),
+        'fragment_stats': fragments.stats(),
+        'sample_rate': getattr(settings, 'RENTALS_PROFILING_SAMPLE_RATE', 0.0),
+        'title': "Profilowanie żądań",
+    })
+
+
+@staff_member_required
+def check_in(request):
+    """Ekran przyjęcia zwrotów – skaner wpisuje kody do pola tekstowego, partia zatwierdzana jednym przyciskiem."""
+    result = error = None
+    if request.method == 'POST':
+        codes = services.parse_codes(request.POST.get('codes'))
+        if len(codes) > services.CHECK_IN_BATCH:
+            error = f"Maksymalnie {services.CHECK_IN_BATCH} kodów w jednej partii."
+        else:
+            result = services.check_in(codes)
+    return render(request, 'rentals/check_in.html', {
+        'result': result,
+        'error': error,
+        'title': "Przyjęcie zwrotów",
+    })
+
+
+@staff_member_required
+@routing.reads_from_replica
+def analytics_report(request):
+    try:
+        date_from, date_to, category = analytics.period_from_params(request.GET)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    return render(request, 'rentals/analytics_report.html', {
+        'report': analytics.report(date_from, date_to, category),
+        'categories': Category.objects.order_by('name'),
+        'category': category,
+        'title': "Wykorzystanie sprzętu",
+    })
+
+
+@login_required
+def image_rendition(request, kind, version, name):
+    """Pomniejszona wersja zdjęcia (tworzona przy pierwszym żądaniu), cache'owana bezterminowo.
+    Adres ze starą wersją oryginału przekierowuje na bieżącą."""
+    try:
+        target = images.get_or_create(name, kind)
+    except (images.RenditionError, SuspiciousFileOperation):
+        raise Http404("Brak obrazu.")
+    current = images.version(name)
+    if version != current:
+        return redirect('rentals:image_rendition', kind=kind, version=current, name=name)
+    response = FileResponse(default_storage.open(target, 'rb'), content_type='image/jpeg')
+    # wersja w adresie zmienia się razem z oryginałem, więc treść pod danym adresem się nie zmienia
+    patch_cache_control(response, private=True, max_age=365 * 24 * 3600, immutable=True)
+    return response
+
+
+@staff_member_required
+def export_data(request, name, fmt):
+    """Eksport strumieniowy (CSV / JSON Lines) dla audytu, np. /eksport/borrow-history.csv?date_from=2024-01-01."""
+    try:
+        lines = exports.stream(name, fmt, request.GET.get('date_from'), request.GET.get('date_to'))
+    except exports.ExportError as exc:
+        return HttpResponseBadRequest(str(exc))
+    alias = routing.read_alias(request)
+    if alias is not None:
+        # wiersze pobierane są dopiero przy wysyłaniu odpowiedzi – poza widokiem
+        lines = routing.routed(lines, alias)
+    if isinstance(request, ASGIRequest):
+        lines = exports.aiterate(lines)
+    response = StreamingHttpResponse(lines, content_type=exports.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.localdate():%Y%m%d}.{fmt}"'
+    return response